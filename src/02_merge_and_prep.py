@@ -68,7 +68,7 @@ def process_folder(folder, dataset_tag):
             sheet['pincode'] = None
 
         if 'date' in sheet.columns:
-            sheet['date'] = pd.to_datetime(sheet['date'], errors='coerce')
+            sheet['date'] = pd.to_datetime(sheet['date'], errors='coerce', dayfirst=True)
 
             sheet['period'] = sheet['date'].dt.to_period('M').dt.to_timestamp()
         else:
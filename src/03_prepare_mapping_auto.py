@@ -1,10 +1,11 @@
 
 import pandas as pd
 from pathlib import Path
-import re
 from collections import Counter, defaultdict
 from rapidfuzz import fuzz, process
 
+from afi_normalize import normalize_text_series, title_case
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -16,29 +17,10 @@ DOMINANCE_THRESHOLD = 0.60
 SIMILARITY_THRESHOLD = 85
 MIN_CLUSTER_SIZE = 2
 
-def normalize_text(s):
-    if s is None:
-        return ''
-    s = str(s).strip()
-
-    s = re.sub(r'[\.\,\/\\\(\)\-]+', ' ', s)
-    s = re.sub(r'\s+', ' ', s)
-    s = s.strip()
-    if s == '':
-        return ''
-    return s.lower()
-
-def title_case_safe(s):
-
-    if s is None or s == '':
-        return ''
-    s = s.strip()
-    return ' '.join([w.capitalize() for w in s.split()])
-
 def load_variants_map(file):
     sheet = pd.read_csv(file, dtype=str).fillna('')
-    sheet['state_n'] = sheet['state'].apply(normalize_text)
-    sheet['district_n'] = sheet['district'].apply(normalize_text)
+    sheet['state_n'] = normalize_text_series(sheet['state'])
+    sheet['district_n'] = normalize_text_series(sheet['district'])
     return sheet
 
 def cluster_variants(variants):
@@ -74,7 +56,7 @@ def auto_map(sheet):
     for s in sorted(states):
         sub = sheet[sheet['state_n'] == s]
 
-        suggested_state = title_case_safe(s)
+        suggested_state = title_case(s)
 
 
         districts = sub['district_n'].unique().tolist()
@@ -87,9 +69,9 @@ def auto_map(sheet):
                     'original_state': row['state'],
                     'original_district': row['district'],
                     'suggested_state': suggested_state,
-                    'suggested_district': title_case_safe(row['district_n']),
+                    'suggested_district': title_case(row['district_n']),
                     'canonical_state': suggested_state,
-                    'canonical_district': title_case_safe(row['district_n']),
+                    'canonical_district': title_case(row['district_n']),
                     'confidence': 'high',
                     'notes': ''
                 })
@@ -136,9 +118,9 @@ def auto_map(sheet):
                     'original_state': row['state'],
                     'original_district': row['district'],
                     'suggested_state': suggested_state,
-                    'suggested_district': title_case_safe(top_norm),
+                    'suggested_district': title_case(top_norm),
                     'canonical_state': suggested_state if confidence in ['high','medium'] else '',
-                    'canonical_district': title_case_safe(selected_raw) if confidence in ['high','medium'] else '',
+                    'canonical_district': title_case(selected_raw) if confidence in ['high','medium'] else '',
                     'confidence': confidence,
                     'notes': notes
                 })
@@ -3,6 +3,8 @@ import pandas as pd
 from pathlib import Path
 import sys
 
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -40,56 +42,52 @@ def load_mapping(path):
         }
     return mapping, m
 
-def apply_mapping_to_file(infile, outfile, mapping, mapping_df, apply_conf=APPLY_CONFIDENCE, chunksize=500000):
-    print(f"Processing {infile.name} -> {outfile.name}")
-
-    written_rows = 0
-    applied_count = 0
-    unmapped_pairs = set()
-
-    unique_pairs_seen = set()
-
-    reader = pd.read_csv(infile, chunksize=chunksize, low_memory=False, dtype=str)
-    for idx, chunk in enumerate(reader):
-
-        if 'state' not in chunk.columns or 'district' not in chunk.columns:
-            print("ERROR: file missing 'state' or 'district' columns:", infile)
-            return None
-        chunk = chunk.fillna('')
+def auto_chunk(chunk, shared):
+    """The chunk with the confident mappings applied, how many rows took one, and its (state, district) pairs; None if it lacks them."""
+    mapping, apply_conf = shared
+    if 'state' not in chunk.columns or 'district' not in chunk.columns:
+        return None, 0, set()
+    chunk = chunk.fillna('')
 
 
-        chunk['state_clean'] = chunk['state']
-        chunk['district_clean'] = chunk['district']
+    chunk['state_clean'] = chunk['state']
+    chunk['district_clean'] = chunk['district']
 
 
-        pairs = set(zip(chunk['state'], chunk['district']))
-        unique_pairs_seen.update(pairs)
-
+    pairs = set(zip(chunk['state'], chunk['district']))
 
+    applied_count = 0
+    for idx, row in chunk.iterrows():
+        key = (row['state'], row['district'])
+        payload = mapping.get(key)
+        if payload and payload['canonical_state'] and payload['canonical_district'] and payload['confidence'] in apply_conf:
 
-        remap_mask = []
-        for idx, row in chunk.iterrows():
-            key = (row['state'], row['district'])
-            payload = mapping.get(key)
-            if payload and payload['canonical_state'] and payload['canonical_district'] and payload['confidence'] in apply_conf:
+            chunk.at[idx, 'state_clean'] = payload['canonical_state']
+            chunk.at[idx, 'district_clean'] = payload['canonical_district']
+            applied_count += 1
+    return chunk, applied_count, pairs
 
-                chunk.at[idx, 'state_clean'] = payload['canonical_state']
-                chunk.at[idx, 'district_clean'] = payload['canonical_district']
-                applied_count += 1
-            else:
+def apply_mapping_to_file(infile, outfile, mapping, mapping_df, apply_conf=APPLY_CONFIDENCE, chunksize=500000):
+    print(f"Processing {infile.name} -> {outfile.name}")
 
-                if not payload:
-                    unmapped_pairs.add(key)
-                else:
+    written_rows = 0
+    applied_count = 0
 
-                    unmapped_pairs.add(key)
+    unique_pairs_seen = set()
 
-        if written_rows == 0:
-            chunk.to_csv(outfile, index=False, mode='w')
-        else:
-            chunk.to_csv(outfile, index=False, header=False, mode='a')
-        written_rows += len(chunk)
-        print(f"  chunk {i}: wrote {len(chunk)} rows")
+    reader = pd.read_csv(infile, chunksize=chunksize, low_memory=False, dtype=str)
+    chunks = map_chunks(auto_chunk, prefetch(reader), shared=(mapping, apply_conf))
+    with ChunkWriter(outfile) as out:
+        for n, (chunk, n_applied, pairs) in enumerate(chunks):
+            if chunk is None:
+                print("ERROR: file missing 'state' or 'district' columns:", infile)
+                return None
+            applied_count += n_applied
+            unique_pairs_seen.update(pairs)
+
+            out.write(chunk)
+            written_rows += len(chunk)
+            print(f"  chunk {n}: wrote {len(chunk)} rows")
 
     print(f"Total rows written: {written_rows}, mappings applied rows: {applied_count}")
 
@@ -112,22 +110,27 @@ def apply_mapping_to_file(infile, outfile, mapping, mapping_df, apply_conf=APPLY
     needs_review = review_df[~review_df['confidence'].isin(apply_conf) | (review_df['mapped_canonical_state']=='') | (review_df['mapped_canonical_district']=='')]
     return applied_count, written_rows, needs_review
 
+def apply_dataset(key, mapping, mapping_df):
+    infile = MERGED_FILES[key]
+    if not infile.exists():
+        print("Skipping missing merged file:", infile)
+        return None
+    outfile = OUT / f"cleaned_{key}_auto.csv"
+    applied_count, total_rows, needs_review = apply_mapping_to_file(infile, outfile, mapping, mapping_df)
+
+    review_path = PROJECT / "docs" / f"mapping_needs_review_{key}.csv"
+    needs_review.to_csv(review_path, index=False)
+    print(f"Wrote review file: {review_path} (rows needing review: {len(needs_review)})")
+    return {'applied_count': applied_count, 'total_rows': total_rows, 'review_needs': len(needs_review)}
+
 def main():
     mapping, mapping_df = load_mapping(MAPPING_FILE)
     overall_summary = {}
-    for key, infile in MERGED_FILES.entries():
-        if not infile.exists():
-            print("Skipping missing merged file:", infile)
-            continue
-        outfile = OUT / f"cleaned_{key}_auto.csv"
-        applied_count, total_rows, needs_review = apply_mapping_to_file(infile, outfile, mapping, mapping_df)
-
-        review_path = PROJECT / "docs" / f"mapping_needs_review_{key}.csv"
-        needs_review.to_csv(review_path, index=False)
-        print(f"Wrote review file: {review_path} (rows needing review: {len(needs_review)})")
-        overall_summary[key] = {'applied_count': applied_count, 'total_rows': total_rows, 'review_needs': len(needs_review)}
+    for key, outcome in zip(MERGED_FILES, fan_out(apply_dataset, MERGED_FILES, mapping, mapping_df)):
+        if outcome:
+            overall_summary[key] = outcome
     print("Summary (dataset: applied_rows / total_rows / pending_review_rows):")
-    for kdx,v in overall_summary.entries():
+    for k, v in overall_summary.items():
         print(f"  {k}: {v['applied_count']} / {v['total_rows']}  pending_review:{v['review_needs']}")
 
 if __name__ == "__main__":
@@ -16,29 +16,18 @@ Rules used (conservative):
 """
 from pathlib import Path
 import pandas as pd
-import re
-from collections import Counter, defaultdict
+import numpy as np
+
+from afi_normalize import clean_token_series, title_case_series
 
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
 
-def clean_token(s):
-    if pd.isna(s) or s is None:
-        return ''
-    t = str(s).strip()
-
-    t = re.sub(r'[\.\,\/\\\(\)\-]+', ' ', t)
-    t = re.sub(r'\s+', ' ', t)
-    t = t.strip()
-
-    t = t.replace('&', 'and')
-    return t
-
-def title_case(s):
-    if not s:
-        return ''
-    return ' '.join([w.capitalize() for w in s.split()])
+def column(sheet, name):
+    if name in sheet.columns:
+        return sheet[name]
+    return pd.Series('', index=sheet.index)
 
 def suggest_for_dataset(dataset):
     in_path = DOCS / f"mapping_needs_review_{dataset}.csv"
@@ -47,67 +36,44 @@ def suggest_for_dataset(dataset):
         print("Missing:", in_path)
         return
     sheet = pd.read_csv(in_path, dtype=str).fillna('')
-
-    group = defaultdict(list)
-    for _, row in sheet.iterrows():
-        key = clean_token(row.get('suggested_district','') or row.get('original_district',''))
-        group[key].append(row.get('original_district',''))
-
-    canonical_map = {}
-    dominance_map = {}
-    for kdx, vals in group.entries():
-        if kdx == '':
-            canonical_map[kdx] = ''
-            dominance_map[kdx] = 0.0
-            continue
-        c = Counter(vals)
-        most_common_raw, count = c.most_common(1)[0]
-        dominance = count / sum(c.values())
-        canonical_map[kdx] = most_common_raw.strip()
-        dominance_map[kdx] = dominance
-
-
-    sug_rows = []
-    for _, row in sheet.iterrows():
-        orig_state = row.get('original_state','')
-        orig_district = row.get('original_district','')
-        sug_state = row.get('suggested_state','') or ''
-        sug_district = row.get('suggested_district','') or ''
-        norm_d = clean_token(sug_district or orig_district)
-        suggested_state_clean = title_case(clean_token(sug_state)) if sug_state else title_case(clean_token(orig_state))
-
-        cand = canonical_map.get(norm_d, '')
-        dominance = dominance_map.get(norm_d, 0.0)
-
-        if cand and dominance >= 0.6:
-            suggestion_confidence = 'auto_high'
-            canonical_state = suggested_state_clean
-            canonical_district = cand
-        elif cand and dominance >= 0.35:
-            suggestion_confidence = 'auto_medium'
-            canonical_state = suggested_state_clean
-            canonical_district = cand
-        else:
-
-            if norm_d:
-                canonical_state = suggested_state_clean
-                canonical_district = title_case(norm_d)
-                suggestion_confidence = 'auto_medium' if norm_d else 'manual'
-            else:
-                canonical_state = ''
-                canonical_district = ''
-                suggestion_confidence = 'manual'
-        sug_rows.append({
-            'original_state': orig_state,
-            'original_district': orig_district,
-            'suggested_state': sug_state,
-            'suggested_district': sug_district,
-            'canonical_state_suggestion': canonical_state,
-            'canonical_district_suggestion': canonical_district,
-            'suggestion_confidence': suggestion_confidence,
-            'notes': row.get('notes','')
-        })
-    out_df = pd.DataFrame(sug_rows)
+    sheet = sheet.reset_index(drop=True)
+
+    orig_state = column(sheet, 'original_state')
+    orig_district = column(sheet, 'original_district')
+    sug_state = column(sheet, 'suggested_state')
+    sug_district = column(sheet, 'suggested_district')
+    norm_d = clean_token_series(sug_district.where(sug_district != '', orig_district))
+
+    # most common raw spelling per normalized district; ties go to the spelling seen first
+    pairs = pd.DataFrame({'key': norm_d, 'raw': orig_district})
+    counts = pairs.groupby(['key', 'raw'], sort=False).size().rename('count').reset_index()
+    group_size = counts.groupby('key', sort=False)['count'].transform('sum')
+    counts['dominance'] = counts['count'] / group_size
+    top = counts.sort_values('count', ascending=False, kind='stable').drop_duplicates('key')
+    top = top.set_index('key')
+    canonical_map = top['raw'].str.strip().where(top.index != '', '')
+    dominance_map = top['dominance'].where(top.index != '', 0.0)
+
+    cand = norm_d.map(canonical_map).fillna('')
+    dominance = norm_d.map(dominance_map).fillna(0.0)
+    suggested_state_clean = title_case_series(clean_token_series(sug_state.where(sug_state != '', orig_state)))
+
+    has_cand = cand != ''
+    tiers = [has_cand & (dominance >= 0.6), has_cand & (dominance >= 0.35), norm_d != '']
+    suggestion_confidence = np.select(tiers, ['auto_high', 'auto_medium', 'auto_medium'], default='manual')
+    canonical_state = np.where(norm_d != '', suggested_state_clean, '')
+    canonical_district = np.select(tiers, [cand, cand, title_case_series(norm_d)], default='')
+
+    out_df = pd.DataFrame({
+        'original_state': orig_state,
+        'original_district': orig_district,
+        'suggested_state': sug_state,
+        'suggested_district': sug_district,
+        'canonical_state_suggestion': canonical_state,
+        'canonical_district_suggestion': canonical_district,
+        'suggestion_confidence': suggestion_confidence,
+        'notes': column(sheet, 'notes'),
+    })
     out_df = out_df.drop_duplicates(subset=['original_state','original_district'])
     out_df.to_csv(out_path, index=False)
     print("Wrote", out_path, "rows:", len(out_df))
@@ -2,6 +2,8 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_pipeline import DATASETS, ChunkWriter, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -39,6 +41,33 @@ def load_suggestions(path):
         }
     return mapping, sheet
 
+def suggest_chunk(chunk, mapping):
+    """The chunk with the auto-level suggestions applied, how many rows took one, and review rows for the rest."""
+    chunk = chunk.fillna('')
+    chunk['state_clean'] = chunk['state']
+    chunk['district_clean'] = chunk['district']
+    applied_count = 0
+    review_rows = []
+    for idx, row in chunk.iterrows():
+        key = (row['state'], row['district'])
+        meta = mapping.get(key)
+        if meta and meta['suggestion_confidence'] in APPLY_LEVELS and meta['canonical_state_suggestion']:
+            chunk.at[idx,'state_clean'] = meta['canonical_state_suggestion']
+            chunk.at[idx,'district_clean'] = meta['canonical_district_suggestion']
+            applied_count += 1
+        else:
+
+            review_rows.append({
+                'original_state': row['state'],
+                'original_district': row['district'],
+                'suggested_state': meta['suggested_state'] if meta else '',
+                'suggested_district': meta['suggested_district'] if meta else '',
+                'canonical_suggestion': meta['canonical_district_suggestion'] if meta else '',
+                'suggestion_confidence': meta['suggestion_confidence'] if meta else '',
+                'notes': meta['notes'] if meta else ''
+            })
+    return chunk, applied_count, review_rows
+
 def apply_to_dataset(ds):
     sug_file = SUGGESTION_FILES[ds]
     merged_file = MERGED_FILES[ds]
@@ -53,36 +82,14 @@ def apply_to_dataset(ds):
 
 
     chunks = pd.read_csv(merged_file, chunksize=500000, dtype=str, low_memory=False)
-    first_write = True
-    for chunk in chunks:
-        chunk = chunk.fillna('')
-        chunk['state_clean'] = chunk['state']
-        chunk['district_clean'] = chunk['district']
-        for idx, row in chunk.iterrows():
-            key = (row['state'], row['district'])
-            meta = mapping.get(key)
-            if meta and meta['suggestion_confidence'] in APPLY_LEVELS and meta['canonical_state_suggestion']:
-                chunk.at[idx,'state_clean'] = meta['canonical_state_suggestion']
-                chunk.at[idx,'district_clean'] = meta['canonical_district_suggestion']
-                applied_count += 1
-            else:
-
-                review_rows.append({
-                    'original_state': row['state'],
-                    'original_district': row['district'],
-                    'suggested_state': meta['suggested_state'] if meta else '',
-                    'suggested_district': meta['suggested_district'] if meta else '',
-                    'canonical_suggestion': meta['canonical_district_suggestion'] if meta else '',
-                    'suggestion_confidence': meta['suggestion_confidence'] if meta else '',
-                    'notes': meta['notes'] if meta else ''
-                })
-            total_rows += 1
-
-        if first_write:
-            chunk.to_csv(out_file, index=False, mode='w')
-            first_write = False
-        else:
-            chunk.to_csv(out_file, index=False, mode='a', header=False)
+    results = map_chunks(suggest_chunk, prefetch(chunks), shared=mapping)
+    with ChunkWriter(out_file) as out:
+        for chunk, n_applied, chunk_review in results:
+            applied_count += n_applied
+            review_rows.extend(chunk_review)
+            total_rows += len(chunk)
+
+            out.write(chunk)
 
     review_df = pd.DataFrame(review_rows).drop_duplicates(subset=['original_state','original_district'])
     review_df.to_csv(DOCS / f"final_mapping_remaining_{ds}.csv", index=False)
@@ -92,6 +99,5 @@ def apply_to_dataset(ds):
 
 if __name__ == "__main__":
     print("APPLY_LEVELS:", APPLY_LEVELS)
-    for ds in ['enrolment','demographic','biometric']:
-        apply_to_dataset(ds)
+    fan_out(apply_to_dataset, DATASETS)
     print("Done. Check docs/final_mapping_remaining_*.csv for what to review manually.")
\ No newline at end of file
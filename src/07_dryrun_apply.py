@@ -2,6 +2,8 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_pipeline import DATASETS, fan_out
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -49,10 +51,9 @@ def dry_run_for_dataset(ds):
     print("Sample pairs that would be applied (up to 30):")
     for idx, t in enumerate(to_apply_pairs[:30]):
         key, conf, cs, cd = t
-        print(f"{i+1:02d}. {key[0]}  /  {key[1]}  ->  {cs}  /  {cd}   (conf={conf})")
+        print(f"{idx+1:02d}. {key[0]}  /  {key[1]}  ->  {cs}  /  {cd}   (conf={conf})")
     return len(uniq_pairs), len(to_apply_pairs), to_apply_pairs
 
 if __name__ == "__main__":
-    for ds in ['enrolment','demographic','biometric']:
-        dry_run_for_dataset(ds)
+    fan_out(dry_run_for_dataset, DATASETS)
     print("\nDry-run complete. No files changed.")
\ No newline at end of file
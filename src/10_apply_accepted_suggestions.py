@@ -2,6 +2,8 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -36,9 +38,31 @@ for _, r in accepted.iterrows():
     }
 
 
-for ds, sugg_path in SUGGESTION_FILES.entries():
+def accept_chunk(chunk, mapping):
+    """The chunk with the accepted mappings applied, how many rows took one, and the pairs left for review."""
+    chunk = chunk.fillna('')
+    chunk['state_clean'] = chunk['state']
+    chunk['district_clean'] = chunk['district']
+    applied_rows = 0
+    review_pairs = set()
+    for idx, row in chunk.iterrows():
+        key = (row['state'], row['district'])
+        if key in mapping:
+            meta = mapping[key]
+            if meta['canonical_state'] and meta['canonical_district']:
+                chunk.at[idx,'state_clean'] = meta['canonical_state']
+                chunk.at[idx,'district_clean'] = meta['canonical_district']
+                applied_rows += 1
+            else:
+                review_pairs.add(key)
+        else:
+            review_pairs.add(key)
+    return chunk, applied_rows, review_pairs
+
+
+def apply_dataset(ds):
     print("Processing dataset:", ds)
-    sug_df = pd.read_csv(sugg_path, dtype=str).fillna('')
+    sug_df = pd.read_csv(SUGGESTION_FILES[ds], dtype=str).fillna('')
 
     mapping = {}
     for _, r in sug_df.iterrows():
@@ -60,30 +84,14 @@ for ds, sugg_path in SUGGESTION_FILES.entries():
     review_pairs = set()
 
     reader = pd.read_csv(merged_file, chunksize=500000, dtype=str, low_memory=False)
-    first_write = True
-    for chunk in reader:
-        chunk = chunk.fillna('')
-        chunk['state_clean'] = chunk['state']
-        chunk['district_clean'] = chunk['district']
-        for idx, row in chunk.iterrows():
-            key = (row['state'], row['district'])
-            if key in mapping:
-                meta = mapping[key]
-                if meta['canonical_state'] and meta['canonical_district']:
-                    chunk.at[idx,'state_clean'] = meta['canonical_state']
-                    chunk.at[idx,'district_clean'] = meta['canonical_district']
-                    applied_rows += 1
-                else:
-                    review_pairs.add(key)
-            else:
-                review_pairs.add(key)
-            total_rows += 1
+    results = map_chunks(accept_chunk, prefetch(reader), shared=mapping)
+    with ChunkWriter(out_file) as out:
+        for chunk, n_applied, chunk_review in results:
+            applied_rows += n_applied
+            review_pairs.update(chunk_review)
+            total_rows += len(chunk)
 
-        if first_write:
-            chunk.to_csv(out_file, index=False, mode='w')
-            first_write = False
-        else:
-            chunk.to_csv(out_file, index=False, mode='a', header=False)
+            out.write(chunk)
 
     review_list = []
     for key in sorted(review_pairs):
@@ -116,4 +124,7 @@ for ds, sugg_path in SUGGESTION_FILES.entries():
     pd.DataFrame(review_list).drop_duplicates(subset=['original_state','original_district']).to_csv(review_out, index=False)
     print(f"  Wrote cleaned file: {out_file.name} (rows={total_rows}, applied={applied_rows}); review file: {review_out.name} (rows={len(review_list)})")
 
+
+fan_out(apply_dataset, SUGGESTION_FILES)
+
 print("Done. Review the final_review_remaining_*.csv files in docs/ and paste a sample of review rows (I'll propose canonical names).")
\ No newline at end of file
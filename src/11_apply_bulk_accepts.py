@@ -2,6 +2,8 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -40,33 +42,38 @@ def build_accept_map(sheet):
             }
     return mapping
 
+def bulk_chunk(chunk, mapping):
+    """The chunk with the auto-accepted mappings applied, how many rows took one, and the pairs left for review."""
+    chunk = chunk.fillna('')
+    chunk['state_clean'] = chunk['state']
+    chunk['district_clean'] = chunk['district']
+    applied_rows = 0
+    review_pairs = set()
+    for idx, row in chunk.iterrows():
+        key = (row['state'], row['district'])
+        meta = mapping.get(key)
+        if meta and meta['canonical_state'] and meta['canonical_district']:
+            chunk.at[idx, 'state_clean'] = meta['canonical_state']
+            chunk.at[idx, 'district_clean'] = meta['canonical_district']
+            applied_rows += 1
+        else:
+            review_pairs.add(key)
+    return chunk, applied_rows, review_pairs
+
 def apply_mapping(merged_fp, out_fp, mapping):
     print(f"Applying mapping to {merged_fp.name} -> {out_fp.name}")
     reader = pd.read_csv(merged_fp, chunksize=500000, dtype=str, low_memory=False)
     written = 0
     applied_rows = 0
     review_pairs = set()
-    first = True
-    for chunk in reader:
-        chunk = chunk.fillna('')
-        chunk['state_clean'] = chunk['state']
-        chunk['district_clean'] = chunk['district']
-        for idx, row in chunk.iterrows():
-            key = (row['state'], row['district'])
-            meta = mapping.get(key)
-            if meta and meta['canonical_state'] and meta['canonical_district']:
-                chunk.at[idx, 'state_clean'] = meta['canonical_state']
-                chunk.at[idx, 'district_clean'] = meta['canonical_district']
-                applied_rows += 1
-            else:
-                review_pairs.add(key)
-        if first:
-            chunk.to_csv(out_fp, index=False, mode='w')
-            first = False
-        else:
-            chunk.to_csv(out_fp, index=False, mode='a', header=False)
-        written += len(chunk)
-        print(f"  wrote chunk, total rows so far: {written}")
+    results = map_chunks(bulk_chunk, prefetch(reader), shared=mapping)
+    with ChunkWriter(out_fp) as out:
+        for chunk, n_applied, chunk_review in results:
+            applied_rows += n_applied
+            review_pairs.update(chunk_review)
+            out.write(chunk)
+            written += len(chunk)
+            print(f"  wrote chunk, total rows so far: {written}")
 
     review_rows = []
     for key in sorted(review_pairs):
@@ -75,34 +82,38 @@ def apply_mapping(merged_fp, out_fp, mapping):
     review_df = pd.DataFrame(review_rows)
     return written, applied_rows, review_df
 
+def apply_dataset(ds):
+    try:
+        sug_df = load_bulk_suggestions(SUG_FILES[ds])
+    except FileNotFoundError as e:
+        print("Skipping", ds, ":", e)
+        return None
+
+
+    if 'proposed_canonical_district' not in sug_df.columns and 'canonical_district_suggestion' in sug_df.columns:
+        sug_df = sug_df.rename(columns={'canonical_district_suggestion':'proposed_canonical_district',
+                                        'canonical_state_suggestion':'proposed_canonical_state'})
+    if 'action' not in sug_df.columns:
+
+        if 'suggestion_confidence' in sug_df.columns:
+            sug_df['action'] = sug_df['suggestion_confidence'].apply(lambda val: 'auto_accept' if str(val).startswith('auto') else 'manual_review')
+        else:
+            sug_df['action'] = 'manual_review'
+    mapping = build_accept_map(sug_df)
+    print(f"{ds}: loaded {len(sug_df)} suggestions, auto_accept entries: {len(mapping)}")
+    merged_fp = MERGED_FILES[ds]
+    out_fp = OUT / f"cleaned_{ds}_applied_autoaccepts.csv"
+    written, applied_rows, review_df = apply_mapping(merged_fp, out_fp, mapping)
+    review_out = DOCS / f"final_review_remaining_{ds}.csv"
+    review_df.to_csv(review_out, index=False)
+    print(f"{ds} done: applied {applied_rows} rows; remaining unique pairs to review: {len(review_df)}")
+    return {'rows_written': written, 'applied_rows': applied_rows, 'remaining_review_rows': len(review_df)}
+
 if __name__ == "__main__":
     summary = {}
-    for ds, sug_fp in SUG_FILES.entries():
-        try:
-            sug_df = load_bulk_suggestions(sug_fp)
-        except FileNotFoundError as e:
-            print("Skipping", ds, ":", e)
-            continue
-
-
-        if 'proposed_canonical_district' not in sug_df.columns and 'canonical_district_suggestion' in sug_df.columns:
-            sug_df = sug_df.rename(columns={'canonical_district_suggestion':'proposed_canonical_district',
-                                            'canonical_state_suggestion':'proposed_canonical_state'})
-        if 'action' not in sug_df.columns:
-
-            if 'suggestion_confidence' in sug_df.columns:
-                sug_df['action'] = sug_df['suggestion_confidence'].apply(lambda val: 'auto_accept' if str(val).startswith('auto') else 'manual_review')
-            else:
-                sug_df['action'] = 'manual_review'
-        mapping = build_accept_map(sug_df)
-        print(f"{ds}: loaded {len(sug_df)} suggestions, auto_accept entries: {len(mapping)}")
-        merged_fp = MERGED_FILES[ds]
-        out_fp = OUT / f"cleaned_{ds}_applied_autoaccepts.csv"
-        written, applied_rows, review_df = apply_mapping(merged_fp, out_fp, mapping)
-        review_out = DOCS / f"final_review_remaining_{ds}.csv"
-        review_df.to_csv(review_out, index=False)
-        summary[ds] = {'rows_written': written, 'applied_rows': applied_rows, 'remaining_review_rows': len(review_df)}
-        print(f"{ds} done: applied {applied_rows} rows; remaining unique pairs to review: {len(review_df)}")
+    for ds, outcome in zip(SUG_FILES, fan_out(apply_dataset, SUG_FILES)):
+        if outcome:
+            summary[ds] = outcome
     print("\nSUMMARY:")
-    for kdx,v in summary.entries():
+    for k, v in summary.items():
         print(f" {k}: written={v['rows_written']}, applied={v['applied_rows']}, remaining_review_pairs={v['remaining_review_rows']}")
\ No newline at end of file
@@ -1,7 +1,11 @@
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
-import re
+
+from afi_mappings import MAPPING_PATH, load_mappings
+from afi_normalize import title_case_series
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
 
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
@@ -15,60 +19,30 @@ INPUT_FILES = {
 }
 
 
-MAPPING_FILES = [
-    DOCS / "state_district_mapping_auto_enrolment.csv",
-    DOCS / "state_district_mapping_enrolment.csv",
-    DOCS / "state_district_mapping_suggestions_enrolment.csv",
-    DOCS / "state_district_mapping_suggestions_demographic.csv",
-    DOCS / "state_district_mapping_suggestions_biometric.csv",
-    DOCS / "state_district_mapping_auto_enrolment.csv",
-    DOCS / "state_district_mapping_demographic.csv",
-    DOCS / "state_district_mapping_biometric.csv",
-    DOCS / "state_district_mapping_suggestions_enrolment.csv",
-    DOCS / "state_district_bulk_suggestions_enrolment.csv",
-    DOCS / "state_district_bulk_suggestions_demographic.csv",
-    DOCS / "state_district_bulk_suggestions_biometric.csv",
-    DOCS / "suspicious_resolution_candidates.csv",
-]
-
-def title_case(s):
-    if pd.isna(s) or s is None:
-        return ''
-    s = str(s).strip()
-    s = re.sub(r'\s+', ' ', s)
-    return ' '.join([w.capitalize() for w in s.split()])
-
-def load_mappings():
-
-    mapping = {}
-    for mp in MAPPING_FILES:
-        if not mp.exists():
-            continue
-        try:
-            sheet = pd.read_csv(mp, dtype=str).fillna('')
-        except Exception:
-            continue
-
-        for _, r in sheet.iterrows():
-            orig_s = r.get('original_state') or r.get('state') or r.get('original_state_name') or ''
-            orig_d = r.get('original_district') or r.get('district') or ''
+APPLIED = ['canonical_state', 'canonical_district', 'state_clean', 'district_clean']
 
-            canon_s = r.get('canonical_state') or r.get('canonical_state_suggestion') or r.get('proposed_canonical_state') or r.get('suggested_state') or ''
-            canon_d = r.get('canonical_district') or r.get('canonical_district_suggestion') or r.get('proposed_canonical_district') or r.get('proposed_canonical_district') or r.get('suggested_district') or ''
-            key = (orig_s, orig_d)
+def lookup(mapping, chunk):
+    """Whether each row's (state, district) is mapped, and the mapping columns per row ('' where not)."""
+    if len(mapping):
+        pos = mapping.index.get_indexer(pd.MultiIndex.from_arrays([chunk['state'], chunk['district']]))
+    else:
+        pos = np.full(len(chunk), -1)
+    # position -1 picks the trailing blank
+    return pos >= 0, {c: np.append(mapping[c].to_numpy(dtype=object), '')[pos] for c in APPLIED}
 
-            if key not in mapping:
-                if canon_s or canon_d:
-                    mapping[key] = (canon_s.strip(), canon_d.strip())
-            else:
+def finalize_chunk(chunk, mapping):
+    """The chunk with state_clean / district_clean set, and how many of its rows took a canonical value."""
+    chunk = chunk.fillna('')
 
-                ex_s, ex_d = mapping[key]
-                new_s = canon_s.strip() if canon_s.strip() else ex_s
-                new_d = canon_d.strip() if canon_d.strip() else ex_d
-                mapping[key] = (new_s, new_d)
-    return mapping
+    hit, canon = lookup(mapping, chunk)
+    has_s = canon['canonical_state'] != ''
+    has_d = canon['canonical_district'] != ''
+    chunk['state_clean'] = np.where(has_s, canon['state_clean'], title_case_series(chunk['state']))
+    chunk['district_clean'] = np.where(has_d, canon['district_clean'], title_case_series(chunk['district']))
+    return chunk, int((hit & (has_s | has_d)).sum())
 
-def finalize_dataset(name, in_fp):
+def finalize_dataset(name, mapping):
+    in_fp = INPUT_FILES[name]
     if not in_fp.exists():
         print(f"[WARN] input missing: {in_fp}  (skipping {name})")
         return None
@@ -76,39 +50,17 @@ def finalize_dataset(name, in_fp):
     df_iter = pd.read_csv(in_fp, chunksize=500000, dtype=str, low_memory=False)
     out_fp = OUT / f"cleaned_{name}_final_nodrop.csv"
     summary_rows = []
-    mapping = load_mappings()
     total = 0
     applied = 0
     kept_original = 0
-    first = True
-    for chunk in df_iter:
-        chunk = chunk.fillna('')
-
-        chunk['state_clean'] = chunk['state'].apply(title_case)
-        chunk['district_clean'] = chunk['district'].apply(title_case)
-
-        for idx, row in chunk.iterrows():
-            key = (row.get('state',''), row.get('district',''))
-            if key in mapping:
-                canon_s, canon_d = mapping[key]
-                if canon_s:
-                    chunk.at[idx, 'state_clean'] = title_case(canon_s)
-                if canon_d:
-                    chunk.at[idx, 'district_clean'] = title_case(canon_d)
+    results = map_chunks(finalize_chunk, prefetch(df_iter), shared=mapping)
+    with ChunkWriter(out_fp) as out:
+        for chunk, n_applied in results:
+            applied += n_applied
+            kept_original += len(chunk) - n_applied
+            total += len(chunk)
 
-                if canon_s or canon_d:
-                    applied += 1
-                else:
-                    kept_original += 1
-            else:
-                kept_original += 1
-            total += 1
-
-        if first:
-            chunk.to_csv(out_fp, index=False, mode='w')
-            first = False
-        else:
-            chunk.to_csv(out_fp, index=False, header=False, mode='a')
+            out.write(chunk)
 
     summary_rows.append({
         'dataset': name,
@@ -121,8 +73,7 @@ def finalize_dataset(name, in_fp):
     return (total, applied, kept_original)
 
 if __name__ == "__main__":
-    results = {}
-    for name, file_handle in INPUT_FILES.entries():
-        outcome = finalize_dataset(name, file_handle)
-        results[name] = outcome
+    mapping = load_mappings()
+    print(f"Mapping {MAPPING_PATH.name}: {len(mapping)} keys, hash {mapping.attrs['hash'][:12]}")
+    results = dict(zip(INPUT_FILES, fan_out(finalize_dataset, INPUT_FILES, mapping)))
     print("Done. Summary written to docs/cleaning_summary_<dataset>.csv")
\ No newline at end of file
@@ -2,6 +2,9 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_io import read_table
+from afi_overlay import table_exists
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -16,7 +19,7 @@ ENR_CANDIDATES = [
 
 def pick_file(cands):
     for p in cands:
-        if p.exists():
+        if table_exists(p):
             return p
     return None
 
@@ -24,8 +27,11 @@ ENR = pick_file(ENR_CANDIDATES)
 if ENR is None:
     raise FileNotFoundError("No enrolment cleaned file found. Expected one of: " + ", ".join(str(p.name) for p in ENR_CANDIDATES))
 
+AUDIT_COLS = ['state', 'district', 'state_clean', 'district_clean', 'enrol_total',
+              'age_0_5', 'age_5_17', 'age_18_greater', 'enrol_age_5_17']
+
 def load_enrol(file_handle):
-    sheet = pd.read_csv(file_handle, dtype=str, low_memory=False).fillna('')
+    sheet = read_table(file_handle, columns=AUDIT_COLS, dtype=str, low_memory=False).fillna('')
 
     if 'enrol_total' in sheet.columns:
         sheet['enrol_total'] = pd.to_numeric(sheet['enrol_total'], errors='coerce').fillna(0)
@@ -2,6 +2,8 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_overlay import table_exists, write_overlay, write_view
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -18,43 +20,25 @@ def load_mapping():
     if not MAPPING_CSV.exists():
         raise FileNotFoundError(f"Missing mapping file {MAPPING_CSV}")
     m = pd.read_csv(MAPPING_CSV, dtype=str).fillna('')
-    m['key'] = list(zip(m['original_state'], m['original_district']))
-    mapping = {kdx: (r['canonical_state'], r['canonical_district']) for kdx, r in zip(m['key'], m.to_dict('records'))}
-    return mapping
-
-def apply_to_file(in_fp, out_fp, mapping):
-    if not in_fp.exists():
-        print(f"Missing {in_fp} - skipping")
-        return
-    reader = pd.read_csv(in_fp, chunksize=200000, dtype=str, low_memory=False)
-    first = True
-    total = 0
-    applied = 0
-    for chunk in reader:
-        chunk = chunk.fillna('')
-        for idx, row in chunk.iterrows():
-            key = (row.get('state',''), row.get('district',''))
-            if key in mapping:
-                canon_s, canon_d = mapping[key]
-                if canon_s:
-                    chunk.at[idx, 'state_clean'] = canon_s
-                if canon_d:
-                    chunk.at[idx, 'district_clean'] = canon_d
-                applied += 1
-            total += 1
-        if first:
-            chunk.to_csv(out_fp, index=False, mode='w')
-            first = False
-        else:
-            chunk.to_csv(out_fp, index=False, header=False, mode='a')
-    print(f"Processed {in_fp.name}: rows={total}, applied_map_rows={applied}")
+    # a blank canonical value leaves that field as it is
+    return pd.DataFrame({
+        'state': m['original_state'],
+        'district': m['original_district'],
+        'state_clean': m['canonical_state'].where(m['canonical_state'] != '', None),
+        'district_clean': m['canonical_district'].where(m['canonical_district'] != '', None),
+    })
 
 def main():
-    mapping = load_mapping()
-    for kdx, in_fp in INPUTS.entries():
-        out_fp = OUT / f"cleaned_{k}_final_fixed.csv"
-        apply_to_file(in_fp, out_fp, mapping)
-    print("Applied manual mapping fixes. New files: cleaned_*_final_fixed.csv")
+    overlay = write_overlay(load_mapping(), "manual_mapping_fixes", source=MAPPING_CSV)
+    print(f"Wrote overlay {overlay}")
+    for ds, in_fp in INPUTS.items():
+        if not table_exists(in_fp):
+            print(f"Missing {in_fp} - skipping")
+            continue
+        out_fp = OUT / f"cleaned_{ds}_final_fixed.csv"
+        view = write_view(out_fp, in_fp, overlay, script="14_apply_manual_mapping_fixes")
+        print(f"{out_fp.name}: {in_fp.name} + {overlay.name} -> {view.name}")
+    print("Applied manual mapping fixes as an overlay. Views: cleaned_*_final_fixed (python src/afi_overlay.py materialize ... writes them out)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
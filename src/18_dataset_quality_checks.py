@@ -4,6 +4,9 @@ import pandas as pd
 from pathlib import Path
 import re
 
+from afi_io import read_table
+from afi_overlay import table_exists
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -21,19 +24,19 @@ AGE_COLS_BIO = ["bio_age_5_17","bio_age_17_"]
 
 DOCS.mkdir(parents=True, exist_ok=True)
 
-def safe_read(file_handle):
-    if not file_handle.exists():
-        print(f"[MISSING] {fp}")
+def safe_read(file_handle, columns=None):
+    if not table_exists(file_handle):
+        print(f"[MISSING] {file_handle}")
         return None
 
-    sheet = pd.read_csv(file_handle, dtype=str, low_memory=False).fillna('')
+    sheet = read_table(file_handle, columns=columns, dtype=str, low_memory=False).fillna('')
     return sheet
 
 reports = []
 
 
 summary = []
-for name, file_handle in FILES.entries():
+for name, file_handle in FILES.items():
     sheet = safe_read(file_handle)
     if sheet is None:
         summary.append((name, "MISSING", None))
@@ -48,8 +51,8 @@ pd.DataFrame(summary, columns=["dataset","nrows","columns_preview"]).to_csv(DOCS
 
 
 cov_rows = []
-for name, file_handle in FILES.entries():
-    sheet = safe_read(file_handle)
+for name, file_handle in FILES.items():
+    sheet = safe_read(file_handle, columns=['date', 'period', 'state'])
     if sheet is None:
         continue
 
@@ -70,8 +73,8 @@ for name, file_handle in FILES.entries():
     cov_rows.append((name, state_grp.shape[0], state_grp['count'].sum()))
 
 short_cov = []
-for name, file_handle in FILES.entries():
-    sheet = safe_read(file_handle)
+for name, file_handle in FILES.items():
+    sheet = safe_read(file_handle, columns=['date', 'period', 'state'])
     if sheet is None:
         continue
     if 'date' in sheet.columns:
@@ -85,7 +88,7 @@ for name, file_handle in FILES.entries():
     short.to_csv(DOCS / f"short_coverage_states_{name}.csv", index=False)
     short_cov.append((name, len(short)))
 
-for name, file_handle in FILES.entries():
+for name, file_handle in FILES.items():
     sheet = safe_read(file_handle)
     if sheet is None:
         continue
@@ -98,8 +101,8 @@ for name, file_handle in FILES.entries():
 
 
 missing_reports = []
-for name, file_handle in FILES.entries():
-    sheet = safe_read(file_handle)
+for name, file_handle in FILES.items():
+    sheet = safe_read(file_handle, columns=['state', 'district', 'pincode', 'date'])
     if sheet is None:
         continue
     for col in ['state','district','pincode','date']:
@@ -110,7 +113,7 @@ pd.DataFrame(missing_reports, columns=['dataset','column','missing_count','missi
 
 
 pincode_reports = []
-for name, file_handle in FILES.entries():
+for name, file_handle in FILES.items():
     sheet = safe_read(file_handle)
     if sheet is None:
         continue
@@ -123,21 +126,21 @@ pd.DataFrame(pincode_reports, columns=['dataset','bad_pincode_count']).to_csv(DO
 
 age_summary_rows = []
 
-sheet = safe_read(FILES['enrolment'])
+sheet = safe_read(FILES['enrolment'], columns=AGE_COLS_ENR)
 if sheet is not None:
     for c in AGE_COLS_ENR:
         if c in sheet.columns:
             s = pd.to_numeric(sheet[c].fillna('0'), errors='coerce').fillna(0)
             age_summary_rows.append(('enrolment', c, int(s.sum()), int((s==0).sum()), round((s==0).mean()*100,3)))
 
-sheet = safe_read(FILES['demographic'])
+sheet = safe_read(FILES['demographic'], columns=AGE_COLS_DEM)
 if sheet is not None:
     for c in AGE_COLS_DEM:
         if c in sheet.columns:
             s = pd.to_numeric(sheet[c].fillna('0'), errors='coerce').fillna(0)
             age_summary_rows.append(('demographic', c, int(s.sum()), int((s==0).sum()), round((s==0).mean()*100,3)))
 
-sheet = safe_read(FILES['biometric'])
+sheet = safe_read(FILES['biometric'], columns=AGE_COLS_BIO)
 if sheet is not None:
     for c in AGE_COLS_BIO:
         if c in sheet.columns:
@@ -147,7 +150,7 @@ pd.DataFrame(age_summary_rows, columns=['dataset','age_col','sum_total','zero_co
 
 
 def state_totals(file_handle, age_cols):
-    sheet = safe_read(file_handle)
+    sheet = safe_read(file_handle, columns=['state'] + age_cols)
     if sheet is None:
         return None
 
@@ -9,7 +9,9 @@ Writes: docs/manual_review_suggestions.csv
 """
 import pandas as pd
 from pathlib import Path
-from difflib import SequenceMatcher
+
+from afi_fuzzcache import ScoreCache
+from afi_normalize import squash_amp, squash_amp_series
 
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
@@ -49,16 +51,10 @@ CANONICAL_STATES = [
     "Delhi","Jammu and Kashmir","Ladakh","Lakshadweep","Puducherry"
 ]
 
-def norm(s):
-    if pd.isna(s) or s is None:
-        return ""
-    s = str(s).strip()
-    s = " ".join(s.split())
-    s = s.replace("&", "and")
-    return s
+cache = ScoreCache()
 
 def best_state_match(s):
-    s_norm = norm(s).lower()
+    s_norm = squash_amp(s).lower()
     if s_norm == "":
         return ("", 0.0)
 
@@ -66,7 +62,8 @@ def best_state_match(s):
         if s_norm == c.lower():
             return (c, 1.0)
 
-    scores = [(c, SequenceMatcher(None, s_norm, c.lower()).ratio()) for c in CANONICAL_STATES]
+    ratios = cache.scores("difflib.ratio", [(s_norm, c.lower()) for c in CANONICAL_STATES])
+    scores = list(zip(CANONICAL_STATES, ratios))
     scores.sort(key=lambda val: val[1], reverse=True)
     return (scores[0][0], round(scores[0][1], 3))
 
@@ -94,8 +91,8 @@ for fname in CANDIDATES:
         else:
             continue
     sheet = sheet[['state','district']].copy()
-    sheet['state_norm'] = sheet['state'].map(norm)
-    sheet['district_norm'] = sheet['district'].map(norm)
+    sheet['state_norm'] = squash_amp_series(sheet['state'])
+    sheet['district_norm'] = squash_amp_series(sheet['district'])
     sheet['source_file'] = fname
     collected.append(sheet)
     found_files.append(fname)
@@ -150,4 +147,5 @@ output_val['canonical_district'] = ''
 cols = ['original_state','original_district','total_count','enrolment_count','demographic_count','biometric_count',
         'suggested_state','state_match_score','state_match_conf','canonical_state','canonical_district']
 output_val[cols].to_csv(DOCS / "manual_review_suggestions.csv", index=False)
-print("Wrote", DOCS / "manual_review_suggestions.csv", "— candidate files used:", found_files)
\ No newline at end of file
+print("Wrote", DOCS / "manual_review_suggestions.csv", "— candidate files used:", found_files)
+cache.report()
@@ -4,6 +4,12 @@ from pathlib import Path
 import csv
 import sys
 
+from afi_artifacts import Store
+from afi_io import iter_table
+from afi_normalize import squash_amp, squash_amp_series
+from afi_overlay import table_exists
+from afi_pipeline import DATASETS, ChunkWriter, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 DOCS = PROJECT / "docs"
 OUT = PROJECT / "outputs"
@@ -36,17 +42,9 @@ INPUT_FILES = {
 
 CHUNKSIZE = 500_000
 
-def norm(s):
-    if pd.isna(s) or s is None:
-        return ""
-    s = str(s).strip()
-    s = " ".join(s.split())
-    s = s.replace("&", "and")
-    return s
-
 def pick_input(cands):
     for p in cands:
-        if p.exists():
+        if table_exists(p):
             return p
     return None
 
@@ -57,12 +55,12 @@ def load_manual_map(path):
 
     required = {'original_state','original_district','canonical_state','canonical_district'}
     if not required.issubset(set(sheet.columns)):
-        raise ValueError(f"manual_review_suggestions.csv missing required columns: {required - set(df.columns)}")
+        raise ValueError(f"manual_review_suggestions.csv missing required columns: {required - set(sheet.columns)}")
 
     mapping = {}
     for _, r in sheet.iterrows():
-        orig_state = norm(r['original_state']).lower()
-        orig_district = norm(r['original_district']).lower()
+        orig_state = squash_amp(r['original_state']).lower()
+        orig_district = squash_amp(r['original_district']).lower()
         can_state = r['canonical_state'].strip()
         can_district = r['canonical_district'].strip()
 
@@ -70,47 +68,53 @@ def load_manual_map(path):
             mapping[(orig_state, orig_district)] = (can_state, can_district)
     return mapping, sheet
 
+def review_chunk(chunk, mapping):
+    """The chunk with the manual mapping applied, and how many rows each mapping key changed."""
+    if 'state' not in chunk.columns or 'district' not in chunk.columns:
+        raise ValueError("Input missing required columns 'state'/'district'")
+
+    state_norm = squash_amp_series(chunk['state']).str.lower()
+    dist_norm = squash_amp_series(chunk['district']).str.lower()
+    keys = list(zip(state_norm, dist_norm))
+
+    to_apply_mask = [kdx in mapping for kdx in keys]
+
+    applied_keys = {}
+    if any(to_apply_mask):
+        idxs = [idx for idx, m in enumerate(to_apply_mask) if m]
+        for idx in idxs:
+            kdx = keys[idx]
+            can_state, can_district = mapping[kdx]
+
+            chunk.iat[idx, chunk.columns.get_loc('state_clean')] = can_state if 'state_clean' in chunk.columns else can_state
+            chunk.iat[idx, chunk.columns.get_loc('district_clean')] = can_district if 'district_clean' in chunk.columns else can_district
+            applied_keys[kdx] = applied_keys.get(kdx, 0) + 1
+    return chunk, applied_keys
+
+def output_path(dataset):
+    return OUT / f"cleaned_{dataset}_final_review_applied.csv"
+
 def apply_to_dataset(dataset, mapping):
     inp = pick_input(INPUT_FILES[dataset])
     if inp is None:
         print(f"[WARN] No input file found for {dataset}. Skipping.")
         return None
-    out_fp = OUT / f"cleaned_{dataset}_final_review_applied.csv"
+    out_fp = output_path(dataset)
     print(f"Processing {dataset}: {inp} -> {out_fp}")
     applied_counts = 0
     total_rows = 0
 
     applied_keys = {}
-    reader = pd.read_csv(inp, dtype=str, low_memory=False, chunksize=CHUNKSIZE)
-    first_write = True
-    for chunk in reader:
-        total_rows += len(chunk)
-
-        if 'state' not in chunk.columns or 'district' not in chunk.columns:
-            raise ValueError(f"Input {inp} missing required columns 'state'/'district'")
-
-        state_norm = chunk['state'].fillna("").map(norm).str.lower()
-        dist_norm = chunk['district'].fillna("").map(norm).str.lower()
-        keys = list(zip(state_norm, dist_norm))
-
-        to_apply_mask = [kdx in mapping for kdx in keys]
-
-        if any(to_apply_mask):
-            idxs = [idx for idx, m in enumerate(to_apply_mask) if m]
-            for idx in idxs:
-                kdx = keys[idx]
-                can_state, can_district = mapping[kdx]
-
-                chunk.iat[idx, chunk.columns.get_loc('state_clean')] = can_state if 'state_clean' in chunk.columns else can_state
-                chunk.iat[idx, chunk.columns.get_loc('district_clean')] = can_district if 'district_clean' in chunk.columns else can_district
-                applied_counts += 1
-                applied_keys[kdx] = applied_keys.get(kdx, 0) + 1
-
-        if first_write:
-            chunk.to_csv(out_fp, index=False, quoting=csv.QUOTE_MINIMAL)
-            first_write = False
-        else:
-            chunk.to_csv(out_fp, index=False, header=False, mode='a', quoting=csv.QUOTE_MINIMAL)
+    reader = iter_table(inp, chunksize=CHUNKSIZE, dtype=str, low_memory=False)
+    results = map_chunks(review_chunk, prefetch(reader), shared=mapping)
+    with ChunkWriter(out_fp, quoting=csv.QUOTE_MINIMAL) as out:
+        for chunk, chunk_keys in results:
+            total_rows += len(chunk)
+            for kdx, count in chunk_keys.items():
+                applied_counts += count
+                applied_keys[kdx] = applied_keys.get(kdx, 0) + count
+
+            out.write(chunk)
     print(f"  -> rows processed: {total_rows}, applied mappings: {applied_counts}")
     return {
         "dataset": dataset,
@@ -125,11 +129,10 @@ def apply_to_dataset(dataset, mapping):
 def main():
     mapping, raw_df = load_manual_map(MANUAL_CSV)
     print(f"Loaded manual mapping entries to apply: {len(mapping)} (will only apply entries with non-empty canonical_district)")
-    results = []
-    for ds in ["enrolment", "demographic", "biometric"]:
-        outcome = apply_to_dataset(ds, mapping)
-        if outcome:
-            results.append(outcome)
+    store = Store(OUT / ".store")
+    for ds in DATASETS:
+        store.release(output_path(ds))   # 23_apply_state_manual_map.py snapshots these files
+    results = [outcome for outcome in fan_out(apply_to_dataset, DATASETS, mapping) if outcome]
 
     summary_rows = []
     for r in results:
@@ -146,13 +149,13 @@ def main():
 
         applied_keys_all = {}
         for r in results:
-            for kdx, count in r['applied_keys'].entries():
+            for kdx, count in r['applied_keys'].items():
                 applied_keys_all[kdx] = applied_keys_all.get(kdx, 0) + count
 
-        manual_pairs = set((norm(val).lower(), norm(val2).lower()) for val,val2 in zip(raw_df['original_state'], raw_df['original_district']))
+        manual_pairs = set((squash_amp(val).lower(), squash_amp(val2).lower()) for val,val2 in zip(raw_df['original_state'], raw_df['original_district']))
         not_applied = []
         for _, row in raw_df.iterrows():
-            kdx = (norm(row['original_state']).lower(), norm(row['original_district']).lower())
+            kdx = (squash_amp(row['original_state']).lower(), squash_amp(row['original_district']).lower())
             if kdx not in applied_keys_all:
                 not_applied.append({
                     "original_state": row['original_state'],
@@ -2,11 +2,16 @@
 import pandas as pd
 from pathlib import Path
 
+from afi_io import read_table
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
 DOCS.mkdir(exist_ok=True)
 
+PAIR_COLS = ["state", "district", "state_clean", "district_clean"]
+SAMPLE_ROWS = 100
+
 FILES = {
     "enrolment": OUT / "cleaned_enrolment_final_canonical_state_applied_extra_applied.csv",
     "demographic": OUT / "cleaned_demographic_final_canonical_state_applied_extra_applied.csv",
@@ -17,12 +22,12 @@ def short(sheet):
     return sheet.head(5).to_dict(orient='records')
 
 reports = []
-for name, file_handle in FILES.entries():
+for name, file_handle in FILES.items():
     if not file_handle.exists():
-        print(f"[MISSING] {name} file not found: {fp}")
+        print(f"[MISSING] {name} file not found: {file_handle}")
         continue
     print(f"\n--- {name} ---")
-    sheet = pd.read_csv(file_handle, dtype=str, low_memory=False)
+    sheet = read_table(file_handle, columns=PAIR_COLS, dtype=str, low_memory=False)
     n = len(sheet)
 
     state_unique = sheet['state'].fillna('').str.strip().nunique()
@@ -49,7 +54,9 @@ for name, file_handle in FILES.entries():
     reports.append(report)
 
     top_changes.to_csv(DOCS / f"sanity_top_changes_{name}.csv", index=False)
-    sheet.head(100).to_csv(DOCS / f"sanity_sample_head_{name}.csv", index=False)
+    sample = pd.read_csv(file_handle, dtype=str, nrows=SAMPLE_ROWS)
+    sample[['orig_pair', 'clean_pair']] = sheet[['orig_pair', 'clean_pair']].head(SAMPLE_ROWS).to_numpy()
+    sample.to_csv(DOCS / f"sanity_sample_head_{name}.csv", index=False)
     print(f"rows: {n}, state_unique: {state_unique}, state_clean_unique: {stateclean_unique}, empty_state_clean: {empty_stateclean}")
     print(f"rows with state/district changed: {mismatch} ({mismatch_pct:.2f}%)")
     print(f"wrote docs/sanity_top_changes_{name}.csv and sanity_sample_head_{name}.csv")
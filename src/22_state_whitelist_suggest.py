@@ -1,9 +1,12 @@
 
 import csv
-import difflib
 from pathlib import Path
 from collections import Counter, defaultdict
 
+from afi_fuzzcache import ScoreCache
+from afi_io import iter_table
+from afi_normalize import squash
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -26,35 +29,32 @@ WHITELIST = [
 ]
 
 
-def norm(s):
-    if s is None: return ""
-    return " ".join(s.strip().split())
-
-
 counts = defaultdict(lambda: Counter())
 total_counts = Counter()
-for name, file_handle in FILES.entries():
+for name, file_handle in FILES.items():
     if not file_handle.exists():
         print("missing", file_handle)
         continue
-    with file_handle.open('r', encoding='utf-8', errors='replace') as file_handle:
-        reader = csv.DictReader(file_handle)
-        for r in reader:
-            st = norm(r.get('state_clean') or "")
-            counts[name][st] += 1
-            total_counts[st] += 1
+    for chunk in iter_table(file_handle, columns=["state_clean"], dtype=str, keep_default_na=False,
+                            encoding='utf-8', encoding_errors='replace'):
+        values = chunk['state_clean'].fillna('') if 'state_clean' in chunk.columns else [""] * len(chunk)
+        for raw, n in Counter(values).items():
+            st = squash(raw)
+            counts[name][st] += n
+            total_counts[st] += n
 
 
 noncanon = []
-for st, tot in total_counts.entries():
+cache = ScoreCache()
+for st, tot in total_counts.items():
     if st == "": continue
     if st not in WHITELIST:
 
 
         best = None
         best_score = 0.0
-        for w in WHITELIST:
-            score = difflib.SequenceMatcher(None, st.lower(), w.lower()).ratio()
+        ratios = cache.scores("difflib.ratio", [(st.lower(), w.lower()) for w in WHITELIST])
+        for w, score in zip(WHITELIST, ratios):
             if score > best_score:
                 best_score = score
                 best = w
@@ -82,4 +82,5 @@ with outp.open('w', newline='', encoding='utf-8') as file_handle:
     for r in noncanon:
         writer.writerow({kdx: r.get(kdx,"") for kdx in keys})
 
-print("Wrote", outp)
\ No newline at end of file
+print("Wrote", outp)
+cache.report()
\ No newline at end of file
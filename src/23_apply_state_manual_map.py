@@ -6,12 +6,16 @@ Run it from project root while your venv is active.
 """
 
 import csv
-import difflib
-import shutil
 from pathlib import Path
-from datetime import datetime
+import numpy as np
 import pandas as pd
 
+from afi_artifacts import Store
+from afi_fuzzcache import ScoreCache
+from afi_io import read_table
+from afi_normalize import squash_series
+from afi_pipeline import ChunkWriter, chunk_workers, dataset_workers, fan_out, map_chunks, prefetch
+
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -47,94 +51,129 @@ MANUAL_MAP = {
 
 
 FUZZY_THRESH = 0.92
+CACHE_STATS = ("hits_memory", "hits_disk", "computed")
 
-def norm(s):
-    if pd.isna(s): return ""
-    return " ".join(str(s).strip().split())
+cache = ScoreCache()
 
 def best_fuzzy(s):
     best = None
     best_score = 0.0
-    for w in WHITELIST:
-        score = difflib.SequenceMatcher(None, s.lower(), w.lower()).ratio()
+    ratios = cache.scores("difflib.ratio", [(s.lower(), w.lower()) for w in WHITELIST])
+    for w, score in zip(WHITELIST, ratios):
         if score > best_score:
             best_score = score
             best = w
     return best, best_score
 
-timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-revert_rows = []
-apply_log_rows = []
+def resolve_state(s_norm):
+    """(state_canonical, source) for one normalized state_clean value."""
+    if s_norm in WHITELIST:
+        return s_norm, "whitelist"
+    if s_norm in MANUAL_MAP:
+        return MANUAL_MAP[s_norm], "manual_map"
+    best, score = best_fuzzy(s_norm)
+    if best and score >= FUZZY_THRESH:
+        return best, "fuzzy_auto"
+    return s_norm, "needs_review"
+
+def resolve_chunk(chunk, _):
+    """
+    The chunk with state_canonical set, its rows per source, the distinct (state_clean,
+    state_canonical) pairs it remapped in first-seen order, and the fuzzy cache lookups it made.
+    """
+    before = [getattr(cache, k) for k in CACHE_STATS]
+    chunk = chunk.fillna("")
+    counts = {"whitelist":0, "manual_map":0, "fuzzy_auto":0, "needs_review":0}
 
-for ds, file_handle in FILES.entries():
+    # each distinct state is resolved once, then broadcast back to its rows
+    state_prev = squash_series(chunk['state_clean'] if 'state_clean' in chunk.columns else pd.Series("", index=chunk.index))
+    codes, uniques = pd.factorize(state_prev)
+    resolved = [resolve_state(s_norm) for s_norm in uniques]
+    canonical = np.array([c for c, _ in resolved], dtype=object)
+    sources = np.array([src for _, src in resolved], dtype=object)
+    reverts = [(s_norm, c) for s_norm, (c, src) in zip(uniques, resolved) if src in ("manual_map", "fuzzy_auto")]
+
+    source_col = sources[codes]
+    for source, n in zip(*np.unique(source_col, return_counts=True)):
+        counts[source] += int(n)
+
+    chunk['state_clean_prev'] = state_prev.to_numpy()
+    chunk['state_canonical'] = canonical[codes]
+    chunk['state_canonical_source'] = source_col
+    return chunk, counts, reverts, [getattr(cache, k) - b for k, b in zip(CACHE_STATS, before)]
+
+def open_cache(shared=None):
+    # a worker process must not use, or close, the SQLite connection it inherited
+    global cache, inherited_cache
+    inherited_cache, cache = cache, ScoreCache()
+    return shared
+
+def output_path(ds):
+    return OUT / f"cleaned_{ds}_final_canonical_state_applied.csv"
+
+def apply_dataset(ds):
+    """
+    The apply-log row for one dataset, its (state_clean, state_canonical) pairs in row
+    order and the fuzzy cache lookups it made; None when its input is missing.
+    """
+    file_handle = FILES[ds]
     if not file_handle.exists():
-        print(f"[WARN] file missing: {fp}")
-        continue
-
-    backup_fp = OUT / f"{fp.name}.bak.{timestamp}"
-    shutil.copy2(file_handle, backup_fp)
-    print(f"[INFO] backed up {fp} -> {backup_fp}")
+        print(f"[WARN] file missing: {file_handle}")
+        return None
 
-    out_fp = OUT / f"cleaned_{ds}_final_canonical_state_applied.csv"
+    out_fp = output_path(ds)
+    before = [getattr(cache, k) for k in CACHE_STATS]
 
     chunksize = 100000
     total_rows = 0
     counts = {"whitelist":0, "manual_map":0, "fuzzy_auto":0, "needs_review":0}
+    reverts = []
 
 
     reader = pd.read_csv(file_handle, dtype=str, low_memory=False, chunksize=chunksize)
-    first = True
-    for chunk in reader:
-        chunk = chunk.fillna("")
-        total_rows += len(chunk)
-
-        state_prev = []
-        state_canonical = []
-        source_col = []
-        for s in chunk.get('state_clean', pd.Series([""]*len(chunk))):
-            s_norm = norm(s)
-            state_prev.append(s_norm)
-            if s_norm in WHITELIST:
-                state_canonical.append(s_norm)
-                source_col.append("whitelist")
-                counts["whitelist"] += 1
-            elif s_norm in MANUAL_MAP:
-                mapped = MANUAL_MAP[s_norm]
-                state_canonical.append(mapped)
-                source_col.append("manual_map")
-                counts["manual_map"] += 1
-                revert_rows.append((s_norm, mapped))
-            else:
-                best, score = best_fuzzy(s_norm)
-                if best and score >= FUZZY_THRESH:
-                    state_canonical.append(best)
-                    source_col.append("fuzzy_auto")
-                    counts["fuzzy_auto"] += 1
-                    revert_rows.append((s_norm, best))
-                else:
-                    state_canonical.append(s_norm)
-                    source_col.append("needs_review")
-                    counts["needs_review"] += 1
-
-
-        chunk['state_clean_prev'] = state_prev
-        chunk['state_canonical'] = state_canonical
-        chunk['state_canonical_source'] = source_col
-
-
-        if first:
-            chunk.to_csv(out_fp, index=False, mode='w', encoding='utf-8')
-            first = False
-        else:
-            chunk.to_csv(out_fp, index=False, header=False, mode='a', encoding='utf-8')
-
-    apply_log_rows.append({
+    results = map_chunks(resolve_chunk, prefetch(reader), setup=open_cache)
+    with ChunkWriter(out_fp, encoding='utf-8') as out:
+        for chunk, chunk_counts, chunk_reverts, lookups in results:
+            total_rows += len(chunk)
+            for source, n in chunk_counts.items():
+                counts[source] += n
+            reverts.extend(chunk_reverts)
+            if chunk_workers() > 1:
+                # counted in a worker's cache; add them to this process's
+                for k, n in zip(CACHE_STATS, lookups):
+                    setattr(cache, k, getattr(cache, k) + n)
+
+            out.write(chunk)
+
+    log_row = {
         "dataset": ds,
         "input_file": str(file_handle),
         "output_file": str(out_fp),
         "rows_processed": total_rows,
         **counts
-    })
+    }
+    return log_row, reverts, [getattr(cache, k) - b for k, b in zip(CACHE_STATS, before)]
+
+revert_rows = []
+apply_log_rows = []
+
+store = Store(OUT / ".store")
+snap = store.snapshot([p for p in FILES.values() if p.exists()], script="23_apply_state_manual_map", label="inputs")
+if snap:
+    print(f"[INFO] snapshot {snap['id']} of {len(snap['files'])} input file(s) in {store.root}")
+for ds in FILES:
+    store.release(output_path(ds))
+
+for outcome in fan_out(apply_dataset, FILES, setup=open_cache):
+    if outcome is None:
+        continue
+    log_row, reverts, lookups = outcome
+    apply_log_rows.append(log_row)
+    revert_rows.extend(reverts)
+    if dataset_workers(len(FILES)) > 1:
+        # counted in a dataset process's cache; add them to the one reported below
+        for k, n in zip(CACHE_STATS, lookups):
+            setattr(cache, k, getattr(cache, k) + n)
 
 
 log_fp = DOCS / "state_canonical_apply_log.csv"
@@ -160,8 +199,8 @@ print("WROTE:", revert_fp)
 
 needs_fp = DOCS / "state_canonical_needs_review.csv"
 needs = {}
-for ds, file_handle in FILES.entries():
-    sheet = pd.read_csv(OUT / f"cleaned_{ds}_final_canonical_state_applied.csv", dtype=str, low_memory=False)
+for ds in FILES:
+    sheet = read_table(output_path(ds), columns=["state_canonical"], dtype=str, low_memory=False)
     for v in sheet['state_canonical'].fillna("").unique():
         if v and v not in WHITELIST:
             needs[v] = needs.get(v, 0) + (sheet['state_canonical']==v).sum()
@@ -169,8 +208,9 @@ for ds, file_handle in FILES.entries():
 with needs_fp.open('w', newline='', encoding='utf-8') as file_handle:
     writer = csv.writer(file_handle)
     writer.writerow(["state_canonical","total_count"])
-    for kdx,v in sorted(needs.entries(), key=lambda val: val[1], reverse=True):
+    for kdx,v in sorted(needs.items(), key=lambda val: val[1], reverse=True):
         writer.writerow([kdx,v])
 print("WROTE:", needs_fp)
+cache.report()
 
 print("DONE. Check docs/state_canonical_apply_log.csv and docs/state_canonical_needs_review.csv")
\ No newline at end of file
@@ -1,8 +1,11 @@
 
 
-import csv, shutil
+import csv
 from pathlib import Path
 import pandas as pd
+
+from afi_artifacts import Store
+from afi_io import read_table
 PROJECT = Path(__file__).resolve().parents[1]
 OUT = PROJECT / "outputs"
 DOCS = PROJECT / "docs"
@@ -26,9 +29,10 @@ EXTRA_MAP = {
 }
 
 
-for file_handle in FILES:
-    if file_handle.exists():
-        shutil.copy2(file_handle, file_handle.with_suffix(file_handle.suffix + ".bak.extra_map"))
+store = Store(OUT / ".store")
+snap = store.snapshot([p for p in FILES if p.exists()], script="24_apply_extra_state_mappings", label="inputs")
+if snap:
+    print(f"snapshot {snap['id']} of {len(snap['files'])} input file(s) in {store.root}")
 
 
 for file_handle in FILES:
@@ -37,7 +41,7 @@ for file_handle in FILES:
     sheet = pd.read_csv(file_handle, dtype=str, low_memory=False)
     sheet = sheet.fillna("")
     applied = []
-    for src, tgt in EXTRA_MAP.entries():
+    for src, tgt in EXTRA_MAP.items():
         mask = sheet['state_canonical'].str.strip().eq(src)
         if mask.any():
             sheet.loc[mask, 'state_canonical'] = tgt
@@ -45,6 +49,7 @@ for file_handle in FILES:
             sheet.loc[mask, 'state_canonical_source'] = 'manual_map'
             applied.append((src, tgt, int(mask.sum())))
     outp = OUT / file_handle.name.replace(".csv", "_extra_applied.csv")
+    store.release(outp)
     sheet.to_csv(outp, index=False)
     print(f"WROTE {outp}  (applied mappings: {applied})")
 
@@ -61,7 +66,7 @@ with open(revert_fp, "a", newline="", encoding="utf-8") as fh:
     w = csv.writer(fh)
     if revert_fp.stat().st_size == 0:
         w.writerow(["state_clean","state_canonical"])
-    for s,t in EXTRA_MAP.entries():
+    for s,t in EXTRA_MAP.items():
         if (s,t) not in existing:
             w.writerow([s,t])
 print("Updated revert map:", revert_fp)
@@ -71,7 +76,7 @@ needs = {}
 for file_handle in FILES:
     p = OUT / file_handle.name.replace(".csv", "_extra_applied.csv")
     if not p.exists(): p = file_handle
-    sheet = pd.read_csv(p, dtype=str, low_memory=False)
+    sheet = read_table(p, columns=["state_canonical"], dtype=str, low_memory=False)
     for v in sheet['state_canonical'].fillna("").unique():
         if v and v not in [""] and v not in [
             "Andhra Pradesh","Arunachal Pradesh","Assam","Bihar","Chhattisgarh","Goa","Gujarat",
@@ -87,6 +92,6 @@ needs_fp = DOCS / "state_canonical_needs_review.csv"
 with open(needs_fp, "w", newline="", encoding="utf-8") as fh:
     w = csv.writer(fh)
     w.writerow(["state_canonical","total_count"])
-    for kdx,v in sorted(needs.entries(), key=lambda val: val[1], reverse=True):
+    for kdx,v in sorted(needs.items(), key=lambda val: val[1], reverse=True):
         w.writerow([kdx,v])
 print("WROTE needs review:", needs_fp)
\ No newline at end of file
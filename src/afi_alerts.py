@@ -0,0 +1,252 @@
+"""
+afi_alerts.py
+
+Trend-based early-warning alerts over the district-month AFI series.
+
+Reads outputs/afi_district_month.csv (from compute_afi_advanced_fixed.py),
+builds one AFI series per (state, district) - or per pincode with
+--level pincode - and writes outputs/alerts.csv with the onset period and
+magnitude of every detected shift.
+
+Two passes:
+  1. Pre-filter, vectorized over all series at once (series x periods matrix):
+     a trailing-window z-score of each month against the previous WINDOW
+     months, and a two-sided CUSUM on those z-scores. Only series whose
+     |z| or CUSUM crosses its threshold go on to pass 2.
+  2. Change-point search with ruptures (PELT) on the flagged series only,
+     in a process pool. Each breakpoint becomes one alert row with the mean
+     before/after, the shift in units of the pre-break spread, and its
+     direction.
+
+The z-score / CUSUM rules are shared with the online detector
+(afi_alerts_online.py), so a replay of history flags the same series.
+
+Usage:
+    python src/afi_alerts.py [--level district|pincode] [--metric afi_score] [--workers N]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from afi_profile import Profiler
+
+
+INPUT_FILE = "outputs/afi_district_month.csv"
+OUT_ALERTS = "outputs/alerts.csv"
+
+PERIOD_COL = "period"
+LEVEL_KEYS = {
+    "state": ["state_canonical"],
+    "district": ["state_canonical", "district_clean"],
+    "pincode": ["state_canonical", "district_clean", "pincode"],
+}
+METRIC = "afi_score"
+
+# pre-filter
+WINDOW = 6            # trailing months a new value is compared against
+MIN_HISTORY = 3       # observed months needed in the window before z is defined
+MIN_STD = 1e-3        # floor on the window spread (flat series)
+Z_THRESH = 3.0
+CUSUM_K = 0.5         # allowance per step, in z units
+CUSUM_H = 4.0         # decision threshold, in z units
+
+# change-point search
+MIN_PERIODS = 6
+MIN_SEGMENT = 2
+PENALTY = 3.0         # x log(n) x variance, a BIC-style penalty
+BATCH_SIZE = 256
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def load_series(path=INPUT_FILE, level="district", metric=METRIC):
+    """
+    Aggregate the AFI table to one value per (series, period) and pivot it.
+    Returns (keys frame, monthly period labels, float matrix series x periods, NaN = no data).
+    """
+    keys = LEVEL_KEYS[level]
+    sheet = pd.read_csv(path, usecols=keys + [PERIOD_COL, metric], dtype={k: str for k in keys + [PERIOD_COL]})
+    sheet[metric] = pd.to_numeric(sheet[metric], errors="coerce")
+    sheet = sheet.dropna(subset=[PERIOD_COL, metric])
+
+    sheet[PERIOD_COL] = period_labels(sheet[PERIOD_COL])
+    sheet = sheet.dropna(subset=[PERIOD_COL])
+
+    grouped = sheet.groupby(keys + [PERIOD_COL], sort=False)[metric].mean()
+    wide = grouped.unstack(PERIOD_COL)
+    # one column per calendar month, so windows count months even when a month is missing entirely
+    months = pd.period_range(min(wide.columns), max(wide.columns), freq="M").strftime("%Y-%m-01")
+    wide = wide.reindex(columns=months)
+    return wide.index.to_frame(index=False), np.asarray(wide.columns), wide.to_numpy(dtype=float)
+
+
+def period_labels(values):
+    """Normalize period values to 'YYYY-MM-01' strings (NaN where unparseable)."""
+    parsed = pd.to_datetime(values, errors="coerce")
+    return parsed.dt.to_period("M").dt.strftime("%Y-%m-01").where(parsed.notna())
+
+
+def trailing_zscores(mat, window=WINDOW, min_history=MIN_HISTORY):
+    """z of each month against the mean/std (ddof=1) of the previous `window` months' observed values."""
+    frame = pd.DataFrame(mat.T)
+    roll = frame.rolling(window, min_periods=min_history)
+    mean = roll.mean().shift(1).to_numpy().T
+    std = roll.std().shift(1).to_numpy().T
+    return (mat - mean) / np.maximum(np.nan_to_num(std, nan=MIN_STD), MIN_STD)
+
+
+def cusum(z, k=CUSUM_K, h=CUSUM_H):
+    """
+    Two-sided CUSUM on z-scores, vectorized across series, one step per period.
+    Months without a z leave the sums unchanged; a crossing resets that side.
+    Returns (first crossing column or -1, max upper sum, max lower sum).
+    """
+    n_series, n_periods = z.shape
+    upper = np.zeros(n_series)
+    lower = np.zeros(n_series)
+    peak_up = np.zeros(n_series)
+    peak_down = np.zeros(n_series)
+    first = np.full(n_series, -1)
+    for t in range(n_periods):
+        zt = z[:, t]
+        seen = ~np.isnan(zt)
+        upper = np.where(seen, np.maximum(0.0, upper + np.nan_to_num(zt) - k), upper)
+        lower = np.where(seen, np.maximum(0.0, lower - np.nan_to_num(zt) - k), lower)
+        peak_up = np.maximum(peak_up, upper)
+        peak_down = np.maximum(peak_down, lower)
+        crossed = (upper > h) | (lower > h)
+        first = np.where((first < 0) & crossed, t, first)
+        upper = np.where(upper > h, 0.0, upper)
+        lower = np.where(lower > h, 0.0, lower)
+    return first, peak_up, peak_down
+
+
+def prefilter(mat):
+    """Flag series whose trailing z-score or CUSUM crosses its threshold; returns a per-series frame."""
+    z = trailing_zscores(mat)
+    absz = np.abs(np.nan_to_num(z))
+    z_first = np.where((absz > Z_THRESH).any(axis=1), np.argmax(absz > Z_THRESH, axis=1), -1)
+    c_first, peak_up, peak_down = cusum(z)
+    first = np.where((z_first >= 0) & ((c_first < 0) | (z_first <= c_first)), z_first, c_first)
+    return pd.DataFrame({
+        "flagged": first >= 0,
+        "first_flag_col": first,
+        "max_abs_z": absz.max(axis=1) if absz.size else np.zeros(len(mat)),
+        "cusum_up": peak_up,
+        "cusum_down": peak_down,
+        "n_periods": (~np.isnan(mat)).sum(axis=1),
+    })
+
+
+def changepoints(values, penalty=PENALTY, min_size=MIN_SEGMENT):
+    """PELT breakpoints (indices into `values`) of one series' observed values."""
+    import ruptures as rpt
+
+    n = len(values)
+    if n < max(MIN_PERIODS, 2 * min_size):
+        return []
+    scale = float(np.var(values)) or MIN_STD ** 2
+    algo = rpt.Pelt(model="l2", min_size=min_size, jump=1).fit(values.reshape(-1, 1))
+    return [b for b in algo.predict(pen=penalty * np.log(n) * scale) if b < n]
+
+
+def detect_batch(batch):
+    """Worker: [(series_idx, period_cols, values)] -> alert dicts (one per breakpoint)."""
+    out = []
+    for idx, cols, values in batch:
+        bkps = changepoints(values)
+        bounds = [0] + bkps + [len(values)]
+        for j, b in enumerate(bkps):
+            before = values[bounds[j]:b]
+            after = values[b:bounds[j + 2]]
+            spread = max(float(np.std(before, ddof=1)) if len(before) > 1 else 0.0, MIN_STD)
+            shift = float(after.mean() - before.mean())
+            out.append({
+                "series_idx": idx,
+                "onset_col": int(cols[b]),
+                "before_mean": float(before.mean()),
+                "after_mean": float(after.mean()),
+                "magnitude": shift,
+                "magnitude_rel": shift / abs(before.mean()) if before.mean() else np.nan,
+                "magnitude_z": shift / spread,
+            })
+    return out
+
+
+def run_changepoints(mat, candidates, workers=None):
+    tasks = []
+    for idx in candidates:
+        row = mat[idx]
+        cols = np.flatnonzero(~np.isnan(row))
+        tasks.append((int(idx), cols, row[cols]))
+    batches = [tasks[i:i + BATCH_SIZE] for i in range(0, len(tasks), BATCH_SIZE)]
+    if not batches:
+        return []
+    if workers == 1 or len(batches) == 1:
+        return [a for b in batches for a in detect_batch(b)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [a for part in pool.map(detect_batch, batches) for a in part]
+
+
+def build_alerts(keys, periods, flags, found, metric):
+    columns = list(keys.columns) + ["onset_period", "direction", "before_mean", "after_mean", "magnitude",
+                                    "magnitude_rel", "magnitude_z", "first_flag_period", "max_abs_z",
+                                    "cusum_up", "cusum_down", "n_periods", "metric"]
+    if not found:
+        return pd.DataFrame(columns=columns)
+    alerts = pd.DataFrame(found)
+    idx = alerts.pop("series_idx").to_numpy()
+    alerts = pd.concat([keys.iloc[idx].reset_index(drop=True), alerts], axis=1)
+    alerts["onset_period"] = periods[alerts.pop("onset_col").to_numpy()]
+    alerts["direction"] = np.where(alerts["magnitude"] >= 0, "up", "down")
+    info = flags.iloc[idx].reset_index(drop=True)
+    alerts["first_flag_period"] = periods[info["first_flag_col"].to_numpy()]
+    for col in ("max_abs_z", "cusum_up", "cusum_down", "n_periods"):
+        alerts[col] = info[col].to_numpy()
+    alerts["metric"] = metric
+    return alerts[columns].sort_values(["onset_period", "magnitude_z"], ascending=[True, False])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Change-point early-warning alerts over AFI series")
+    ap.add_argument("--input", default=INPUT_FILE)
+    ap.add_argument("--out", default=OUT_ALERTS)
+    ap.add_argument("--level", choices=list(LEVEL_KEYS), default="district")
+    ap.add_argument("--metric", default=METRIC)
+    ap.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    args = ap.parse_args(argv)
+
+    prof = Profiler("afi_alerts")
+
+    with prof.stage("load") as st:
+        keys, periods, mat = load_series(args.input, args.level, args.metric)
+        st.rows(int((~np.isnan(mat)).sum()))
+    log(f"{len(keys):,} {args.level} series x {len(periods)} periods")
+
+    with prof.stage("prefilter") as st:
+        flags = prefilter(mat)
+        st.rows(mat.size)
+    candidates = np.flatnonzero(flags["flagged"].to_numpy() & (flags["n_periods"].to_numpy() >= MIN_PERIODS))
+    log(f"pre-filter flagged {len(candidates):,} of {len(keys):,} series")
+
+    with prof.stage("changepoint") as st:
+        found = run_changepoints(mat, candidates, args.workers or os.cpu_count())
+        st.rows(len(candidates))
+
+    with prof.stage("write") as st:
+        alerts = build_alerts(keys, periods, flags, found, args.metric)
+        alerts.to_csv(args.out, index=False)
+        st.rows(len(alerts))
+    log(f"Wrote {len(alerts):,} alerts for {alerts[keys.columns.tolist()].drop_duplicates().shape[0]:,} series -> {args.out}")
+
+    prof.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+afi_alerts_online.py
+
+Incremental early-warning alerts: update per-series detector state with a
+new month of AFI rows, without rescanning history.
+
+For every (state, district) series - or pincode with --level pincode - the
+detector keeps:
+  - a buffer of the last WINDOW monthly values (the trailing window)
+  - the two CUSUM accumulators on the trailing z-score
+  - an EWMA of the series level
+and persists it in outputs/alerts_state_<level>.parquet between runs.
+
+A new month costs O(new rows): only the rows of periods after the saved
+state are read, in one afi_io.read_table() call whose period filter skips
+the rest (row groups of a Parquet input, rows of a fresh Arrow IPC sibling;
+a plain CSV is streamed once and only its new rows are kept). Those rows are
+aggregated per series, each series' state is advanced by one step per month,
+and any series whose |z| or CUSUM crosses its threshold is appended to
+outputs/alerts_online.csv. The rules and parameters are those of the batch
+pre-filter in afi_alerts.py. Periods are compared as the ISO 'YYYY-MM-DD'
+text the AFI tables hold.
+
+The state file is written to a temporary name and renamed into place, so an
+interrupted update leaves the previous state intact.
+
+Modes:
+  update   feed one period (default: the latest period in the input that is
+           newer than the saved state)
+  replay   rebuild the state from the full history, month by month, and check
+           the result against the batch pre-filter (same flagged series, same
+           first-flag month); exits non-zero on any disagreement
+
+Usage:
+    python src/afi_alerts_online.py update [--period 2025-02-01] [--input outputs/afi_district_month.csv]
+    python src/afi_alerts_online.py replay [--level district|pincode]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from afi_alerts import (CUSUM_H, CUSUM_K, INPUT_FILE, LEVEL_KEYS, METRIC, MIN_HISTORY, MIN_STD, PERIOD_COL,
+                        WINDOW, Z_THRESH, load_series, period_labels, prefilter)
+from afi_io import read_table
+
+
+OUT_DIR = Path("outputs")
+STATE_TPL = "alerts_state_{level}.parquet"
+OUT_ALERTS = OUT_DIR / "alerts_online.csv"
+
+EWMA_LAMBDA = 0.3
+STATE_META_KEY = b"afi_alerts_online"
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def month_index(label):
+    """'YYYY-MM-01' -> months since 1970-01 (so window arithmetic is integer)."""
+    return int(label[:4]) * 12 + int(label[5:7]) - 1 - 1970 * 12
+
+
+def month_label(idx):
+    return f"{1970 + idx // 12:04d}-{idx % 12 + 1:02d}-01"
+
+
+def params(level, metric):
+    return {"level": level, "metric": metric, "window": WINDOW, "min_history": MIN_HISTORY,
+            "min_std": MIN_STD, "z_thresh": Z_THRESH, "cusum_k": CUSUM_K, "cusum_h": CUSUM_H,
+            "ewma_lambda": EWMA_LAMBDA}
+
+
+class SeriesState:
+    __slots__ = ("last", "buf_p", "buf_x", "ewma", "up", "down", "n_obs", "n_alerts", "first_alert")
+
+    def __init__(self, last=-1, buf_p=(), buf_x=(), ewma=math.nan, up=0.0, down=0.0, n_obs=0,
+                 n_alerts=0, first_alert=-1):
+        self.last = last
+        self.buf_p = list(buf_p)
+        self.buf_x = list(buf_x)
+        self.ewma = ewma
+        self.up = up
+        self.down = down
+        self.n_obs = n_obs
+        self.n_alerts = n_alerts
+        self.first_alert = first_alert
+
+    def step(self, p, x):
+        """
+        Advance by month index `p` with value `x`. Returns the alert dict or None.
+        Same arithmetic as afi_alerts.trailing_zscores + cusum, one column at a time.
+        """
+        if p <= self.last:
+            return None
+        keep = [i for i, q in enumerate(self.buf_p) if q > p - 1 - WINDOW]
+        self.buf_p = [self.buf_p[i] for i in keep]
+        self.buf_x = [self.buf_x[i] for i in keep]
+
+        z = math.nan
+        if len(self.buf_x) >= MIN_HISTORY:
+            window = np.asarray(self.buf_x)
+            std = float(window.std(ddof=1))
+            z = (x - float(window.mean())) / max(std if std == std else MIN_STD, MIN_STD)
+
+        alert = None
+        if z == z:
+            self.up = max(0.0, self.up + z - CUSUM_K)
+            self.down = max(0.0, self.down - z - CUSUM_K)
+            rules = [name for name, hit in (("z", abs(z) > Z_THRESH), ("cusum_up", self.up > CUSUM_H),
+                                            ("cusum_down", self.down > CUSUM_H)) if hit]
+            if rules:
+                alert = {"period": month_label(p), "value": x, "z": z, "cusum_up": self.up,
+                         "cusum_down": self.down, "ewma": self.ewma, "rules": "+".join(rules)}
+                self.n_alerts += 1
+                if self.first_alert < 0:
+                    self.first_alert = p
+            if self.up > CUSUM_H:
+                self.up = 0.0
+            if self.down > CUSUM_H:
+                self.down = 0.0
+
+        self.ewma = x if self.ewma != self.ewma else EWMA_LAMBDA * x + (1 - EWMA_LAMBDA) * self.ewma
+        self.buf_p.append(p)
+        self.buf_x.append(x)
+        self.buf_p, self.buf_x = self.buf_p[-WINDOW:], self.buf_x[-WINDOW:]
+        self.last = p
+        self.n_obs += 1
+        return alert
+
+
+class DetectorState:
+    """All series' SeriesState for one level/metric, persisted as a Parquet table."""
+
+    def __init__(self, level, metric, series=None):
+        self.level = level
+        self.metric = metric
+        self.keys = LEVEL_KEYS[level]
+        self.series = series or {}
+
+    @property
+    def last_period(self):
+        return max((s.last for s in self.series.values()), default=-1)
+
+    @classmethod
+    def load(cls, path, level, metric):
+        if not Path(path).exists():
+            return cls(level, metric)
+        table = pq.read_table(path)
+        saved = json.loads(table.schema.metadata[STATE_META_KEY])
+        if saved != params(level, metric):
+            raise SystemExit(f"[ERROR] {path} was built with {saved}; "
+                             f"current settings are {params(level, metric)}. Rebuild it with 'replay'.")
+        frame = table.to_pandas()
+        series = {}
+        for row in frame.itertuples(index=False):
+            rec = row._asdict()
+            key = tuple(rec[k] for k in LEVEL_KEYS[level])
+            series[key] = SeriesState(rec["last"], rec["buf_p"], rec["buf_x"], rec["ewma"], rec["up"],
+                                      rec["down"], rec["n_obs"], rec["n_alerts"], rec["first_alert"])
+        return cls(level, metric, series)
+
+    def save(self, path):
+        cols = {k: [key[i] for key in self.series] for i, k in enumerate(self.keys)}
+        for attr in SeriesState.__slots__:
+            cols[attr] = [getattr(s, attr) for s in self.series.values()]
+        table = pa.table({
+            **{k: pa.array(cols[k], type=pa.string()) for k in self.keys},
+            "last": pa.array(cols["last"], type=pa.int32()),
+            "buf_p": pa.array(cols["buf_p"], type=pa.list_(pa.int32())),
+            "buf_x": pa.array(cols["buf_x"], type=pa.list_(pa.float64())),
+            **{k: pa.array(cols[k], type=pa.float64()) for k in ("ewma", "up", "down")},
+            **{k: pa.array(cols[k], type=pa.int32()) for k in ("n_obs", "n_alerts", "first_alert")},
+        })
+        table = table.replace_schema_metadata({STATE_META_KEY: json.dumps(params(self.level, self.metric))})
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    def update(self, rows):
+        """Feed aggregated rows (key cols, period, value) for one month; returns alert dicts."""
+        alerts = []
+        keys = list(zip(*(rows[k] for k in self.keys)))
+        for key, label, x in zip(keys, rows[PERIOD_COL], rows[self.metric]):
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = SeriesState()
+            alert = state.step(month_index(label), float(x))
+            if alert is not None:
+                alerts.append({**dict(zip(self.keys, key)), **alert})
+        return alerts
+
+
+def read_rows(path, level, metric, period=None, after=None):
+    """
+    Rows of `path` aggregated to one value per series and month: only `period` if
+    given, only the months after month index `after` if given.
+    """
+    keys = LEVEL_KEYS[level]
+    filters = []
+    if period is not None:
+        filters = [(PERIOD_COL, ">=", period), (PERIOD_COL, "<", month_label(month_index(period) + 1))]
+    elif after is not None and after >= 0:
+        filters = [(PERIOD_COL, ">=", month_label(after + 1))]
+    sheet = read_table(path, columns=keys + [PERIOD_COL, metric], filters=filters,
+                       dtype={k: str for k in keys + [PERIOD_COL]})
+    sheet[PERIOD_COL] = period_labels(sheet[PERIOD_COL])
+    if period is not None:
+        sheet = sheet[sheet[PERIOD_COL] == period]
+    elif after is not None:
+        sheet = sheet[sheet[PERIOD_COL].map(month_index, na_action="ignore") > after]
+    sheet[metric] = pd.to_numeric(sheet[metric], errors="coerce")
+    sheet = sheet.dropna(subset=[PERIOD_COL, metric])
+    return sheet.groupby(keys + [PERIOD_COL], sort=False, as_index=False)[metric].mean()
+
+
+def append_alerts(alerts, keys, path=OUT_ALERTS):
+    if not alerts:
+        return 0
+    frame = pd.DataFrame(alerts)
+    frame["emitted_utc"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    cols = keys + ["period", "value", "z", "cusum_up", "cusum_down", "ewma", "rules", "emitted_utc"]
+    path = Path(path)
+    frame[cols].to_csv(path, mode="a", header=not path.exists(), index=False)
+    return len(frame)
+
+
+def run_update(args):
+    state_fp = OUT_DIR / STATE_TPL.format(level=args.level)
+    state = DetectorState.load(state_fp, args.level, args.metric)
+
+    if args.period is None:
+        rows = read_rows(args.input, args.level, args.metric, after=state.last_period)
+        if rows.empty:
+            log(f"state is up to date (last period {month_label(state.last_period)})")
+            return 0
+        if rows[PERIOD_COL].nunique() > 1:
+            log(f"{rows[PERIOD_COL].nunique()} unseen periods in {args.input}; feeding them in order")
+    else:
+        period = period_labels(pd.Series([args.period])).iloc[0]
+        if not isinstance(period, str):
+            raise SystemExit(f"[ERROR] --period {args.period!r} is not a date")
+        if month_index(period) <= state.last_period:
+            # step() ignores a month at or before a series' last one, so feeding it would change nothing
+            log(f"{period} is already applied (state is at {month_label(state.last_period)}); nothing to do")
+            return 0
+        rows = read_rows(args.input, args.level, args.metric, period=period)
+
+    total = 0
+    for p, month in rows.groupby(PERIOD_COL, sort=True):
+        alerts = state.update(month)
+        total += append_alerts(alerts, state.keys, args.out)
+        log(f"{p}: {len(month):,} series updated, {len(alerts):,} alert(s)")
+    state.save(state_fp)
+    log(f"state -> {state_fp} ({len(state.series):,} series); {total:,} alert(s) -> {args.out}")
+    return 0
+
+
+def run_replay(args):
+    state_fp = OUT_DIR / STATE_TPL.format(level=args.level)
+    state = DetectorState(args.level, args.metric)
+    rows = read_rows(args.input, args.level, args.metric)
+    n_alerts = 0
+    for _, month in rows.sort_values(PERIOD_COL).groupby(PERIOD_COL, sort=True):
+        n_alerts += len(state.update(month))
+    state.save(state_fp)
+    log(f"replayed {rows[PERIOD_COL].nunique()} periods into {state_fp} "
+        f"({len(state.series):,} series, {n_alerts:,} alert(s))")
+
+    # validate against the batch pre-filter
+    keys, periods, mat = load_series(args.input, args.level, args.metric)
+    flags = prefilter(mat)
+    batch = {tuple(k): (periods[c] if c >= 0 else None)
+             for k, c in zip(keys.itertuples(index=False), flags["first_flag_col"])}
+    online = {k: (month_label(s.first_alert) if s.first_alert >= 0 else None) for k, s in state.series.items()}
+    mismatches = [(k, batch.get(k), online.get(k)) for k in set(batch) | set(online) if batch.get(k) != online.get(k)]
+    n_flagged = sum(v is not None for v in batch.values())
+    if mismatches:
+        print(f"[FAIL] online replay disagrees with batch pre-filter on {len(mismatches):,} of {len(batch):,} series")
+        for key, b, o in mismatches[:20]:
+            print(f"  {key}: batch first flag={b} online first alert={o}")
+        return 1
+    print(f"[OK] online replay matches batch pre-filter: {n_flagged:,} of {len(batch):,} series flagged, "
+          f"identical first-flag months")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incremental (online) AFI alerts")
+    ap.add_argument("mode", choices=["update", "replay"])
+    ap.add_argument("--input", default=INPUT_FILE)
+    ap.add_argument("--out", default=str(OUT_ALERTS))
+    ap.add_argument("--level", choices=list(LEVEL_KEYS), default="district")
+    ap.add_argument("--metric", default=METRIC)
+    ap.add_argument("--period", help="update mode: the period to feed (default: all unseen periods)")
+    args = ap.parse_args(argv)
+    return run_update(args) if args.mode == "update" else run_replay(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
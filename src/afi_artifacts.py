@@ -0,0 +1,447 @@
+"""
+afi_artifacts.py
+
+Versioned artifact store for the files in outputs/. It replaces the
+<file>.bak.<timestamp> copies that the state-mapping and aggregation scripts
+made before each run.
+
+  outputs/.store/objects/<sha[:2]>/<sha256>  content-addressed blobs, one per distinct file content
+  outputs/.store/snapshots/<id>.json         immutable manifests: path -> sha256/size, script, label, time
+  outputs/.store/index.json                  stat cache (inode, size, mtime) -> sha256 of the live files
+  outputs/.store/pins.json                   snapshots gc must keep
+
+A snapshot hashes each file, skipping the read when its stat matches the cache.
+Content the store does not hold yet becomes a blob without copying data:
+
+  reflink   copy-on-write clone (btrfs, XFS): independent of the live file
+  hardlink  a second name for the live file's inode: no data I/O on any POSIX filesystem
+  copy      fallback (different filesystem, no link support)
+
+AFI_STORE_LINK=reflink|hardlink|copy forces one method (default: auto, in that order).
+Identical content is stored once no matter how many snapshots reference it; a
+live file rewritten with content the store already holds is relinked to that blob.
+With detach=True, for a file that is being consumed or replaced, the live path
+is unlinked after linking. That is the old "move to .bak" at no I/O cost.
+
+A hardlinked blob shares its inode with the live file, so that file must not be
+rewritten in place. A writer calls release(path) before it opens an output for
+writing. release unlinks the path when the store holds the same inode, and the
+write then creates a new file. `verify` re-hashes the blobs and reports any
+snapshot whose content changed.
+
+Reverting relinks blobs to their paths (restore); nothing is copied, and the
+files it replaces are snapshotted first. gc keeps pinned snapshots, the newest
+--keep versions of each file and anything younger than --days. It deletes the
+other manifests, then every blob no remaining manifest references.
+
+Usage:
+    python src/afi_artifacts.py list [--path FILE]
+    python src/afi_artifacts.py show ID
+    python src/afi_artifacts.py snapshot FILE [FILE ...] [--label LABEL] [--detach]
+    python src/afi_artifacts.py restore ID [FILE ...]
+    python src/afi_artifacts.py verify [ID]
+    python src/afi_artifacts.py pin ID | unpin ID
+    python src/afi_artifacts.py gc [--keep 5] [--days 14] [--dry-run]
+    python src/afi_artifacts.py import-bak         # fold legacy outputs/*.bak.* files into the store
+
+    from afi_artifacts import Store
+    store = Store()
+    store.snapshot(inputs, script="prepare_final_for_afi_fixed", label="inputs")
+    store.release(out_path)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+STORE_DIR = Path("outputs") / ".store"
+LINK_ENV = "AFI_STORE_LINK"
+LINK_METHODS = ["reflink", "hardlink", "copy"]
+KEEP = 5
+KEEP_DAYS = 14
+HASH_BLOCK = 1 << 23
+FICLONE = 0x40049409        # linux/fs.h: _IOW(0x94, 9, int)
+BAK_RE = re.compile(r"^(?P<name>.+?)\.bak\.(?P<tag>[^/]+)$")
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while block := fh.read(HASH_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+def reflink(src, dst):
+    """Copy-on-write clone of src at dst (raises OSError where the filesystem cannot)."""
+    import fcntl
+
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def write_json(path, payload):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2))
+    os.replace(tmp, path)
+
+
+class Store:
+    def __init__(self, root=STORE_DIR, link=None):
+        self.root = Path(root)
+        self.base = self.root.parent          # manifest paths are relative to this (outputs/)
+        self.objects = self.root / "objects"
+        self.snapshots = self.root / "snapshots"
+        self.link = link or os.environ.get(LINK_ENV, "auto")
+        if self.link not in ["auto"] + LINK_METHODS:
+            raise ValueError(f"{LINK_ENV} must be auto or one of {LINK_METHODS}, not {self.link!r}")
+        self._index = None
+
+    # ------------------------------------------------------------ paths
+
+    def key(self, path):
+        path = Path(path).absolute()
+        try:
+            return path.relative_to(self.base.absolute()).as_posix()
+        except ValueError:
+            return str(path)
+
+    def path_of(self, key):
+        return Path(key) if os.path.isabs(key) else self.base / key
+
+    def blob(self, sha):
+        return self.objects / sha[:2] / sha
+
+    # ------------------------------------------------------------ stat cache
+
+    @property
+    def index(self):
+        if self._index is None:
+            path = self.root / "index.json"
+            self._index = json.loads(path.read_text()) if path.exists() else {}
+        return self._index
+
+    def _save_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_json(self.root / "index.json", self.index)
+
+    def _remember(self, key, st, sha):
+        self.index[key] = {"ino": st.st_ino, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+
+    def digest(self, path, key=None):
+        """sha256 of `path`, read only when its inode/size/mtime differ from the cached entry."""
+        key = key or self.key(path)
+        st = os.stat(path)
+        cached = self.index.get(key)
+        if cached and (cached["ino"], cached["size"], cached["mtime_ns"]) == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return cached["sha256"]
+        sha = file_sha256(path)
+        self._remember(key, st, sha)
+        return sha
+
+    # ------------------------------------------------------------ blobs
+
+    def _methods(self, prefer_link=False):
+        if self.link != "auto":
+            return [self.link]
+        return ["hardlink", "reflink", "copy"] if prefer_link else LINK_METHODS
+
+    def _place(self, src, dst, methods):
+        """Materialize src at dst with the first method that works; returns the method."""
+        tmp = dst.with_name(dst.name + ".tmp")
+        for method in methods:
+            tmp.unlink(missing_ok=True)
+            try:
+                if method == "reflink":
+                    reflink(src, tmp)
+                elif method == "hardlink":
+                    os.link(src, tmp)
+                else:
+                    shutil.copy2(src, tmp)
+            except OSError:
+                continue
+            os.replace(tmp, dst)
+            return method
+        tmp.unlink(missing_ok=True)
+        raise OSError(f"could not place {src} at {dst} with {methods}")
+
+    def _ingest(self, src, sha, detach):
+        blob = self.blob(sha)
+        if blob.exists():
+            method = "stored"
+            if not detach and self.link in ("auto", "hardlink") and not os.path.samefile(blob, src):
+                # same content rewritten since it was stored: point the path at the blob, drop the duplicate
+                try:
+                    self._place(blob, Path(src), ["hardlink"])
+                    method = "relinked"
+                except OSError:
+                    pass
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            # a detached file has no other name left, so linking it is as safe as a clone
+            method = self._place(src, blob, self._methods(prefer_link=detach))
+        if detach:
+            os.unlink(src)
+        return method
+
+    # ------------------------------------------------------------ snapshots
+
+    def _add(self, entries, script, label, detach, created=None):
+        created = created or datetime.now(timezone.utc)
+        files = {}
+        for src, key in entries:
+            src = Path(src)
+            if not src.exists():
+                continue
+            st = os.stat(src)
+            sha = self.digest(src, key)
+            method = self._ingest(src, sha, detach)
+            if detach:
+                self.index.pop(key, None)
+            elif method == "relinked":
+                self._remember(key, os.stat(src), sha)
+            files[key] = {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "method": method}
+        self._save_index()
+        if not files:
+            return None
+
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        tag = re.sub(r"[^A-Za-z0-9_.-]+", "_", script or "manual")
+        snap_id = f"{created:%Y%m%dT%H%M%S.%fZ}-{tag}"
+        manifest = {"id": snap_id, "created": created.isoformat(), "script": script, "label": label,
+                    "detached": detach, "files": files}
+        write_json(self.snapshots / f"{snap_id}.json", manifest)
+        return manifest
+
+    def snapshot(self, paths, script=None, label="", detach=False):
+        """Record the current content of `paths` (missing ones are skipped); returns the manifest or None."""
+        return self._add([(p, self.key(p)) for p in paths], script, label, detach)
+
+    def manifests(self):
+        """All manifests, oldest first."""
+        if not self.snapshots.exists():
+            return []
+        return [json.loads(p.read_text()) for p in sorted(self.snapshots.glob("*.json"))]
+
+    def manifest(self, snap_id):
+        path = self.snapshots / f"{snap_id}.json"
+        if not path.exists():
+            matches = [p for p in self.snapshots.glob(f"{snap_id}*.json")]
+            if len(matches) != 1:
+                raise KeyError(f"no unique snapshot {snap_id!r}")
+            path = matches[0]
+        return json.loads(path.read_text())
+
+    def latest(self, path):
+        """Blob holding the most recent snapshotted content of `path`, or None."""
+        key = self.key(path)
+        for manifest in reversed(self.manifests()):
+            info = manifest["files"].get(key)
+            if info and self.blob(info["sha256"]).exists():
+                return self.blob(info["sha256"])
+        return None
+
+    def release(self, path):
+        """Unlink `path` if it is a hardlink to a stored blob, so that writing it cannot alter the blob."""
+        path = Path(path)
+        if not path.exists() or os.stat(path).st_nlink < 2:
+            return False
+        cached = self.index.get(self.key(path))
+        blob = self.blob(cached["sha256"]) if cached else None
+        if blob is None or not blob.exists() or not os.path.samefile(blob, path):
+            return False
+        os.unlink(path)
+        self.index.pop(self.key(path), None)
+        self._save_index()
+        return True
+
+    def restore(self, snap_id, paths=None):
+        """Put the files of a snapshot back in place by relinking their blobs; returns {key: action}."""
+        manifest = self.manifest(snap_id)
+        wanted = {self.key(p) for p in paths} if paths else set(manifest["files"])
+        todo = {}
+        for key, info in manifest["files"].items():
+            if key not in wanted:
+                continue
+            dst = self.path_of(key)
+            if dst.exists() and self.digest(dst, key) == info["sha256"]:
+                continue
+            if not self.blob(info["sha256"]).exists():
+                raise FileNotFoundError(f"blob {info['sha256'][:12]} of {key} is missing from the store")
+            todo[key] = info
+
+        # whatever is about to be replaced stays recoverable
+        self._add([(self.path_of(k), k) for k in todo], "restore", f"before {manifest['id']}", detach=True)
+        actions = {}
+        for key, info in todo.items():
+            dst = self.path_of(key)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            actions[key] = self._place(self.blob(info["sha256"]), dst, self._methods())
+            self._remember(key, os.stat(dst), info["sha256"])
+        self._save_index()
+        return actions
+
+    def verify(self, snap_id=None):
+        """Re-hash every blob referenced by the snapshot(s); returns [(snapshot id, key, problem)]."""
+        manifests = [self.manifest(snap_id)] if snap_id else self.manifests()
+        checked, problems = {}, []
+        for manifest in manifests:
+            for key, info in manifest["files"].items():
+                sha = info["sha256"]
+                if sha not in checked:
+                    blob = self.blob(sha)
+                    checked[sha] = "missing" if not blob.exists() else (None if file_sha256(blob) == sha else "modified")
+                if checked[sha]:
+                    problems.append((manifest["id"], key, checked[sha]))
+        return problems
+
+    # ------------------------------------------------------------ retention
+
+    def pins(self):
+        path = self.root / "pins.json"
+        return set(json.loads(path.read_text())) if path.exists() else set()
+
+    def pin(self, snap_id, on=True):
+        snap_id = self.manifest(snap_id)["id"]
+        pins = self.pins() | {snap_id} if on else self.pins() - {snap_id}
+        write_json(self.root / "pins.json", sorted(pins))
+
+    def gc(self, keep=KEEP, days=KEEP_DAYS, dry_run=False):
+        """Apply the retention policy, then drop unreferenced blobs; returns (manifests removed, blobs removed, bytes freed)."""
+        now = datetime.now(timezone.utc)
+        pins = self.pins()
+        kept, dropped, versions = [], [], {}
+        for manifest in reversed(self.manifests()):
+            recent = False
+            for key in manifest["files"]:
+                recent |= versions.get(key, 0) < keep
+                versions[key] = versions.get(key, 0) + 1
+            age_days = (now - datetime.fromisoformat(manifest["created"])).total_seconds() / 86400
+            if manifest["id"] in pins or recent or age_days < days:
+                kept.append(manifest)
+            else:
+                dropped.append(manifest)
+
+        referenced = {info["sha256"] for m in kept for info in m["files"].values()}
+        blobs, freed = 0, 0
+        for blob in self.objects.glob("*/*") if self.objects.exists() else []:
+            if blob.name in referenced or blob.name.endswith(".tmp"):
+                continue
+            st = os.stat(blob)
+            blobs += 1
+            freed += st.st_size if st.st_nlink == 1 else 0      # a still-linked live file keeps its data
+            if not dry_run:
+                blob.unlink()
+        if not dry_run:
+            for manifest in dropped:
+                (self.snapshots / f"{manifest['id']}.json").unlink()
+        return len(dropped), blobs, freed
+
+    # ------------------------------------------------------------ legacy backups
+
+    def import_bak(self, directory=None):
+        """Move outputs/<name>.bak.<tag> files into the store, one snapshot per tag."""
+        directory = Path(directory or self.base)
+        groups = {}
+        for path in sorted(directory.glob("*.bak.*")):
+            m = BAK_RE.match(path.name)
+            if m and not path.name.endswith(".tmp"):
+                groups.setdefault(m["tag"], []).append((path, self.key(directory / m["name"])))
+        made = []
+        for tag, entries in sorted(groups.items()):
+            try:
+                created = datetime.strptime(tag, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            except ValueError:
+                created = datetime.fromtimestamp(max(os.stat(p).st_mtime for p, _ in entries), timezone.utc)
+            made.append(self._add(entries, "import-bak", tag, detach=True, created=created))
+        return made
+
+
+def fmt_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Content-addressed snapshots of pipeline outputs")
+    ap.add_argument("--store", default=str(STORE_DIR))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list")
+    p.add_argument("--path")
+    sub.add_parser("show").add_argument("id")
+    p = sub.add_parser("snapshot")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--label", default="")
+    p.add_argument("--detach", action="store_true", help="unlink the files after storing them")
+    p = sub.add_parser("restore")
+    p.add_argument("id")
+    p.add_argument("files", nargs="*")
+    sub.add_parser("verify").add_argument("id", nargs="?")
+    sub.add_parser("pin").add_argument("id")
+    sub.add_parser("unpin").add_argument("id")
+    p = sub.add_parser("gc")
+    p.add_argument("--keep", type=int, default=KEEP, help="newest versions kept per file")
+    p.add_argument("--days", type=float, default=KEEP_DAYS, help="snapshots younger than this are kept")
+    p.add_argument("--dry-run", action="store_true")
+    sub.add_parser("import-bak")
+    args = ap.parse_args(argv)
+
+    store = Store(args.store)
+
+    if args.cmd == "list":
+        pins = store.pins()
+        key = store.key(args.path) if args.path else None
+        print(f"{'id':<56}{'label':<28}{'files':>6}{'size':>12}")
+        for m in store.manifests():
+            if key and key not in m["files"]:
+                continue
+            size = sum(f["size"] for f in m["files"].values())
+            pin = "  pinned" if m["id"] in pins else ""
+            print(f"{m['id']:<56}{m['label'][:27]:<28}{len(m['files']):>6}{fmt_size(size):>12}{pin}")
+    elif args.cmd == "show":
+        m = store.manifest(args.id)
+        print(f"{m['id']}  script={m['script']} label={m['label']} created={m['created']}")
+        for key, info in m["files"].items():
+            print(f"  {info['sha256'][:12]}  {fmt_size(info['size']):>10}  {info['method']:<8}  {key}")
+    elif args.cmd == "snapshot":
+        m = store.snapshot(args.files, script="manual", label=args.label, detach=args.detach)
+        log(f"snapshot {m['id']} ({len(m['files'])} files)" if m else "nothing to snapshot")
+    elif args.cmd == "restore":
+        actions = store.restore(args.id, args.files or None)
+        for key, method in actions.items():
+            log(f"restored {key} ({method})")
+        log(f"{len(actions)} file(s) restored from {args.id}")
+    elif args.cmd == "verify":
+        problems = store.verify(args.id)
+        for snap_id, key, problem in problems:
+            print(f"[ERROR] {snap_id}: {key} blob {problem}")
+        if problems:
+            return 1
+        log("all referenced blobs match their hashes")
+    elif args.cmd in ("pin", "unpin"):
+        store.pin(args.id, on=args.cmd == "pin")
+    elif args.cmd == "gc":
+        n_snap, n_blob, freed = store.gc(args.keep, args.days, args.dry_run)
+        verb = "would remove" if args.dry_run else "removed"
+        log(f"{verb} {n_snap} snapshot(s) and {n_blob} blob(s), {fmt_size(freed)} freed")
+    elif args.cmd == "import-bak":
+        made = [m for m in store.import_bak() if m]
+        log(f"imported {sum(len(m['files']) for m in made)} backup file(s) into {len(made)} snapshot(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
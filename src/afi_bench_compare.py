@@ -0,0 +1,207 @@
+"""
+afi_bench_compare.py
+
+Performance regression gate for afi_benchmark.py results.
+
+Compares a baseline and a candidate benchmark (one or more result JSON files
+each; the runs of all files on a side are pooled) per stage and per pipeline
+entry point (02_merge_and_prep.py, compute_afi_advanced_fixed.py,
+compute_afi_typologies.py, ...) and per internal afi_profile stage of the
+instrumented scripts (compute_afi_advanced_fixed.py:features, ...) on three
+metrics:
+
+  wall_s       lower is better
+  peak_rss_mb  lower is better
+  rows_per_s   higher is better
+
+A change only counts as a regression when it is both larger than the relative
+tolerance and outside the run-to-run noise of the two sides:
+
+  threshold = max(tol * baseline_median, k * 1.4826 * (MAD_baseline + MAD_candidate), floor)
+
+so a single noisy run does not fail the gate, while a stage that got slower
+in every repeat does. A candidate step that failed is always a regression.
+
+Exit status: 0 = no regression, 1 = regression, 2 = runs are not comparable
+(different dataset scale/seed; override with --allow-mismatch).
+
+Usage:
+    python src/afi_bench_compare.py --baseline bench/results/bench_A_*.json --candidate bench/results/bench_B_*.json
+                                    [--wall-tol 0.10] [--rss-tol 0.15] [--rate-tol 0.10] [--mad-k 3] [--json report.json]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+
+METRICS = {
+    # metric: (direction, default relative tolerance, absolute floor)
+    "wall_s": ("lower", 0.10, 0.25),
+    "peak_rss_mb": ("lower", 0.15, 16.0),
+    "rows_per_s": ("higher", 0.10, 0.0),
+}
+MAD_SCALE = 1.4826
+MAD_K = 3.0
+DATASET_KEYS = ["rows_per_dataset", "seed", "months"]
+GROUP_ORDER = {"stages": 0, "steps": 1, "profile": 2}
+GROUP_LABEL = {"stages": "stage", "steps": "step", "profile": "profile"}
+
+
+def load_side(paths):
+    """Pool stage/step runs of several result files: {(group, name): {"runs": [...], "failed": n}}."""
+    docs = [json.loads(Path(p).read_text()) for p in paths]
+    pooled = {}
+    for doc in docs:
+        for group in ("stages", "steps"):
+            for name, rec in doc.get(group, {}).items():
+                entry = pooled.setdefault((group, name), {"runs": [], "failed": 0, "stage": rec.get("stage", name)})
+                for run in rec["runs"]:
+                    if run["status"] == "ok":
+                        entry["runs"].append(run)
+                    else:
+                        entry["failed"] += 1
+        # internal stages recorded by afi_profile.py inside the instrumented scripts
+        for script, rec in doc.get("steps", {}).items():
+            for repeat in rec.get("profile", []):
+                for st in repeat:
+                    name = f"{script}:{st['stage']}"
+                    entry = pooled.setdefault(("profile", name), {"runs": [], "failed": 0, "stage": rec["stage"]})
+                    entry["runs"].append(st)
+    return docs, pooled
+
+
+def dataset_key(doc):
+    return tuple(doc["dataset"].get(k) for k in DATASET_KEYS)
+
+
+def robust(values):
+    arr = np.asarray([v for v in values if v is not None], dtype=float)
+    if len(arr) == 0:
+        return None, None, 0
+    med = float(np.median(arr))
+    return med, float(np.median(np.abs(arr - med))) * MAD_SCALE, len(arr)
+
+
+def compare_metric(metric, base_runs, cand_runs, tol, mad_k):
+    direction, _, floor = METRICS[metric]
+    b_med, b_mad, b_n = robust(r.get(metric) for r in base_runs)
+    c_med, c_mad, c_n = robust(r.get(metric) for r in cand_runs)
+    if b_med is None or c_med is None:
+        return None
+
+    delta = c_med - b_med
+    worse = delta if direction == "lower" else -delta
+    threshold = max(tol * abs(b_med), mad_k * (b_mad + c_mad), floor)
+    if worse > threshold:
+        verdict = "REGRESSION"
+    elif -worse > threshold:
+        verdict = "improved"
+    else:
+        verdict = "ok"
+    return {
+        "metric": metric,
+        "baseline": b_med, "candidate": c_med,
+        "baseline_mad": b_mad, "candidate_mad": c_mad,
+        "baseline_n": b_n, "candidate_n": c_n,
+        "delta": delta,
+        "delta_pct": 100.0 * delta / b_med if b_med else None,
+        "threshold": threshold,
+        "verdict": verdict,
+    }
+
+
+def compare(base, cand, tolerances, mad_k=MAD_K):
+    rows, notes = [], []
+    for key in sorted(set(base) | set(cand), key=lambda k: (GROUP_ORDER[k[0]], k[1])):
+        group, name = key
+        if key not in cand:
+            notes.append(f"{GROUP_LABEL[group]} {name}: missing from candidate")
+            continue
+        if key not in base:
+            notes.append(f"{GROUP_LABEL[group]} {name}: new in candidate (no baseline)")
+            continue
+        b, c = base[key], cand[key]
+        if c["failed"]:
+            rows.append({"group": group, "name": name, "stage": c["stage"], "metric": "status",
+                         "verdict": "REGRESSION", "detail": f"{c['failed']} failed run(s) in candidate"})
+        for metric in METRICS:
+            res = compare_metric(metric, b["runs"], c["runs"], tolerances[metric], mad_k)
+            if res is not None:
+                rows.append({"group": group, "name": name, "stage": c["stage"], **res})
+    return rows, notes
+
+
+def fmt(metric, value):
+    if value is None:
+        return "-"
+    if metric == "rows_per_s":
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+def print_report(rows, notes, show_all=False):
+    header = f"{'group':<9}{'name':<44}{'metric':<13}{'baseline':>14}{'candidate':>14}{'delta%':>9}{'thresh':>12}  verdict"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        if r["metric"] == "status":
+            print(f"{GROUP_LABEL[r['group']]:<9}{r['name']:<44}{'status':<13}{'':>14}{'':>14}{'':>9}{'':>12}  "
+                  f"{r['verdict']} ({r['detail']})")
+            continue
+        if not show_all and r["verdict"] == "ok":
+            continue
+        pct = f"{r['delta_pct']:+.1f}" if r["delta_pct"] is not None else "-"
+        print(f"{GROUP_LABEL[r['group']]:<9}{r['name']:<44}{r['metric']:<13}{fmt(r['metric'], r['baseline']):>14}"
+              f"{fmt(r['metric'], r['candidate']):>14}{pct:>9}{fmt(r['metric'], r['threshold']):>12}  {r['verdict']}")
+    for note in notes:
+        print(f"[NOTE] {note}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare two afi_benchmark.py results and fail on regressions")
+    ap.add_argument("--baseline", nargs="+", required=True, help="baseline result JSON file(s)")
+    ap.add_argument("--candidate", nargs="+", required=True, help="candidate result JSON file(s)")
+    ap.add_argument("--wall-tol", type=float, default=METRICS["wall_s"][1])
+    ap.add_argument("--rss-tol", type=float, default=METRICS["peak_rss_mb"][1])
+    ap.add_argument("--rate-tol", type=float, default=METRICS["rows_per_s"][1])
+    ap.add_argument("--mad-k", type=float, default=MAD_K, help="noise multiplier on the pooled MAD")
+    ap.add_argument("--allow-mismatch", action="store_true", help="compare runs on different dataset scales")
+    ap.add_argument("--all", action="store_true", help="also print metrics within tolerance")
+    ap.add_argument("--json", help="write the full comparison to this file")
+    args = ap.parse_args(argv)
+
+    base_docs, base = load_side(args.baseline)
+    cand_docs, cand = load_side(args.candidate)
+
+    keys = {dataset_key(d) for d in base_docs + cand_docs}
+    if len(keys) > 1 and not args.allow_mismatch:
+        print(f"[ERROR] results come from different datasets {sorted(keys)} ({', '.join(DATASET_KEYS)}); "
+              f"pass --allow-mismatch to compare anyway")
+        return 2
+
+    commits = lambda docs: sorted({(d["git"].get("commit") or "?")[:10] for d in docs})
+    print(f"[INFO] baseline: {len(args.baseline)} file(s), commit(s) {commits(base_docs)}")
+    print(f"[INFO] candidate: {len(args.candidate)} file(s), commit(s) {commits(cand_docs)}")
+
+    tolerances = {"wall_s": args.wall_tol, "peak_rss_mb": args.rss_tol, "rows_per_s": args.rate_tol}
+    rows, notes = compare(base, cand, tolerances, args.mad_k)
+    print_report(rows, notes, show_all=args.all)
+
+    regressions = [r for r in rows if r["verdict"] == "REGRESSION"]
+    if args.json:
+        Path(args.json).write_text(json.dumps({"tolerances": tolerances, "mad_k": args.mad_k,
+                                               "rows": rows, "notes": notes}, indent=2))
+    if regressions:
+        names = sorted({f"{r['name']}:{r['metric']}" for r in regressions})
+        print(f"[FAIL] {len(regressions)} regression(s): {', '.join(names)}")
+        return 1
+    print("[OK] no regressions beyond tolerance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+afi_benchmark.py
+
+End-to-end benchmark of the AFI pipeline on synthetic data.
+
+Generates UIDAI-shaped raw dumps with make_synthetic_data.py (once per
+rows/seed/months), then runs the pipeline stages in a scratch workspace and
+times each of them:
+
+  ingest     02_merge_and_prep.py
+  clean      04, 06, 10, 11, 12, 14, 17, 20 (the mapping/review applies)
+  map        23_apply_state_manual_map.py, 24_apply_extra_state_mappings.py,
+             apply_100000_to_unknown.py, fix_daman_and_drop_unknowns.py
+  aggregate  prepare_final_for_afi_fixed.py, verify_and_prepare_afi_inputs.py
+             (its _with_totals files then replace the inputs, see adopt_totals)
+  afi        compute_afi_advanced.py, compute_afi_advanced_fixed.py
+  alerts     afi_alerts.py
+  typology   compute_afi_typologies.py
+  visuals    make_visuals_final.py, make_typology_visuals.py
+
+The curated docs/ mapping sources are seeded empty (header only, see
+EMPTY_SOURCES): every apply stage still reads its inputs and writes its
+outputs, and the labels are only title-cased (12) and canonicalized by the
+maps built into 23/24. The scripts that write review material for a human
+(03, 05, 07-09, 13, 16, 18, 19, 21, 22) are not part of the run.
+
+Every step runs in its own child process, from a fresh copy of src/, so that
+both the PROJECT-relative scripts and the cwd-relative ones read and write
+inside the workspace. Per step and per stage the harness records wall time,
+CPU time, peak RSS (from the child's rusage) and rows/s; scripts instrumented
+with afi_profile.py also contribute their internal stage breakdown.
+
+Results are written as JSON to bench/results/bench_<commit>_<rows>_<timestamp>.json
+so runs can be compared between commits (see afi_bench_compare.py).
+
+Usage:
+    python src/afi_benchmark.py --rows 1000000 [--repeat 3] [--stages ingest map ...]
+                                [--workdir bench/work] [--seed 7] [--months 12]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from make_synthetic_data import DATASETS, MANIFEST as DATA_MANIFEST, generate
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+SRC = PROJECT / "src"
+BENCH_ROOT = PROJECT / "bench"
+RESULTS_DIR = BENCH_ROOT / "results"
+WORKDIR = BENCH_ROOT / "work"
+
+SCHEMA = 2
+
+STAGES = {
+    "ingest": [("script", "02_merge_and_prep.py")],
+    "clean": [("script", "04_apply_mapping_auto.py"),
+              ("script", "06_apply_suggestions.py"),
+              ("script", "10_apply_accepted_suggestions.py"),
+              ("script", "11_apply_bulk_accepts.py"),
+              ("script", "12_finalize_cleaned_no_drop.py"),
+              ("script", "14_apply_manual_mapping_fixes.py"),
+              ("script", "17_apply_manual_revert.py"),
+              ("script", "20_apply_manual_review.py")],
+    "map": [("script", "23_apply_state_manual_map.py"),
+            ("script", "24_apply_extra_state_mappings.py"),
+            ("script", "apply_100000_to_unknown.py"),
+            ("script", "fix_daman_and_drop_unknowns.py")],
+    "aggregate": [("script", "prepare_final_for_afi_fixed.py"),
+                  ("script", "verify_and_prepare_afi_inputs.py"),
+                  ("builtin", "adopt_totals")],
+    "afi": [("script", "compute_afi_advanced.py"),
+            ("script", "compute_afi_advanced_fixed.py")],
+    "alerts": [("script", "afi_alerts.py")],
+    "typology": [("script", "compute_afi_typologies.py")],
+    "visuals": [("script", "make_visuals_final.py"),
+                ("script", "make_typology_visuals.py")],
+}
+
+# input files (relative to the workspace) whose rows are the stage's throughput denominator
+STAGE_INPUTS = {
+    "ingest": ["data/api_data_aadhar_*/*.csv"],
+    "clean": ["outputs/merged_enrolment.csv", "outputs/merged_demographic.csv", "outputs/merged_biometric.csv"],
+    "map": ["outputs/cleaned_*_final_review_applied.csv"],
+    "aggregate": ["outputs/cleaned_*_100000_to_UNKNOWN_fixed.csv"],
+    "afi": ["outputs/final_*_for_afi.csv"],
+    "alerts": ["outputs/afi_district_month.csv"],
+    "typology": ["outputs/afi_summary.csv"],
+    "visuals": ["outputs/merged_for_afi.csv"],
+}
+
+# per-repeat scratch state; data/ and src/ survive between repeats
+SCRATCH_DIRS = ["outputs", "docs", "images_final", "typology_visuals"]
+
+# the curated docs/ mapping sources the cleaning scripts read, seeded empty (header only)
+# so that every stage runs for real and keeps the raw labels (12 still title-cases them)
+MAPPING_KEY_COLS = ["original_state", "original_district"]
+CANONICAL_COLS = ["canonical_state", "canonical_district"]
+EMPTY_SOURCES = {
+    "state_district_mapping_auto_enrolment.csv": CANONICAL_COLS + ["confidence"],
+    **{f"state_district_mapping_suggestions_{ds}.csv":
+       ["canonical_state_suggestion", "canonical_district_suggestion", "suggestion_confidence"] for ds in DATASETS},
+    "suspicious_resolution_candidates.csv": ["canonical_suggestion", "action"],
+    **{f"state_district_bulk_suggestions_{ds}.csv":
+       ["proposed_canonical_state", "proposed_canonical_district", "action"] for ds in DATASETS},
+    "manual_mapping_fixes_top30.csv": CANONICAL_COLS,
+    "manual_revert_top_mapping_changes.csv": CANONICAL_COLS,
+    "manual_review_suggestions.csv": CANONICAL_COLS,
+}
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+# --------------------------------------------------------------------------
+# builtin steps: hand-offs that are manual in the real pipeline
+# --------------------------------------------------------------------------
+
+def seed_docs(docs):
+    for name, cols in EMPTY_SOURCES.items():
+        pd.DataFrame(columns=MAPPING_KEY_COLS + cols).to_csv(docs / name, index=False)
+
+
+def adopt_totals():
+    """The hand-off after verify_and_prepare_afi_inputs.py: its final_<ds>_for_afi_with_totals.csv replace the inputs."""
+    for ds in DATASETS:
+        fp = Path("outputs") / f"final_{ds}_for_afi.csv"
+        with_totals = fp.with_name(f"{fp.stem}_with_totals.csv")
+        if with_totals.exists():
+            os.replace(with_totals, fp)
+            log(f"{with_totals} -> {fp}")
+
+
+BUILTINS = {
+    "adopt_totals": adopt_totals,
+}
+
+
+# --------------------------------------------------------------------------
+# harness
+# --------------------------------------------------------------------------
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=PROJECT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def host_info():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "pandas": pd.__version__}
+
+
+def count_rows(workdir, patterns):
+    """Data rows (lines minus header) across the files matching `patterns`."""
+    total = 0
+    for pattern in patterns:
+        for fp in sorted(workdir.glob(pattern)):
+            lines = 0
+            with open(fp, "rb") as fh:
+                while block := fh.read(1 << 24):
+                    lines += block.count(b"\n")
+            total += max(lines - 1, 0)
+    return total
+
+
+def prepare_workspace(workdir, rows, seed, months):
+    """Fresh src/ copy; (re)generate data/ unless the existing manifest matches."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    shutil.rmtree(workdir / "src", ignore_errors=True)
+    shutil.copytree(SRC, workdir / "src", ignore=shutil.ignore_patterns("__pycache__"))
+
+    data = workdir / "data"
+    manifest_fp = data / DATA_MANIFEST
+    if manifest_fp.exists():
+        manifest = json.loads(manifest_fp.read_text())
+        if (manifest.get("rows_per_dataset"), manifest.get("seed"), manifest.get("months")) == (rows, seed, months):
+            log(f"reusing synthetic data in {data}")
+            return manifest
+    log(f"generating {rows:,} rows per dataset into {data}")
+    return generate(rows, data, seed=seed, months=months)
+
+
+def reset_scratch(workdir):
+    for name in SCRATCH_DIRS:
+        shutil.rmtree(workdir / name, ignore_errors=True)
+    (workdir / "outputs").mkdir()
+    (workdir / "docs").mkdir()
+    seed_docs(workdir / "docs")
+
+
+def run_step(kind, target, workdir, env, log_fp):
+    """Run one step in a child process; returns wall/cpu/peak-RSS from the child's rusage."""
+    if kind == "script":
+        cmd = [sys.executable, str(workdir / "src" / target)]
+    else:
+        cmd = [sys.executable, str(workdir / "src" / "afi_benchmark.py"), "--step", target]
+
+    with open(log_fp, "w") as out:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=out, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return {"status": "ok" if proc.returncode == 0 else "failed", "returncode": proc.returncode,
+            "wall_s": round(wall, 6), "cpu_s": round(usage.ru_utime + usage.ru_stime, 6),
+            "peak_rss_mb": round(peak, 2)}
+
+
+def with_rate(record, rows):
+    record["rows"] = rows
+    record["rows_per_s"] = round(rows / record["wall_s"], 2) if rows and record["wall_s"] > 0 else None
+    return record
+
+
+def run_repeat(workdir, stages, repeat_idx, run_id, results):
+    reset_scratch(workdir)
+    logs = workdir / "logs" / f"r{repeat_idx}"
+    logs.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, AFI_RUN_ID=run_id, MPLBACKEND="Agg", PYTHONUNBUFFERED="1")
+
+    for stage in stages:
+        rows = count_rows(workdir, STAGE_INPUTS[stage])
+        stage_rec = {"status": "ok", "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0}
+        for kind, target in STAGES[stage]:
+            step_rec = run_step(kind, target, workdir, env, logs / f"{stage}__{target}.log")
+            results["steps"].setdefault(target, {"stage": stage, "runs": []})["runs"].append(with_rate(step_rec, rows))
+            stage_rec["wall_s"] += step_rec["wall_s"]
+            stage_rec["cpu_s"] += step_rec["cpu_s"]
+            stage_rec["peak_rss_mb"] = max(stage_rec["peak_rss_mb"], step_rec["peak_rss_mb"])
+            if step_rec["status"] != "ok":
+                stage_rec["status"] = "failed"
+                results["failures"].append({"repeat": repeat_idx, "stage": stage, "step": target,
+                                            "returncode": step_rec["returncode"],
+                                            "log": str(logs / f"{stage}__{target}.log")})
+                break
+        stage_rec = with_rate({k: round(v, 6) if isinstance(v, float) else v for k, v in stage_rec.items()}, rows)
+        results["stages"].setdefault(stage, {"runs": []})["runs"].append(stage_rec)
+        log(f"r{repeat_idx} {stage:<10} {stage_rec['status']:<7} wall={stage_rec['wall_s']:8.2f}s "
+            f"rss={stage_rec['peak_rss_mb']:8.1f}MB rows={rows:,}")
+        if stage_rec["status"] != "ok":
+            log(f"r{repeat_idx} stopping: {stage} failed (see {logs})")
+            return False
+
+    # internal stage breakdown from the afi_profile-instrumented scripts
+    profile_fp = workdir / "outputs" / f"profile_{run_id}.json"
+    if profile_fp.exists():
+        for script, rec in json.loads(profile_fp.read_text())["scripts"].items():
+            step = results["steps"].get(f"{script}.py")
+            if step is not None:
+                step.setdefault("profile", []).append(rec["stages"])
+    return True
+
+
+def summarize(results):
+    for group in ("stages", "steps"):
+        for rec in results[group].values():
+            ok = [r for r in rec["runs"] if r["status"] == "ok"]
+            rec["median"] = {m: float(pd.Series([r[m] for r in ok if r[m] is not None]).median())
+                             for m in ("wall_s", "cpu_s", "peak_rss_mb", "rows_per_s")} if ok else None
+
+
+def benchmark(rows, repeat=3, stages=None, workdir=WORKDIR, seed=7, months=12, out_dir=RESULTS_DIR):
+    stages = stages or list(STAGES)
+    workdir = Path(workdir).resolve()
+    manifest = prepare_workspace(workdir, rows, seed, months)
+
+    started = datetime.now(timezone.utc)
+    stamp = started.strftime("%Y%m%dT%H%M%SZ")
+    git = git_info()
+    results = {
+        "schema": SCHEMA,
+        "created_utc": started.isoformat(),
+        "git": git,
+        "host": host_info(),
+        "dataset": {k: v for k, v in manifest.items() if k != "datasets"} | {"total_rows": rows * len(DATASETS)},
+        "repeat": repeat,
+        "stage_order": stages,
+        "stages": {},
+        "steps": {},
+        "failures": [],
+    }
+    for i in range(repeat):
+        if not run_repeat(workdir, stages, i, f"bench-{stamp}-r{i}", results):
+            break
+    summarize(results)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    commit = (git["commit"] or "nogit")[:10] + ("-dirty" if git["dirty"] else "")
+    out_fp = out_dir / f"bench_{commit}_{rows}_{stamp}.json"
+    out_fp.write_text(json.dumps(results, indent=2))
+    log(f"results -> {out_fp}")
+    return results, out_fp
+
+
+def print_summary(results):
+    print(f"{'stage':<12}{'wall_s':>10}{'cpu_s':>10}{'peak_rss_mb':>13}{'rows/s':>14}")
+    for stage in results["stage_order"]:
+        med = results["stages"].get(stage, {}).get("median")
+        if not med:
+            print(f"{stage:<12}{'-':>10}")
+            continue
+        rps = f"{med['rows_per_s']:,.0f}" if med["rows_per_s"] == med["rows_per_s"] else "-"
+        print(f"{stage:<12}{med['wall_s']:>10.2f}{med['cpu_s']:>10.2f}{med['peak_rss_mb']:>13.1f}{rps:>14}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the AFI pipeline on synthetic UIDAI-shaped data")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="rows per dataset")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stages", nargs="+", choices=list(STAGES), default=None,
+                    help="subset of stages (later stages need the earlier ones' outputs)")
+    ap.add_argument("--workdir", default=str(WORKDIR))
+    ap.add_argument("--out-dir", default=str(RESULTS_DIR))
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--months", type=int, default=12)
+    ap.add_argument("--step", choices=list(BUILTINS), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.step:
+        BUILTINS[args.step]()
+        return 0
+
+    results, _ = benchmark(args.rows, args.repeat, args.stages, args.workdir, args.seed, args.months, args.out_dir)
+    print_summary(results)
+    return 1 if results["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,706 @@
+"""
+afi_engine.py
+
+The AFI computation behind compute_afi.py, compute_afi_advanced.py and
+compute_afi_advanced_fixed.py: each script runs one variant here (run([...])), and
+the weights, windows and thresholds below are the only copy of them. Each variant
+is a feature set plus a score:
+
+  basic           compute_afi.py                  coverage ratios, 0.7/0.3 composite x 100
+  advanced        compute_afi_advanced.py         cumulative base, month-on-month volatility/growth,
+                                                  min-max norms, ADV_WEIGHTS x ADV_SCALE
+  advanced_fixed  compute_afi_advanced_fixed.py   cumulative base, rolling volatility, robust-clipped
+                                                  norms, W_BIO/W_DEMO/W_VOL/W_MIS
+  pca             compute_afi_advanced_fixed.py with USE_PCA = True (first principal component
+                  of the advanced_fixed norms)
+
+The three final_*_for_afi.csv inputs are read, coerced and merged once per run.
+A feature set is computed once from that shared frame and reused by every
+variant that scores it (advanced_fixed and pca share one). The per-pincode window
+features use grouped shift/cumsum/rolling instead of a Python groupby.apply.
+
+Outputs keep the file names and columns the scripts wrote before the engine.
+merged_for_afi.csv and afi_summary.csv also get their Arrow IPC copies (afi_io.py),
+and its afi_composite_score / age_mismatch_score get rollup cubes (afi_rollups.py).
+basic and advanced both own merged_for_afi.csv / afi_summary.csv: when both run,
+advanced keeps the names (compute_afi_typologies.py and the visuals read its
+columns, as in the pipeline where it runs after compute_afi.py) and basic writes
+merged_for_afi_basic.csv / afi_summary_basic.csv. Likewise advanced_fixed keeps
+its names over pca, which then writes them with a _pca suffix.
+
+One deliberate difference: advanced keeps pincodes apart that compute_afi_advanced.py
+merged. That script read pincode as a number and filled missing ones with 0, so a
+blank, '0' and '000000' pincode of one district were a single series; here they stay
+separate series (on the 20k-row benchmark: 33,755 rows instead of 33,689, 27 merged
+series). run() logs how many series this affects.
+
+--parity extracts src/ as of PARITY_REV (the last revision where the scripts
+computed the AFI themselves) into a scratch directory, runs those scripts there
+one by one, runs the engine on the same inputs and compares every output on its
+key columns (exit status 1 on any mismatch). The series the old advanced script
+merged are left out of its comparison.
+
+Usage:
+    python src/afi_engine.py [--variants basic advanced advanced_fixed pca] [--out-dir outputs]
+    python src/afi_engine.py --parity [--variants ...] [--parity-rev REV] [--keep]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from afi_io import write_ipc
+from afi_profile import Profiler
+from afi_rollups import write_afi_rollups
+
+
+SRC = Path(__file__).resolve().parent
+
+INPUTS = {
+    "enrol": "outputs/final_enrolment_for_afi.csv",
+    "demo": "outputs/final_demographic_for_afi.csv",
+    "bio": "outputs/final_biometric_for_afi.csv",
+}
+MERGE_SUFFIX = {"enrol": "", "demo": "_demo", "bio": "_bio"}
+
+KEY = ["period", "state_canonical", "district_clean", "pincode"]
+SERIES_KEY = ["state_canonical", "district_clean", "pincode"]
+
+ENROL_AGE_COLS = ["age_0_5", "enrol_age_5_17", "enrol_age_18_greater"]
+DEMO_AGE_COLS = ["demo_age_5_17", "demo_age_18_greater"]
+BIO_AGE_COLS = ["bio_age_5_17", "bio_age_18_greater"]
+COUNT_COLS = ENROL_AGE_COLS + DEMO_AGE_COLS + BIO_AGE_COLS + ["enrol_total", "demo_total", "bio_total"]
+
+# advanced (compute_afi_advanced.py)
+ADV_EPS = 1e-6
+ADV_WEIGHTS = [0.35, 0.30, 0.20, 0.15]
+ADV_SCALE = 1000
+
+# advanced_fixed / pca (compute_afi_advanced_fixed.py)
+LOOKBACK_MONTHS = 6
+REPEAT_THRESHOLD = 10
+EPS = 1e-9
+W_BIO = 0.35
+W_DEMO = 0.30
+W_VOL = 0.20
+W_MIS = 0.15
+USE_CUMULATIVE_BASE = True
+FIXED_COMPONENTS = ["bio_update_rate", "demo_to_enrol_ratio", "bio_volatility_rolling", "age_transition_mismatch"]
+FIXED_OUT_COLS = [
+    "period", "state_canonical", "district_clean", "pincode",
+    "enrol_total", "demo_total", "bio_total",
+    "aadhaar_base_cum",
+    "bio_update_rate", "bio_update_rate_norm",
+    "demo_to_enrol_ratio", "demo_to_enrol_ratio_norm",
+    "bio_volatility_rolling", "bio_volatility_rolling_norm",
+    "age_transition_mismatch", "age_transition_mismatch_norm",
+    "repeat_density_rolling", "repeat_density_norm",
+    "afi_score", "afi_with_repeat",
+]
+
+BASIC_SUMMARY_COLS = KEY + ["enrol_total", "demo_total", "bio_total", "demo_to_enrol_ratio", "bio_to_demo_ratio",
+                            "missing_demo", "afi_pct_bio_coverage", "afi_composite_score"]
+
+FIXED_OUTPUTS = {
+    "district_month": "afi_district_month.csv",
+    "state_month": "afi_state_month.csv",
+    "top": "top200_afi_by_period.csv",
+    "bottom": "bottom200_afi_by_period.csv",
+    "diagnostics": "afi_diagnostics.txt",
+    "rollups": "rollups",
+}
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def find_best_col(sheet, keywords_list):
+    """First column whose lower-cased name contains all keywords of a set, in order of preference."""
+    cols = sheet.columns.tolist()
+    lc = [c.lower() for c in cols]
+    for keywords in keywords_list:
+        for idx, cname in enumerate(lc):
+            if all(kdx.lower() in cname for kdx in keywords):
+                return cols[idx]
+    return None
+
+
+def to_num_series(s):
+    return pd.to_numeric(s.fillna(0).astype(str).str.replace(",", ""), errors="coerce").fillna(0.0)
+
+
+def robust_clip_scale(s, low_q=0.05, high_q=0.95):
+    s = pd.Series(s).astype(float).fillna(0.0)
+    lo = float(s.quantile(low_q))
+    hi = float(s.quantile(high_q))
+    if hi <= lo:
+        lo, hi = float(s.min()), float(s.max() if s.max() != s.min() else s.min() + 1.0)
+    scaled = (s.clip(lower=lo, upper=hi) - lo) / (hi - lo)
+    return scaled.fillna(0.0)
+
+
+# ---------------------------------------------------------------- shared frame
+
+def load_inputs(inputs=INPUTS):
+    """Read each input once as strings, normalize the key and coerce the count columns."""
+    frames = {}
+    for name, path in inputs.items():
+        if not Path(path).exists():
+            print(f"[ERROR] Missing input file: {path}")
+            sys.exit(1)
+        sheet = pd.read_csv(path, dtype=str, low_memory=False)
+        for k in KEY:
+            sheet[k] = sheet[k].fillna("").astype(str).str.strip() if k in sheet.columns else ""
+        for c in COUNT_COLS:
+            if c in sheet.columns:
+                sheet[c] = to_num_series(sheet[c])
+        frames[name] = sheet.drop_duplicates(subset=KEY)
+    return frames
+
+
+def merge_inputs(frames):
+    """Outer merge on the full key (one row per period/state/district/pincode), missing counts -> 0."""
+    merged = None
+    for name, sheet in frames.items():
+        if merged is None:
+            merged = sheet
+        else:
+            merged = merged.merge(sheet, on=KEY, how="outer", suffixes=("", MERGE_SUFFIX[name]),
+                                  validate="one_to_one")
+    for c in merged.columns:
+        if c.removesuffix("_demo").removesuffix("_bio") in COUNT_COLS:
+            merged[c] = merged[c].fillna(0.0)
+    merged["period_dt"] = pd.to_datetime(merged["period"], errors="coerce")
+    return merged
+
+
+def sum_present(sheet, cols):
+    present = [c for c in cols if c in sheet.columns]
+    return sheet[present].sum(axis=1).astype(float) if present else pd.Series(0.0, index=sheet.index)
+
+
+def column_or_zero(sheet, col):
+    return sheet[col].astype(float) if col is not None and col in sheet.columns else pd.Series(0.0, index=sheet.index)
+
+
+def ratio_or_zero(num, den):
+    """num / den, 0 where den is 0 (compute_afi.py's safe_div)."""
+    return pd.Series(np.where(den != 0, num / den.where(den != 0, 1.0), 0.0), index=num.index)
+
+
+# ---------------------------------------------------------------- feature sets
+
+def basic_features(base):
+    sheet = base[KEY].copy()
+    sheet["enrol_total"] = sum_present(base, ENROL_AGE_COLS)
+    sheet["demo_total"] = sum_present(base, DEMO_AGE_COLS)
+    sheet["bio_total"] = sum_present(base, BIO_AGE_COLS)
+    sheet["demo_to_enrol_ratio"] = ratio_or_zero(sheet["enrol_total"], sheet["demo_total"])
+    sheet["bio_to_demo_ratio"] = ratio_or_zero(sheet["bio_total"], sheet["demo_total"])
+    sheet["missing_demo"] = (sheet["demo_total"] - (sheet["enrol_total"] + sheet["bio_total"])).clip(lower=0.0)
+    return sheet
+
+
+def advanced_features(base):
+    def safe_div(n, d):
+        return n / (d + ADV_EPS)
+
+    sheet = base.sort_values(SERIES_KEY + ["period_dt"])
+    groups = sheet.groupby(SERIES_KEY, sort=False, dropna=False)
+    sheet["aadhaar_base"] = groups["enrol_total"].cumsum().clip(lower=1)
+
+    prev = groups[["bio_total", "demo_total", "enrol_total"]].shift(1).fillna(0)
+    for col in ["bio_total", "demo_total", "enrol_total"]:
+        sheet[f"{col}_prev"] = prev[col]
+    sheet["bio_volatility"] = (sheet["bio_total"] - sheet["bio_total_prev"]).abs()
+    sheet["demo_volatility"] = (sheet["demo_total"] - sheet["demo_total_prev"]).abs()
+    for col in ["bio", "demo", "enrol"]:
+        cur, before = sheet[f"{col}_total"], sheet[f"{col}_total_prev"]
+        sheet[f"{col}_growth_pct"] = safe_div(cur - before, before) * 100
+
+    adult_updates = sheet["bio_age_18_greater"] + sheet["demo_age_18_greater"]
+    adult_enrol = sheet["enrol_age_18_greater"]
+    sheet["age_mismatch_score"] = safe_div(adult_updates - adult_enrol, adult_enrol).clip(lower=0)
+
+    sheet["bio_to_base"] = safe_div(sheet["bio_total"], sheet["aadhaar_base"])
+    sheet["demo_to_enrol"] = safe_div(sheet["demo_total"], sheet["enrol_total"])
+    return sheet.drop(columns="period_dt")
+
+
+def fixed_features(base):
+    sheet = base.copy()
+    detected = {
+        "enrol_col": find_best_col(sheet, [["enrol", "total"], ["enrol_total"], ["enrol"]]),
+        "demo_col": find_best_col(sheet, [["demo", "total"], ["demo_total"], ["demographic", "total"]]),
+        "bio_col": find_best_col(sheet, [["bio", "total"], ["bio_total"], ["biometric", "total"]]),
+    }
+    enrol_age18 = find_best_col(sheet, [["enrol", "age_18"], ["enrol_age_18_greater"], ["age_18_greater"]])
+    bio_age18 = find_best_col(sheet, [["bio", "age_18"], ["bio_age_18_greater"], ["bio_age_18"]])
+    sheet["enrol_total"] = column_or_zero(sheet, detected["enrol_col"])
+    sheet["demo_total"] = column_or_zero(sheet, detected["demo_col"])
+    sheet["bio_total"] = column_or_zero(sheet, detected["bio_col"])
+    sheet["enrol_age_18_greater"] = column_or_zero(sheet, enrol_age18)
+    sheet["bio_age_18_greater"] = column_or_zero(sheet, bio_age18)
+
+    sheet = sheet.sort_values(SERIES_KEY + ["period_dt"]).reset_index(drop=True)
+    groups = sheet.groupby(SERIES_KEY, sort=False, dropna=False)
+    if USE_CUMULATIVE_BASE:
+        sheet["aadhaar_base_cum"] = groups["enrol_total"].cumsum().fillna(0.0).clip(lower=0.0)
+    else:
+        sheet["aadhaar_base_cum"] = sheet["enrol_total"].copy()
+
+    sheet["bio_update_rate"] = sheet["bio_total"] / (sheet["aadhaar_base_cum"].replace({0: EPS}) + EPS)
+    sheet["demo_to_enrol_ratio"] = sheet["demo_total"] / (sheet["enrol_total"].replace({0: EPS}) + EPS)
+    sheet["bio_to_demo_ratio"] = sheet["bio_total"] / (sheet["demo_total"].replace({0: EPS}) + EPS)
+
+    # rows are sorted by series then period, so the grouped rolling windows line up with the frame
+    series = [sheet[k] for k in SERIES_KEY]
+    window = dict(window=LOOKBACK_MONTHS, min_periods=1)
+    levels = list(range(len(SERIES_KEY)))
+    rolling_std = sheet["bio_total"].groupby(series, sort=False, dropna=False).rolling(**window).std()
+    sheet["bio_volatility_rolling"] = rolling_std.droplevel(levels).fillna(0.0)
+    repeats = (sheet["bio_total"] > REPEAT_THRESHOLD).astype(float)
+    repeat_mean = repeats.groupby(series, sort=False, dropna=False).rolling(**window).mean()
+    sheet["repeat_density_rolling"] = repeat_mean.droplevel(levels).fillna(0.0)
+
+    sheet["age_transition_mismatch"] = ((sheet["enrol_age_18_greater"] - sheet["bio_age_18_greater"]).abs()
+                                        / (sheet["enrol_age_18_greater"] + 1.0))
+    for c in FIXED_COMPONENTS:
+        sheet[c + "_norm"] = robust_clip_scale(sheet[c])
+    sheet["repeat_density_norm"] = robust_clip_scale(sheet["repeat_density_rolling"])
+    sheet.attrs["detected"] = detected
+    return sheet
+
+
+FEATURES = {
+    "basic": basic_features,
+    "advanced": advanced_features,
+    "fixed": fixed_features,
+}
+
+
+# ---------------------------------------------------------------- scores
+
+def basic_score(sheet):
+    sheet["afi_pct_bio_coverage"] = (sheet["bio_to_demo_ratio"] * 100.0).round(4)
+    composite = 0.7 * sheet["bio_to_demo_ratio"] + 0.3 * sheet["demo_to_enrol_ratio"]
+    sheet["afi_composite_score"] = (composite * 100.0).round(4)
+    return sheet
+
+
+def advanced_score(sheet):
+    def norm(s):
+        return (s - s.min()) / (s.max() - s.min() + ADV_EPS)
+
+    sheet["n_bio"] = norm(sheet["bio_to_base"])
+    sheet["n_demo"] = norm(sheet["demo_to_enrol"])
+    sheet["n_vol"] = norm(sheet["bio_volatility"] + sheet["demo_volatility"])
+    sheet["n_age"] = norm(sheet["age_mismatch_score"])
+    w = ADV_WEIGHTS
+    sheet["afi_composite_score"] = (w[0] * sheet["n_bio"] + w[1] * sheet["n_demo"]
+                                    + w[2] * sheet["n_vol"] + w[3] * sheet["n_age"]) * ADV_SCALE
+    return sheet
+
+
+def weighted_score(sheet):
+    wsum = W_BIO + W_DEMO + W_VOL + W_MIS
+    ws = np.array([W_BIO, W_DEMO, W_VOL, W_MIS]) / (wsum if wsum > 0 else 1.0)
+    norms = sheet[[c + "_norm" for c in FIXED_COMPONENTS]].to_numpy(dtype=float)
+    sheet["afi_score"] = norms @ ws
+    sheet["afi_with_repeat"] = 0.8 * sheet["afi_score"] + 0.2 * sheet["repeat_density_norm"]
+    return sheet
+
+
+def pca_score(sheet):
+    from sklearn.decomposition import PCA
+
+    X = sheet[[c + "_norm" for c in FIXED_COMPONENTS]].fillna(0.0).values
+    pc1 = PCA(n_components=1).fit_transform(X).flatten()
+    pc1 = pc1 - pc1.min()
+    if pc1.max() > 0:
+        pc1 = pc1 / pc1.max()
+    sheet["afi_score"] = pc1
+    sheet["afi_with_repeat"] = 0.8 * sheet["afi_score"] + 0.2 * sheet["repeat_density_norm"]
+    return sheet
+
+
+# ---------------------------------------------------------------- writers
+
+def write_merged_rollups(sheet, out_dir):
+    """Cubes of the merged_for_afi.csv scores (read by figure_data.py instead of the rows)."""
+    for metric in ("afi_composite_score", "age_mismatch_score"):
+        if metric in sheet.columns:
+            write_afi_rollups(sheet, metric=metric, out_dir=out_dir)
+
+
+def write_basic(sheet, paths):
+    sheet.to_csv(paths["merged"], index=False)
+    write_ipc(sheet, paths["merged"])
+    summary = sheet[BASIC_SUMMARY_COLS]
+    summary.to_csv(paths["summary"], index=False)
+    write_ipc(summary, paths["summary"])
+    write_merged_rollups(sheet, paths["rollups"])
+
+
+def write_advanced(sheet, paths):
+    sheet.to_csv(paths["merged"], index=False)
+    write_ipc(sheet, paths["merged"])
+    sheet.to_csv(paths["summary"], index=False)
+    write_ipc(sheet, paths["summary"])
+    write_merged_rollups(sheet, paths["rollups"])
+    sheet.sort_values("afi_composite_score", ascending=False).head(200).to_csv(paths["top"], index=False)
+    sheet.sort_values("afi_composite_score", ascending=True).head(200).to_csv(paths["bottom"], index=False)
+
+
+def write_fixed(sheet, paths):
+    present = [c for c in FIXED_OUT_COLS if c in sheet.columns]
+    sheet.loc[:, present].to_csv(paths["district_month"], index=False)
+
+    state_month = sheet.groupby(["period", "state_canonical"], as_index=False).agg({
+        "afi_score": "mean", "afi_with_repeat": "mean",
+        "enrol_total": "sum", "demo_total": "sum", "bio_total": "sum",
+    })
+    state_month.to_csv(paths["state_month"], index=False)
+
+    write_afi_rollups(sheet, metric="afi_score", out_dir=paths["rollups"])
+
+    ranked = sheet.sort_values("afi_score", ascending=False, kind="stable")
+    ranked.groupby("period", sort=False).head(200).to_csv(paths["top"], index=False)
+    ranked = sheet.sort_values("afi_score", ascending=True, kind="stable")
+    ranked.groupby("period", sort=False).head(200).to_csv(paths["bottom"], index=False)
+
+    detected = sheet.attrs.get("detected", {})
+    with open(paths["diagnostics"], "w") as fh:
+        fh.write("AFI diagnostics (fixed)\n")
+        fh.write("========================\n")
+        fh.write(f"Rows processed: {len(sheet)}\n")
+        fh.write(f"Detected enrol_col={detected.get('enrol_col')}, demo_col={detected.get('demo_col')}, "
+                 f"bio_col={detected.get('bio_col')}\n")
+        fh.write(f"USE_CUMULATIVE_BASE={USE_CUMULATIVE_BASE}\n\n")
+        for c in FIXED_COMPONENTS + ["repeat_density_rolling", "aadhaar_base_cum"]:
+            if c in sheet.columns:
+                s = sheet[c]
+                fh.write(f"{c}: min={s.min():.3f} q05={s.quantile(0.05):.3f} median={s.median():.3f} "
+                         f"mean={s.mean():.3f} q95={s.quantile(0.95):.3f} max={s.max():.3f}\n")
+
+
+def suffixed(name, tag):
+    path = Path(name)
+    return f"{path.stem}_{tag}{path.suffix}"
+
+
+VARIANTS = {
+    # order matters: a later variant keeps a shared output name (see module docstring)
+    "basic": {
+        "script": "compute_afi.py", "metric": "afi_composite_score",
+        "features": "basic", "score": basic_score, "write": write_basic,
+        "outputs": {"merged": "merged_for_afi.csv", "summary": "afi_summary.csv", "rollups": "rollups"},
+    },
+    "advanced": {
+        "script": "compute_afi_advanced.py", "metric": "afi_composite_score",
+        "features": "advanced", "score": advanced_score, "write": write_advanced,
+        "outputs": {"merged": "merged_for_afi.csv", "summary": "afi_summary.csv",
+                    "top": "top200_afi.csv", "bottom": "bottom200_afi.csv", "rollups": "rollups"},
+    },
+    "pca": {
+        "script": "compute_afi_advanced_fixed.py", "metric": "afi_score",
+        "features": "fixed", "score": pca_score, "write": write_fixed,
+        "outputs": FIXED_OUTPUTS,
+    },
+    "advanced_fixed": {
+        "script": "compute_afi_advanced_fixed.py", "metric": "afi_score",
+        "features": "fixed", "score": weighted_score, "write": write_fixed,
+        "outputs": FIXED_OUTPUTS,
+    },
+}
+
+
+def output_paths(variants, out_dir):
+    """
+    {variant: {role: path}}. A name claimed by several selected variants that write the
+    same metric goes to the last one; the others get a _<variant> suffix. Variants writing
+    different metrics share it (the rollups directory: afi_rollups.cube_name keeps them apart).
+    """
+    out_dir = Path(out_dir)
+    owner = {}
+    for name in VARIANTS:
+        if name in variants:
+            for fname in VARIANTS[name]["outputs"].values():
+                owner[(fname, VARIANTS[name]["metric"])] = name
+    return {
+        name: {role: out_dir / (fname if owner[(fname, VARIANTS[name]["metric"])] == name
+                                else suffixed(fname, name))
+               for role, fname in VARIANTS[name]["outputs"].items()}
+        for name in VARIANTS if name in variants
+    }
+
+
+def run(variants, out_dir="outputs", inputs=INPUTS, prof=None):
+    """Load and merge once, then compute/score/write each variant. Returns {variant: {role: path}}."""
+    prof = prof or Profiler("afi_engine")
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    paths = output_paths(variants, out_dir)
+
+    log("Loading inputs...")
+    with prof.stage("load") as st:
+        frames = load_inputs(inputs)
+        st.rows(sum(len(f) for f in frames.values()))
+    with prof.stage("merge") as st:
+        base = merge_inputs(frames)
+        st.rows(len(base))
+    log(f"Merged rows: {len(base):,}")
+    del frames
+
+    features = {}
+    for name, targets in paths.items():
+        spec = VARIANTS[name]
+        fset = spec["features"]
+        if fset not in features:
+            with prof.stage(f"features_{fset}") as st:
+                features[fset] = FEATURES[fset](base)
+                st.rows(len(base))
+        with prof.stage(f"score_{name}") as st:
+            sheet = spec["score"](features[fset].copy(deep=False))
+            st.rows(len(sheet))
+        if name in NUMERIC_PINCODE:
+            apart = conflated_series(sheet, numeric_pincode=True)
+            if not apart.empty:
+                log(f"{name}: {len(apart):,} series keep blank / 0 / 000000 pincodes apart ({spec['script']} "
+                    f"before afi_engine merged them), e.g. {', '.join(apart.iloc[0])}")
+        with prof.stage(f"write_{name}") as st:
+            spec["write"](sheet, targets)
+            st.rows(len(sheet))
+        log(f"{name}: " + ", ".join(str(p) for p in targets.values()))
+    return paths
+
+
+# ---------------------------------------------------------------- parity with the scripts before the engine
+
+# the last revision where compute_afi*.py computed the AFI themselves
+PARITY_REV = "ec4eeb8de7b8aa8b2df4c20e035d562edc12202e"
+
+PARITY_RTOL = 1e-6
+PARITY_ATOL = 1e-9
+
+# role: key columns of a keyed output
+PARITY_KEYS = {
+    "merged": KEY,
+    "summary": KEY,
+    "district_month": KEY,
+    "state_month": ["period", "state_canonical"],
+}
+# (variant, role): (score, group column, ascending) of a top/bottom list
+PARITY_RANKED = {
+    ("advanced", "top"): ("afi_composite_score", None, False),
+    ("advanced", "bottom"): ("afi_composite_score", None, True),
+    ("advanced_fixed", "top"): ("afi_score", "period", False),
+    ("advanced_fixed", "bottom"): ("afi_score", "period", True),
+    ("pca", "top"): ("afi_score", "period", False),
+    ("pca", "bottom"): ("afi_score", "period", True),
+}
+# compute_afi_advanced.py before the engine read pincode as a number and filled missing
+# ones with 0, so '', '0' and '000000' were one series there (the engine keeps them apart)
+NUMERIC_PINCODE = {"advanced"}
+
+
+def normalize_keys(sheet, keys, numeric_pincode=False):
+    sheet = sheet.copy()
+    for k in keys:
+        sheet[k] = sheet[k].fillna("").astype(str).str.strip()
+    if "period" in keys:
+        sheet["period"] = sheet["period"].str[:10]
+    if numeric_pincode and "pincode" in keys:
+        sheet["pincode"] = pd.to_numeric(sheet["pincode"], errors="coerce").fillna(0).astype("int64").astype(str)
+    return sheet
+
+
+def conflated_series(engine, numeric_pincode):
+    """Normalized series keys that stand for several engine series (the script merged them into one)."""
+    if not numeric_pincode:
+        return pd.DataFrame(columns=SERIES_KEY)
+    raw = engine[SERIES_KEY].fillna("").astype(str).drop_duplicates()
+    norm = normalize_keys(raw, SERIES_KEY, numeric_pincode)
+    return norm[norm.duplicated(SERIES_KEY, keep=False)].drop_duplicates()
+
+
+def drop_series(sheet, series):
+    if series.empty:
+        return sheet
+    hit = sheet.merge(series.assign(_drop=True), on=SERIES_KEY, how="left")["_drop"].notna().to_numpy()
+    return sheet[~hit]
+
+
+def compare_keyed(legacy, engine, keys, numeric_pincode=False, skip=None):
+    """Problems found joining both tables on `keys` and comparing their shared numeric columns."""
+    problems = []
+    legacy, engine = normalize_keys(legacy, keys, numeric_pincode), normalize_keys(engine, keys, numeric_pincode)
+    if skip is not None and set(SERIES_KEY) <= set(keys):
+        legacy, engine = drop_series(legacy, skip), drop_series(engine, skip)
+    if len(legacy) != len(engine):
+        problems.append(f"rows {len(legacy):,} (script) vs {len(engine):,} (engine)")
+    joined = legacy.merge(engine, on=keys, how="inner", suffixes=("_script", "_engine"))
+    if len(joined) != len(legacy):
+        problems.append(f"{len(legacy) - len(joined):,} script rows without an engine row")
+    numeric = [c for c in legacy.columns if c not in keys and c in engine.columns
+               and pd.api.types.is_numeric_dtype(legacy[c]) and pd.api.types.is_numeric_dtype(engine[c])]
+    for c in numeric:
+        a, b = joined[f"{c}_script"].to_numpy(float), joined[f"{c}_engine"].to_numpy(float)
+        bad = ~np.isclose(a, b, rtol=PARITY_RTOL, atol=PARITY_ATOL, equal_nan=True)
+        if bad.any():
+            problems.append(f"{c}: {int(bad.sum()):,} values differ (max abs diff {np.nanmax(np.abs(a - b)):.3g})")
+    return problems, f"{len(numeric)} columns on {len(joined):,} rows"
+
+
+def compare_ranked(legacy, engine, score, by, ascending, numeric_pincode=False, skip=None):
+    """
+    Ties make the row order of a top/bottom list arbitrary, so compare the ranked scores per group.
+    With series excluded (`skip`) both lists are the head of the same ranking, so the shorter one
+    must match the start of the longer one.
+    """
+    if skip is not None and not skip.empty:
+        legacy = drop_series(normalize_keys(legacy, SERIES_KEY, numeric_pincode), skip)
+        engine = drop_series(normalize_keys(engine, SERIES_KEY, numeric_pincode), skip)
+
+    def ranked(sheet):
+        groups = sheet.groupby(sheet[by].astype(str).str[:10]) if by else [("all", sheet)]
+        return {g: np.sort(s[score].to_numpy(float))[::1 if ascending else -1] for g, s in groups}
+
+    want, got = ranked(legacy), ranked(engine)
+    problems = []
+    if set(want) != set(got):
+        problems.append(f"groups differ: {sorted(set(want) ^ set(got))[:5]}")
+    for g in sorted(set(want) & set(got)):
+        n = min(len(want[g]), len(got[g]))
+        if (skip is None or skip.empty) and len(want[g]) != len(got[g]):
+            problems.append(f"{by or 'all'}={g}: {len(want[g])} vs {len(got[g])} rows")
+        elif not np.allclose(want[g][:n], got[g][:n], rtol=PARITY_RTOL, atol=PARITY_ATOL):
+            problems.append(f"{by or 'all'}={g}: ranked {score} differs")
+    return problems, f"ranked {score}" + (f" per {by}" if by else "")
+
+
+def compare_text(legacy_path, engine_path):
+    want, got = Path(legacy_path).read_text().splitlines(), Path(engine_path).read_text().splitlines()
+    diff = [f"'{a}' vs '{b}'" for a, b in zip(want, got) if a != b]
+    if len(want) != len(got):
+        diff.append(f"{len(want)} vs {len(got)} lines")
+    return diff, "text"
+
+
+def checkout_scripts(rev, root):
+    """Extract src/ as of `rev` under `root`."""
+    archive = subprocess.run(["git", "archive", rev, "src"], cwd=SRC.parent, capture_output=True)
+    if archive.returncode != 0:
+        print(archive.stderr.decode(errors="replace")[-2000:])
+        print(f"[ERROR] cannot read src/ at {rev} (--parity needs the git history)")
+        sys.exit(1)
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+        tar.extractall(root)
+
+
+def run_scripts(variants, inputs, work, rev):
+    """Run each variant's script as of `rev` in its own directory under `work`; returns {variant: outputs dir}."""
+    done = {}
+    for name in VARIANTS:
+        if name not in variants:
+            continue
+        spec = VARIANTS[name]
+        root = work / f"script_{name}"
+        (root / "outputs").mkdir(parents=True)
+        for src in inputs.values():
+            os.symlink(Path(src).resolve(), root / "outputs" / Path(src).name)
+        checkout_scripts(rev, root)
+        script = root / "src" / spec["script"]
+        if name == "pca":
+            script.write_text(script.read_text().replace("USE_PCA = False", "USE_PCA = True"))
+
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, str(script)], cwd=root, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:], proc.stderr[-2000:])
+            print(f"[ERROR] {spec['script']} failed ({name})")
+            sys.exit(1)
+        log(f"script {spec['script']}@{rev[:10]} ({name}): {time.perf_counter() - t0:.1f}s")
+        done[name] = root / "outputs"
+    return done
+
+
+def parity(variants, inputs=INPUTS, keep=False, rev=PARITY_REV):
+    work = Path(tempfile.mkdtemp(prefix="afi_parity_"))
+    log(f"Parity workspace: {work}")
+    script_dirs = run_scripts(variants, inputs, work, rev)
+
+    t0 = time.perf_counter()
+    paths = run(variants, work / "engine", inputs, Profiler("afi_engine", out_dir=work / "engine"))
+    log(f"engine ({', '.join(paths)}): {time.perf_counter() - t0:.1f}s")
+
+    failed = 0
+    for name, targets in paths.items():
+        legacy_names = VARIANTS[name]["outputs"]
+        numeric_pincode = name in NUMERIC_PINCODE
+        main_role = next(r for r in targets if r in PARITY_KEYS)
+        skip = conflated_series(pd.read_csv(targets[main_role], usecols=SERIES_KEY, dtype=str), numeric_pincode)
+        if not skip.empty:
+            print(f"[NOTE] {name}: {len(skip):,} series excluded - {VARIANTS[name]['script']}@{rev[:10]} merges "
+                  f"distinct pincodes into them (e.g. {', '.join(skip.iloc[0])})")
+
+        for role, engine_path in targets.items():
+            legacy_path = script_dirs[name] / legacy_names[role]
+            if role == "rollups":
+                continue        # built by afi_rollups.py from the compared district-month frame
+            if role == "diagnostics":
+                problems, compared = compare_text(legacy_path, engine_path)
+            elif (name, role) in PARITY_RANKED:
+                score, by, ascending = PARITY_RANKED[(name, role)]
+                problems, compared = compare_ranked(pd.read_csv(legacy_path, dtype=str).astype({score: float}),
+                                                    pd.read_csv(engine_path, dtype=str).astype({score: float}),
+                                                    score, by, ascending, numeric_pincode, skip)
+            else:
+                keys = PARITY_KEYS[role]
+                problems, compared = compare_keyed(pd.read_csv(legacy_path, dtype={k: str for k in keys}),
+                                                   pd.read_csv(engine_path, dtype={k: str for k in keys}),
+                                                   keys, numeric_pincode, skip)
+            status = "OK" if not problems else "MISMATCH"
+            print(f"[{status}] {name:<15}{role:<16}{legacy_names[role]} ({compared})")
+            for p in problems:
+                print(f"         {p}")
+            failed += bool(problems)
+
+    if keep:
+        log(f"Kept {work}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compute one or more AFI variants from a single merged frame")
+    ap.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    ap.add_argument("--out-dir", default="outputs")
+    ap.add_argument("--parity", action="store_true",
+                    help="compare against the scripts as of --parity-rev on the same inputs")
+    ap.add_argument("--parity-rev", default=PARITY_REV, help="git revision of the scripts --parity runs")
+    ap.add_argument("--keep", action="store_true", help="keep the --parity workspace")
+    args = ap.parse_args(argv)
+
+    if args.parity:
+        return parity(args.variants, keep=args.keep, rev=args.parity_rev)
+
+    prof = Profiler("afi_engine")
+    run(args.variants, args.out_dir, prof=prof)
+    prof.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
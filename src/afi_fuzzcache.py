@@ -0,0 +1,199 @@
+"""
+afi_fuzzcache.py
+
+Persistent score cache for the fuzzy string matching done by the cleaning
+scripts, keyed by (algorithm, a, b).
+
+Two tiers:
+  memory   an LRU dict of the most recently used scores (MEMORY_ENTRIES)
+  disk     a SQLite table in outputs/.fuzzy_scores.sqlite (WAL mode, so
+           several scripts can share it), one row per scored pair
+
+scores(algo, pairs) looks a whole batch up at once: memory first, then one
+joined SELECT per batch for the rest, then computes whatever is still missing
+(rapidfuzz pairs through process.cpdist) and inserts those in one transaction.
+A rerun after a small mapping tweak scores only the pairs that are new.
+
+Algorithms:
+  difflib.ratio     difflib.SequenceMatcher(None, a, b).ratio()
+  rapidfuzz.ratio   rapidfuzz.fuzz.ratio(a, b)
+
+Only route an algorithm through the cache when a score costs more than a
+lookup: a batched SQLite lookup is ~3 us per pair, difflib.ratio ~17 us and
+rapidfuzz.ratio ~0.3 us on district-length strings. The difflib scorers (19, 22,
+23) use it; the rapidfuzz ones compute directly.
+
+Set AFI_FUZZY_CACHE to another path to relocate the file, or to "off" to keep
+the memory tier only.
+
+Usage:
+    from afi_fuzzcache import ScoreCache
+    cache = ScoreCache()
+    ratios = cache.scores("difflib.ratio", [(s.lower(), w.lower()) for w in WHITELIST])
+    cache.report()
+
+    python src/afi_fuzzcache.py stats
+    python src/afi_fuzzcache.py clear [--algo difflib.ratio]
+"""
+
+import argparse
+import os
+import sqlite3
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import numpy as np
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+CACHE_PATH = PROJECT / "outputs" / ".fuzzy_scores.sqlite"
+CACHE_ENV = "AFI_FUZZY_CACHE"
+
+MEMORY_ENTRIES = 200_000   # LRU bound of the in-memory tier
+BATCH = 10_000             # pairs per SELECT / INSERT round trip
+
+
+def difflib_ratio(pairs):
+    return [SequenceMatcher(None, a, b).ratio() for a, b in pairs]
+
+
+def rapidfuzz_ratio(pairs):
+    from rapidfuzz import fuzz
+    from rapidfuzz.process import cpdist
+
+    if not pairs:
+        return []
+    scores = cpdist([a for a, _ in pairs], [b for _, b in pairs], scorer=fuzz.ratio,
+                    workers=-1, dtype=np.float64)
+    return scores.tolist()
+
+
+ALGORITHMS = {
+    "difflib.ratio": difflib_ratio,
+    "rapidfuzz.ratio": rapidfuzz_ratio,
+}
+
+
+def cache_path():
+    return os.environ.get(CACHE_ENV) or CACHE_PATH
+
+
+class ScoreCache:
+    """(algorithm, a, b) -> score, with an LRU memory tier over a SQLite table."""
+
+    def __init__(self, path=None, memory=MEMORY_ENTRIES):
+        path = path or cache_path()
+        self.memory = OrderedDict()
+        self.capacity = memory
+        self.hits_memory = self.hits_disk = self.computed = 0
+        self.db = None
+        if str(path) != "off":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path))
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS scores (algo TEXT, a TEXT, b TEXT, score REAL, "
+                            "PRIMARY KEY (algo, a, b)) WITHOUT ROWID")
+            self.db.execute("CREATE TEMP TABLE wanted (a TEXT, b TEXT)")
+        self.path = path
+
+    def _remember(self, key, score):
+        self.memory[key] = score
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def _fetch(self, algo, pairs):
+        found = {}
+        for lo in range(0, len(pairs), BATCH):
+            self.db.execute("DELETE FROM temp.wanted")
+            self.db.executemany("INSERT INTO temp.wanted VALUES (?, ?)", pairs[lo:lo + BATCH])
+            rows = self.db.execute("SELECT w.a, w.b, s.score FROM temp.wanted w JOIN scores s "
+                                   "ON s.algo = ? AND s.a = w.a AND s.b = w.b", (algo,))
+            found.update(((a, b), score) for a, b, score in rows)
+        # end the read transaction the temp-table inserts opened: a connection that read
+        # and then writes after another one committed fails at once with "database is locked"
+        self.db.commit()
+        return found
+
+    def _store(self, algo, rows):
+        with self.db:
+            for lo in range(0, len(rows), BATCH):
+                self.db.executemany("INSERT OR IGNORE INTO scores VALUES (?, ?, ?, ?)",
+                                    [(algo, a, b, s) for a, b, s in rows[lo:lo + BATCH]])
+
+    def scores(self, algo, pairs):
+        """Scores of `pairs` (a list of (a, b) strings) under `algo`, in order."""
+        scorer = ALGORITHMS[algo]
+        out = [None] * len(pairs)
+        missing = {}
+        for i, (a, b) in enumerate(pairs):
+            key = (algo, a, b)
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                out[i] = self.memory[key]
+                self.hits_memory += 1
+            else:
+                missing.setdefault((a, b), []).append(i)
+        if not missing:
+            return out
+
+        wanted = list(missing)
+        found = self._fetch(algo, wanted) if self.db is not None else {}
+        self.hits_disk += sum(len(missing[p]) for p in found)
+        new = [p for p in wanted if p not in found]
+        if new:
+            fresh = scorer(new)
+            found.update(zip(new, fresh))
+            self.computed += len(new)
+            if self.db is not None:
+                self._store(algo, [(a, b, s) for (a, b), s in zip(new, fresh)])
+
+        for pair, idx in missing.items():
+            score = found[pair]
+            self._remember((algo, *pair), score)
+            for i in idx:
+                out[i] = score
+        return out
+
+    def score(self, algo, a, b):
+        return self.scores(algo, [(a, b)])[0]
+
+    def report(self):
+        lookups = self.hits_memory + self.hits_disk + self.computed
+        print(f"[INFO] fuzzy score cache {self.path}: {lookups:,} lookups, {self.hits_memory:,} memory hits, "
+              f"{self.hits_disk:,} disk hits, {self.computed:,} computed")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Inspect or clear the fuzzy score cache")
+    ap.add_argument("command", choices=["stats", "clear"])
+    ap.add_argument("--algo", choices=list(ALGORITHMS))
+    args = ap.parse_args(argv)
+
+    path = cache_path()
+    if str(path) == "off" or not Path(path).exists():
+        print(f"[INFO] no cache at {path}")
+        return
+    db = sqlite3.connect(str(path))
+    if args.command == "stats":
+        for algo, n in db.execute("SELECT algo, COUNT(*) FROM scores GROUP BY algo ORDER BY algo"):
+            print(f"{algo:<20} {n:>12,} pairs")
+        print(f"{'file size':<20} {Path(path).stat().st_size / 1e6:>12.1f} MB")
+    else:
+        where, params = ("WHERE algo = ?", (args.algo,)) if args.algo else ("", ())
+        with db:
+            n = db.execute(f"DELETE FROM scores {where}", params).rowcount
+        db.execute("VACUUM")
+        print(f"[INFO] removed {n:,} cached scores")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
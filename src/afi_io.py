@@ -0,0 +1,255 @@
+"""
+afi_io.py
+
+Table reading for all scripts, and the Arrow IPC handoff between the AFI
+stages and their readers.
+
+read_table(path, columns=..., filters=...) loads only the columns a script
+declares and only the rows its filters keep, pushing both down as far as the
+source allows:
+
+  .parquet   pyarrow reads the projected columns and skips row groups by their
+             statistics (filters become a dataset expression)
+  .csv       the fresh Arrow IPC sibling (below) if there is one, memory-mapped,
+             projected and filtered in Arrow; else pd.read_csv(usecols=...),
+             streamed in chunks and filtered chunk by chunk when filters are given
+
+iter_table() yields the same result in bounded chunks, for scripts that stream.
+
+A CSV that a fix stage recorded as a view (afi_overlay.py: a base CSV plus
+small pair overlays, outputs/<name>.view.json) is read by composing the
+overlays onto the base chunk by chunk; table_exists() counts it as present.
+
+Filters are (column, op, value) triples, all of which must hold; op is one of
+==, !=, <, <=, >, >=, in, not in. Rows with a missing value in a filtered column
+never match. Against text columns (dtype=str), a numeric value compares
+numerically. For example:
+
+  filters=[("period", ">=", "2025-06-01"), ("state_canonical", "in", states),
+           ("afi_composite_score", ">", 0)]
+
+Every AFI table that downstream scripts load (merged_for_afi.csv,
+afi_summary.csv, afi_with_typologies.csv) is also written as an uncompressed
+Arrow IPC file (Feather v2) next to the CSV:
+
+  outputs/merged_for_afi.csv   ->  outputs/merged_for_afi.arrow
+
+so several consumers share the OS page cache and nothing is re-parsed from
+text. The IPC file records the size and mtime of the CSV it was written with;
+if the CSV has since been rewritten by something else, read_table() falls
+back to the CSV. The IPC file is written to a temporary name and renamed into
+place, so a reader that still has the previous file mapped keeps a
+consistent view.
+
+Usage:
+    from afi_io import read_table, write_ipc
+    sheet.to_csv(OUT, index=False)
+    write_ipc(sheet, OUT)
+    ...
+    sheet = read_table("outputs/merged_for_afi.csv", columns=["period", "afi_composite_score"],
+                       filters=[("afi_composite_score", ">", 0)])
+"""
+
+import json
+import operator
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from afi_overlay import iter_view, resolve_view
+
+
+IPC_SUFFIX = ".arrow"
+STAMP_KEY = b"afi_io.source"
+CSV_CHUNK_ROWS = 500_000     # rows per chunk when filtering a CSV
+
+COMPARE = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+           "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def ipc_path(csv_path):
+    return Path(csv_path).with_suffix(IPC_SUFFIX)
+
+
+def source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def to_arrow(sheet):
+    """Arrow table of `sheet`; object columns Arrow cannot type (e.g. ints mixed with str) are stored as str."""
+    arrays = []
+    for name in sheet.columns:
+        col = sheet[name]
+        try:
+            arrays.append(pa.array(col, from_pandas=True))
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            arrays.append(pa.array(col.astype(str).where(col.notna()), from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in sheet.columns])
+
+
+def write_ipc(sheet, csv_path):
+    """Write `sheet` as the IPC sibling of the CSV just written to `csv_path`."""
+    path = ipc_path(csv_path)
+    table = to_arrow(sheet)
+    meta = dict(table.schema.metadata or {})
+    meta[STAMP_KEY] = json.dumps(source_stamp(csv_path)).encode()
+    table = table.replace_schema_metadata(meta)
+    tmp = path.with_name(path.name + ".tmp")
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    return path
+
+
+def fresh_ipc(csv_path):
+    """The IPC sibling of `csv_path` if it was written from the CSV as it is now, else None."""
+    path = ipc_path(csv_path)
+    if not path.exists():
+        return None
+    if not Path(csv_path).exists():
+        return path
+    with pa.memory_map(str(path), "r") as source:
+        meta = pa.ipc.open_file(source).schema.metadata or {}
+    stamp = meta.get(STAMP_KEY)
+    if stamp is None or json.loads(stamp) != source_stamp(csv_path):
+        return None
+    return path
+
+
+def filter_expression(filters):
+    """The conjunction of `filters` as a pyarrow dataset expression."""
+    expr = None
+    for col, op, value in filters:
+        if op == "in":
+            term = ds.field(col).isin(list(value))
+        elif op == "not in":
+            term = ~ds.field(col).isin(list(value)) & ds.field(col).is_valid()
+        else:
+            term = COMPARE[op](ds.field(col), value)
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def filter_mask(sheet, filters):
+    """Boolean row mask of `sheet` for `filters` (same semantics as filter_expression)."""
+    mask = np.ones(len(sheet), dtype=bool)
+    for col, op, value in filters:
+        s = sheet[col]
+        probe = next(iter(value), None) if op in ("in", "not in") else value
+        if s.dtype == object and isinstance(probe, (int, float)) and not isinstance(probe, bool):
+            s = pd.to_numeric(s, errors="coerce")
+        if op == "in":
+            hit = s.isin(list(value))
+        elif op == "not in":
+            hit = ~s.isin(list(value))
+        else:
+            hit = COMPARE[op](s, value)
+        mask &= hit.to_numpy(dtype=bool) & s.notna().to_numpy()
+    return mask
+
+
+def select_arrow(table, wanted, filters):
+    """Project/filter an Arrow table into a frame; filters Arrow cannot type-match run in pandas."""
+    if filters:
+        needed = wanted | {f[0] for f in filters} if wanted is not None else None
+        if needed is not None:
+            table = table.select([c for c in table.column_names if c in needed])
+        try:
+            table = table.filter(filter_expression(filters))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            sheet = table.to_pandas()
+            sheet = sheet[filter_mask(sheet, filters)].reset_index(drop=True)
+            return sheet if wanted is None else sheet[[c for c in sheet.columns if c in wanted]]
+    if wanted is not None:
+        table = table.select([c for c in table.column_names if c in wanted])
+    return table.to_pandas()
+
+
+def apply_dtype(sheet, dtype):
+    """
+    Give a frame read from Arrow the column types read_csv(dtype=dtype) would: str
+    columns hold the text the CSV holds (missing values stay NaN), others are cast.
+    """
+    if dtype is None:
+        return sheet
+    targets = dtype if isinstance(dtype, dict) else dict.fromkeys(sheet.columns, dtype)
+    for col, typ in targets.items():
+        if col not in sheet.columns:
+            continue
+        if typ in (str, "str", object, "object"):
+            if sheet[col].dtype != object:
+                sheet[col] = sheet[col].astype(str).where(sheet[col].notna())
+        else:
+            sheet[col] = sheet[col].astype(typ)
+    return sheet
+
+
+def iter_table(path, columns=None, filters=None, chunksize=CSV_CHUNK_ROWS, **csv_kwargs):
+    """read_table() in frames of at most `chunksize` rows, for scripts that stream a table."""
+    wanted = None if columns is None else set(columns)
+    filters = list(filters or [])
+
+    view = resolve_view(path)
+    if view is not None:
+        needed = None if wanted is None else wanted | {f[0] for f in filters}
+        for chunk in iter_view(view, needed, chunksize, **csv_kwargs):
+            if filters:
+                chunk = chunk[filter_mask(chunk, filters)]
+            yield chunk if wanted is None else chunk[[c for c in chunk.columns if c in wanted]]
+        return
+
+    if Path(path).suffix == ".parquet" or fresh_ipc(path) is not None:
+        sheet = read_table(path, columns=columns, filters=filters, dtype=csv_kwargs.get("dtype"))
+        for lo in range(0, len(sheet), chunksize):
+            yield sheet.iloc[lo:lo + chunksize]
+        return
+
+    if wanted is not None:
+        needed = wanted | {f[0] for f in filters}
+        csv_kwargs["usecols"] = lambda c: c in needed
+    with pd.read_csv(path, chunksize=chunksize, **csv_kwargs) as reader:
+        for chunk in reader:
+            if filters:
+                chunk = chunk[filter_mask(chunk, filters)]
+            yield chunk if wanted is None else chunk[[c for c in chunk.columns if c in wanted]]
+
+
+def read_table(path, columns=None, filters=None, **csv_kwargs):
+    """
+    Load `columns` (all when None; names the file lacks are skipped) of the rows
+    matching `filters` from a Parquet or CSV table, in file order.
+    A CSV is read from its memory-mapped IPC sibling when that is fresh. A `dtype` in
+    `csv_kwargs` is applied to a table read from Arrow (IPC or Parquet) as well, so
+    dtype=str gives the same text either way; the other `csv_kwargs` only apply to
+    the CSV reader.
+    """
+    wanted = None if columns is None else set(columns)
+    filters = list(filters or [])
+
+    if resolve_view(path) is not None:
+        return pd.concat(list(iter_table(path, columns, filters, **csv_kwargs)), ignore_index=True)
+
+    if Path(path).suffix == ".parquet":
+        names = pq.read_schema(path).names
+        sheet = pq.read_table(path, columns=[c for c in names if wanted is None or c in wanted],
+                              filters=filter_expression(filters) if filters else None).to_pandas()
+        return apply_dtype(sheet, csv_kwargs.get("dtype"))
+
+    ipc = fresh_ipc(path)
+    if ipc is not None:
+        sheet = select_arrow(feather.read_table(ipc, memory_map=True), wanted, filters)
+        return apply_dtype(sheet, csv_kwargs.get("dtype"))
+
+    if filters:
+        # stream the CSV so only matching rows are ever held
+        parts = list(iter_table(path, columns, filters, **csv_kwargs))
+        return pd.concat(parts, ignore_index=True)
+    if wanted is not None:
+        csv_kwargs["usecols"] = lambda c: c in wanted
+    return pd.read_csv(path, **csv_kwargs)
@@ -0,0 +1,204 @@
+"""
+afi_mappings.py
+
+The mapping compiler: merges the curated state/district mapping files in docs/
+into one pre-resolved table, written once as
+
+  outputs/state_district_mapping.parquet
+
+so stage 12 loads a few thousand typed rows instead of re-reading and
+re-resolving every mapping file on each run.
+
+Precedence: SOURCES is listed lowest precedence first. For each raw
+(state, district) key and each canonical field, the value from the
+highest-precedence file that has a non-blank one wins; within a file, the
+last row wins. A key is in the table when any file gives it a canonical
+state or district, even a blank-after-strip one.
+
+Columns (all strings):
+  state, district                      raw key, exactly as in the cleaned data
+  canonical_state, canonical_district  resolved values, stripped ('' = keep the original)
+  state_clean, district_clean          the same, title-cased (what stage 12 writes)
+  state_source, district_source        docs/ file the value came from ('' when blank)
+
+The Parquet schema metadata (key b"afi_mappings") records the format
+version, a sha256 of the resolved rows ("hash", changes only when the
+content does) and the precedence, size, mtime and sha256 of every source
+file. load_mappings() recompiles first when a source file was added,
+removed or rewritten since, or the version changed.
+
+Usage:
+    from afi_mappings import load_mappings
+    mapping = load_mappings()            # indexed by (state, district); mapping.attrs["hash"]
+
+    python src/afi_mappings.py compile
+    python src/afi_mappings.py show
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from afi_artifacts import file_sha256
+from afi_normalize import title_case_series
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+DOCS = PROJECT / "docs"
+MAPPING_PATH = PROJECT / "outputs" / "state_district_mapping.parquet"
+META_KEY = b"afi_mappings"
+VERSION = 1
+
+# lowest precedence first
+SOURCES = [
+    "state_district_mapping_enrolment.csv",
+    "state_district_mapping_suggestions_demographic.csv",
+    "state_district_mapping_suggestions_biometric.csv",
+    "state_district_mapping_auto_enrolment.csv",
+    "state_district_mapping_demographic.csv",
+    "state_district_mapping_biometric.csv",
+    "state_district_mapping_suggestions_enrolment.csv",
+    "state_district_bulk_suggestions_enrolment.csv",
+    "state_district_bulk_suggestions_demographic.csv",
+    "state_district_bulk_suggestions_biometric.csv",
+    "suspicious_resolution_candidates.csv",
+]
+
+# the first non-empty of these columns supplies each field of a source row
+SOURCE_COLS = {
+    'state': ['original_state', 'state', 'original_state_name'],
+    'district': ['original_district', 'district'],
+    'canonical_state': ['canonical_state', 'canonical_state_suggestion', 'proposed_canonical_state', 'suggested_state'],
+    'canonical_district': ['canonical_district', 'canonical_district_suggestion', 'proposed_canonical_district', 'suggested_district'],
+}
+
+KEY = ['state', 'district']
+COLUMNS = KEY + ['canonical_state', 'canonical_district', 'state_clean', 'district_clean',
+                 'state_source', 'district_source']
+SCHEMA = pa.schema([(c, pa.string()) for c in COLUMNS])
+STAMP_FIELDS = ("file", "precedence", "size", "mtime_ns")
+
+
+def coalesce(sheet, cols):
+    out = pd.Series('', index=sheet.index)
+    for c in reversed(cols):
+        if c in sheet.columns:
+            out = sheet[c].where(sheet[c] != '', out)
+    return out
+
+
+def source_stamps(docs=DOCS):
+    stamps = []
+    for rank, name in enumerate(SOURCES):
+        path = Path(docs) / name
+        if path.exists():
+            st = path.stat()
+            stamps.append({"file": name, "precedence": rank, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return stamps
+
+
+def read_sources(docs=DOCS):
+    """All source rows, coalesced to SOURCE_COLS plus `source`, in precedence order."""
+    parts = []
+    for name in SOURCES:
+        path = Path(docs) / name
+        if not path.exists():
+            continue
+        try:
+            sheet = pd.read_csv(path, dtype=str).fillna('')
+        except Exception:
+            continue
+        part = pd.DataFrame({k: coalesce(sheet, cols) for k, cols in SOURCE_COLS.items()})
+        part['source'] = name
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=list(SOURCE_COLS) + ['source'], dtype=object)
+    return pd.concat(parts, ignore_index=True)
+
+
+def resolve(rows):
+    """The mapping table (COLUMNS) of coalesced source rows, keys in order of first appearance."""
+    listed = rows[(rows['canonical_state'] != '') | (rows['canonical_district'] != '')]
+    table = listed[KEY].drop_duplicates().reset_index(drop=True)
+    for field in ('state', 'district'):
+        col = f'canonical_{field}'
+        value = rows[col].str.strip()
+        last = rows[KEY].assign(**{col: value, f'{field}_source': rows['source']})[value != '']
+        table = table.merge(last.drop_duplicates(KEY, keep='last'), on=KEY, how='left')
+    table = table.fillna('')
+    table['state_clean'] = title_case_series(table['canonical_state'])
+    table['district_clean'] = title_case_series(table['canonical_district'])
+    return table[COLUMNS]
+
+
+def read_meta(path=MAPPING_PATH):
+    if not Path(path).exists():
+        return None
+    meta = pq.read_schema(path).metadata or {}
+    return json.loads(meta[META_KEY]) if META_KEY in meta else None
+
+
+def compile_mappings(docs=DOCS, path=MAPPING_PATH):
+    """Resolve the source files in `docs` and write the table to `path`; returns its metadata."""
+    stamps = source_stamps(docs)
+    table = resolve(read_sources(docs))
+    for stamp in stamps:
+        stamp["sha256"] = file_sha256(Path(docs) / stamp["file"])
+    meta = {"version": VERSION, "rows": len(table),
+            "hash": hashlib.sha256(table.to_csv(index=False).encode()).hexdigest(),
+            "sources": stamps}
+
+    arrow = pa.Table.from_pandas(table, schema=SCHEMA, preserve_index=False)
+    arrow = arrow.replace_schema_metadata({META_KEY: json.dumps(meta).encode()})
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    pq.write_table(arrow, tmp)
+    os.replace(tmp, path)
+    return meta
+
+
+def is_fresh(meta, docs=DOCS):
+    if meta is None or meta.get("version") != VERSION:
+        return False
+    recorded = [{k: s[k] for k in STAMP_FIELDS} for s in meta["sources"]]
+    return recorded == source_stamps(docs)
+
+
+def load_mappings(docs=DOCS, path=MAPPING_PATH):
+    """The compiled mapping, indexed by (state, district); recompiled first if stale. attrs hold its metadata."""
+    meta = read_meta(path)
+    if not is_fresh(meta, docs):
+        meta = compile_mappings(docs, path)
+    mapping = pq.read_table(path).to_pandas().set_index(KEY)
+    mapping.attrs.update(meta)
+    return mapping
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compile or inspect the state/district mapping table")
+    ap.add_argument("command", choices=["compile", "show"])
+    args = ap.parse_args(argv)
+
+    if args.command == "compile":
+        meta = compile_mappings()
+        print(f"[INFO] wrote {MAPPING_PATH} ({meta['rows']:,} keys, hash {meta['hash'][:12]})")
+        return
+    meta = read_meta()
+    if meta is None:
+        print(f"[INFO] no compiled mapping at {MAPPING_PATH}")
+        return
+    state = "fresh" if is_fresh(meta) else "stale (recompiled on next load)"
+    print(f"{MAPPING_PATH}: version {meta['version']}, {meta['rows']:,} keys, hash {meta['hash']}, {state}")
+    for s in meta["sources"]:
+        print(f"  {s['precedence']:>2}  {s['file']:<55} {s['size']:>10,} B  {s['sha256'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
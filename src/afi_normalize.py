@@ -0,0 +1,124 @@
+"""
+afi_normalize.py
+
+The name normalizers used by the cleaning scripts, in one place.
+
+Each normalizer exists twice:
+  scalar   name(s)          memoized per raw string (an LRU of CACHE_SIZE
+                            entries), for loops over distinct values
+  column   name_series(v)   the same function over a pandas Series: the
+                            column is factorized, the normalizer runs once
+                            per distinct value and the result is taken
+                            back by code, so cost is one hash pass over
+                            the rows plus the distinct values
+
+Missing values (None / NaN) normalize to ''. The regexes are compiled once.
+
+  squash          strip, collapse whitespace runs to one space      (22, 23)
+  squash_amp      squash, then '&' -> 'and'                          (19, 20)
+  clean_token     punctuation runs -> space, squash, '&' -> 'and'    (05)
+  clean_name      as clean_token with '*' as punctuation, no '&'     (08, 09)
+  normalize_text  punctuation runs -> space, squash, lower-case      (03)
+  title_case      capitalize each whitespace-separated word          (03, 05, 12)
+
+Usage:
+    from afi_normalize import squash, title_case_series
+    chunk['state_clean'] = title_case_series(chunk['state'])
+    st = squash(raw)
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_SIZE = 1 << 16
+
+PUNCT = re.compile(r'[\.\,\/\\\(\)\-]+')
+PUNCT_STAR = re.compile(r'[\*\.\,\/\\\(\)\-]+')
+SPACES = re.compile(r'\s+')
+
+
+def missing(s):
+    return s is None or (isinstance(s, float) and s != s)
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def squash(s):
+    if missing(s):
+        return ''
+    return ' '.join(str(s).strip().split())
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def squash_amp(s):
+    return squash(s).replace('&', 'and')
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def clean_token(s):
+    if missing(s):
+        return ''
+    t = PUNCT.sub(' ', str(s).strip())
+    t = SPACES.sub(' ', t).strip()
+    return t.replace('&', 'and')
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def clean_name(s):
+    if missing(s):
+        return ''
+    t = PUNCT_STAR.sub(' ', str(s).strip())
+    return SPACES.sub(' ', t).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def normalize_text(s):
+    if missing(s):
+        return ''
+    t = PUNCT.sub(' ', str(s).strip())
+    return SPACES.sub(' ', t).strip().lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def title_case(s):
+    if missing(s):
+        return ''
+    return ' '.join(w.capitalize() for w in str(s).split())
+
+
+def over_distinct(values, func):
+    """func applied to each distinct value of the Series `values`, broadcast back to its rows."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    # code -1 (missing) picks the trailing func(None)
+    mapped = np.array([func(u) for u in uniques] + [func(None)], dtype=object)
+    return pd.Series(mapped[codes], index=values.index, name=values.name)
+
+
+def squash_series(values):
+    return over_distinct(values, squash)
+
+
+def squash_amp_series(values):
+    return over_distinct(values, squash_amp)
+
+
+def clean_token_series(values):
+    return over_distinct(values, clean_token)
+
+
+def clean_name_series(values):
+    return over_distinct(values, clean_name)
+
+
+def normalize_text_series(values):
+    return over_distinct(values, normalize_text)
+
+
+def title_case_series(values):
+    return over_distinct(values, title_case)
@@ -0,0 +1,211 @@
+"""
+afi_overlay.py
+
+Delta overlays for the manual mapping-fix stages (14_apply_manual_mapping_fixes.py,
+17_apply_manual_revert.py), so a fix of a few dozen (state, district) pairs
+no longer rewrites every row of every dataset.
+
+  outputs/overlays/<name>.parquet    one row per raw (state, district) pair:
+                                     the state_clean / district_clean to set
+                                     (null = leave that field as it is)
+  outputs/<table>.view.json          a derived table that is not written out:
+                                     {"base": <csv>, "overlays": [<parquet>, ...]}
+
+A fix stage writes its overlay and one view per dataset; the base CSV is never
+touched. A view over a table that is itself a view is flattened, so every view
+names one real CSV plus the overlays to apply to it in order:
+
+  cleaned_<ds>_final_fixed     = cleaned_<ds>_final_nodrop + manual_mapping_fixes
+  cleaned_<ds>_final_reverted  = cleaned_<ds>_final_nodrop + manual_mapping_fixes
+                                                           + manual_revert
+
+afi_io.read_table() / iter_table() compose views at read time, chunk by chunk,
+and table_exists() treats a view as present. Scripts that need the table as a
+real file (or a final hand-off) materialize it once:
+
+    python src/afi_overlay.py materialize outputs/cleaned_enrolment_final_reverted.csv
+
+which writes the same CSV the full-rewrite stages used to and drops the view.
+
+Usage:
+    from afi_overlay import write_overlay, write_view
+    overlay = write_overlay(fixes, "manual_mapping_fixes", source=MAPPING_CSV)
+    write_view(OUT / "cleaned_enrolment_final_fixed.csv", OUT / "cleaned_enrolment_final_nodrop.csv", overlay)
+
+    python src/afi_overlay.py show outputs/cleaned_enrolment_final_reverted.csv
+    python src/afi_overlay.py materialize outputs/cleaned_*_final_reverted.csv
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from afi_pipeline import ChunkWriter, prefetch
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+OVERLAY_DIR = PROJECT / "outputs" / "overlays"
+VIEW_SUFFIX = ".view.json"
+META_KEY = b"afi_overlay"
+
+KEY = ['state', 'district']
+FIELDS = ['state_clean', 'district_clean']
+SCHEMA = pa.schema([(c, pa.string()) for c in KEY + FIELDS])
+CHUNK_ROWS = 200_000
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def view_path(path):
+    return Path(path).with_suffix(VIEW_SUFFIX)
+
+
+def write_overlay(pairs, name, source=None, out_dir=OVERLAY_DIR):
+    """
+    Write `pairs` (columns state, district, state_clean, district_clean; None in a
+    field leaves it unchanged) as overlay `name`; the last row of a repeated pair wins.
+    """
+    pairs = pairs[KEY + FIELDS].drop_duplicates(KEY, keep='last').reset_index(drop=True)
+    pairs = pairs.astype(object).where(pairs.notna(), None)
+    meta = {"name": name, "pairs": len(pairs), "source": str(source) if source else None,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    table = pa.Table.from_pandas(pairs, schema=SCHEMA, preserve_index=False)
+    table = table.replace_schema_metadata({META_KEY: json.dumps(meta).encode()})
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{name}.parquet"
+    tmp = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def read_overlay(path):
+    return pq.read_table(path).to_pandas().set_index(KEY)
+
+
+def resolve_view(path):
+    """{"base": Path, "overlays": [Path, ...]} for a table stored as a view, else None."""
+    vp = view_path(path)
+    if not vp.exists():
+        return None
+    spec = json.loads(vp.read_text())
+    return {"base": vp.parent / spec["base"],
+            "overlays": [vp.parent / o for o in spec["overlays"]],
+            "script": spec.get("script"), "created": spec.get("created")}
+
+
+def table_exists(path):
+    return Path(path).exists() or view_path(path).exists()
+
+
+def write_view(out_path, in_path, overlay, script=None):
+    """Record `out_path` as `in_path` plus `overlay`, replacing any full copy of `out_path`."""
+    out_path, in_path = Path(out_path), Path(in_path)
+    upstream = resolve_view(in_path)
+    base = upstream["base"] if upstream else in_path
+    overlays = (upstream["overlays"] if upstream else []) + [Path(overlay)]
+    vp = view_path(out_path)
+    spec = {"base": os.path.relpath(base, vp.parent),
+            "overlays": [os.path.relpath(o, vp.parent) for o in overlays],
+            "script": script, "created": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    tmp = vp.with_name(vp.name + ".tmp")
+    tmp.write_text(json.dumps(spec, indent=2))
+    os.replace(tmp, vp)
+    # a full copy left by an earlier run would shadow the view for plain readers
+    for stale in (out_path, out_path.with_suffix(".arrow")):
+        if stale.exists():
+            os.unlink(stale)
+    return vp
+
+
+def apply_overlays(chunk, overlays, fields=FIELDS):
+    """Set `fields` (of state_clean / district_clean) on the rows of `chunk` whose raw (state, district) an overlay lists."""
+    if not overlays:
+        return chunk
+    keys = pd.MultiIndex.from_arrays([chunk[c].fillna('') if c in chunk.columns else pd.Series('', index=chunk.index)
+                                      for c in KEY])
+    for overlay in overlays:
+        if not len(overlay):
+            continue
+        pos = overlay.index.get_indexer(keys)
+        hit = pos >= 0
+        if not hit.any():
+            continue
+        for field in fields:
+            values = overlay[field].to_numpy(dtype=object)[pos[hit]]
+            setting = pd.notna(values)
+            if not setting.any():
+                continue
+            if field not in chunk.columns:
+                chunk[field] = pd.Series(np.nan, index=chunk.index, dtype=object)
+            elif chunk[field].dtype != object:
+                chunk[field] = chunk[field].astype(object)
+            rows = np.flatnonzero(hit)[setting]
+            chunk.iloc[rows, chunk.columns.get_loc(field)] = values[setting]
+    return chunk
+
+
+def iter_view(view, columns=None, chunksize=CHUNK_ROWS, **csv_kwargs):
+    """The base of `view` in chunks with its overlays applied; projected to `columns` afterwards."""
+    overlays = [read_overlay(o) for o in view["overlays"]]
+    fields = FIELDS
+    if columns is not None:
+        needed = set(columns) | set(KEY)
+        csv_kwargs["usecols"] = lambda c: c in needed
+        fields = [f for f in FIELDS if f in columns]
+    with pd.read_csv(view["base"], chunksize=chunksize, **csv_kwargs) as reader:
+        for chunk in reader:
+            chunk = apply_overlays(chunk, overlays, fields)
+            if columns is not None:
+                chunk = chunk[[c for c in chunk.columns if c in columns]]
+            yield chunk
+
+
+def materialize(path, chunksize=CHUNK_ROWS):
+    """Write view `path` out as a real CSV (the output the full-rewrite stages produced) and drop the view."""
+    path = Path(path)
+    view = resolve_view(path)
+    if view is None:
+        return None
+    tmp = path.with_name(path.name + ".tmp")
+    with ChunkWriter(tmp) as out:
+        for chunk in prefetch(iter_view(view, chunksize=chunksize, dtype=str, low_memory=False)):
+            out.write(chunk.fillna(''))
+    os.replace(tmp, path)
+    view_path(path).unlink()
+    return out.rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Inspect or materialize overlay views")
+    ap.add_argument("command", choices=["show", "materialize"])
+    ap.add_argument("paths", nargs="+")
+    args = ap.parse_args(argv)
+
+    for p in args.paths:
+        view = resolve_view(p)
+        if view is None:
+            print(f"[INFO] {p}: not a view")
+            continue
+        if args.command == "show":
+            print(f"{p}  (view by {view['script']}, {view['created']})")
+            print(f"  base      {view['base']}")
+            for o in view["overlays"]:
+                print(f"  overlay   {o}  ({len(read_overlay(o))} pairs)")
+        else:
+            rows = materialize(p)
+            log(f"materialized {p} ({rows:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+afi_pipeline.py
+
+Pipelined chunk streaming for the chunked cleaning stages (04, 06, 10, 11,
+12, 20, 23, apply_100000_to_unknown, fix_daman_and_drop_unknowns,
+sanity_checks, and afi_overlay.materialize for 14 / 17).
+
+A stage used to parse a chunk, transform it and block on to_csv(mode='a')
+before the next chunk was read. With this module the three steps overlap:
+
+  reader thread   prefetch(chunks) parses the next chunks into a queue
+  caller          transforms chunk i, as before
+  writer thread   ChunkWriter serializes the chunks handed to it, in order
+
+Both queues hold at most DEPTH chunks, so a slow writer holds back the
+transform and a slow transform holds back the reader; at most about
+2 * DEPTH + 1 chunks are in memory. The output file is opened once and gets
+the same bytes the per-chunk to_csv(mode='a') calls produced: a header
+before the first chunk written, none after. Nothing is written (the file is
+not even created) when no chunk is.
+
+An exception in the reader thread is raised from the caller's loop; one in
+the writer is raised from the next write() or from close(). A chunk must not
+be modified after it is handed to write().
+
+How much overlap there is depends on the pandas parser and to_csv releasing
+the GIL (the C tokenizer does for part of each chunk) and on the disk: on a
+single core it only hides disk waits.
+
+map_chunks(transform, chunks, shared) runs the transform itself in a process
+pool. transform(chunk, shared) must be a module-level function; it returns the
+transformed chunk together with whatever per-chunk counters the stage keeps,
+and the caller merges those as it did before. The results come back in input
+order, at most `workers * AHEAD` chunks in flight. The workers are forked
+by the map_chunks() call itself, so call it before starting any thread (open
+the ChunkWriter after it) and hand it an unstarted prefetch(). `shared` (the
+mapping dictionaries) reaches the workers through the fork, once per worker,
+and only the chunks and their results are pickled. setup(shared), when
+given, runs once in each worker first, to reopen what must not cross a fork
+(a SQLite connection).
+
+The pool is opt-in: AFI_CHUNK_WORKERS workers when that is set above 1,
+otherwise (and where fork is not available) the transform runs in the
+calling process. Sending a 500k-row chunk to a worker and its result back
+costs a few seconds of pickling in the parent, several times what a
+vectorized transform (12, apply_100000_to_unknown) takes; only the per-row
+transforms (04, 06, 10, 11, 23) can gain, and only with spare cores.
+
+fan_out(func, DATASETS, *args) is the same idea one level up, for the
+per-dataset loops: func(ds, *args) runs for every dataset at once, each in
+its own forked process (AFI_DATASET_WORKERS of them, else one per dataset up
+to the CPU count), and the return values come back in dataset order for the
+caller to merge into its summary. Everything func prints is prefixed with
+"[<dataset>] ", a whole line at a time, so the interleaved logs stay
+readable. Nothing is pickled but `args` and the return values. func must leave shared state
+(the artifact store index, module-level accumulators) to the caller: it
+returns what the caller used to collect. With one worker the datasets run
+one after another in the calling process, prefixed the same way.
+
+Usage:
+    from afi_pipeline import DATASETS, ChunkWriter, fan_out, map_chunks, prefetch
+    with ChunkWriter(out_fp) as out:
+        for chunk in prefetch(pd.read_csv(in_fp, chunksize=500000, dtype=str)):
+            chunk['state_clean'] = ...
+            out.write(chunk)
+
+    def apply_chunk(chunk, mapping):          # module level
+        ...
+        return chunk, n_applied
+
+    results = map_chunks(apply_chunk, prefetch(reader), shared=mapping)   # forks here
+    with ChunkWriter(out_fp) as out:
+        for chunk, n_applied in results:
+            applied += n_applied
+            out.write(chunk)
+
+    results = fan_out(apply_to_dataset, DATASETS, mapping)   # one return value per dataset
+"""
+
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+
+DEPTH = 2            # chunks each queue holds ahead
+POLL_SECONDS = 0.1   # how often a blocked reader checks whether the caller stopped
+AHEAD = 2            # chunks in flight per worker in map_chunks
+WORKERS_ENV = "AFI_CHUNK_WORKERS"
+DATASET_WORKERS_ENV = "AFI_DATASET_WORKERS"
+
+DATASETS = ['enrolment', 'demographic', 'biometric']
+
+_shared = None       # map_chunks' `shared`, in a worker process
+
+
+def _put(q, item, stop):
+    """Put `item` on the bounded queue `q` unless `stop` is set first; False when stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def prefetch(chunks, depth=DEPTH):
+    """Iterate `chunks` while a reader thread produces the next `depth` items ahead of the caller."""
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in chunks:
+                if not _put(q, (True, item), stop):
+                    return
+            _put(q, (True, StopIteration), stop)
+        except BaseException as exc:
+            _put(q, (False, exc), stop)
+
+    reader = threading.Thread(target=produce, name="afi-prefetch", daemon=True)
+    reader.start()
+    try:
+        while True:
+            ok, item = q.get()
+            if not ok:
+                raise item
+            if item is StopIteration:
+                return
+            yield item
+    finally:
+        # the caller stopped early or failed: let the reader finish its current chunk and exit
+        stop.set()
+        reader.join()
+
+
+class ChunkWriter:
+    """Append frames to one CSV from a writer thread, in the order they are written."""
+
+    def __init__(self, path, depth=DEPTH, **csv_kwargs):
+        self.path = Path(path)
+        self.encoding = csv_kwargs.pop("encoding", "utf-8")
+        csv_kwargs.pop("mode", None)
+        csv_kwargs.pop("header", None)
+        csv_kwargs.setdefault("index", False)
+        self.csv_kwargs = csv_kwargs
+        self.rows = 0
+        self.chunks = 0
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="afi-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        handle = None
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    return
+                if self._error is not None:
+                    continue   # keep draining so write() never blocks on a dead writer
+                try:
+                    if handle is None:
+                        handle = open(self.path, "w", encoding=self.encoding, newline="")
+                    chunk.to_csv(handle, header=self.chunks == 0, **self.csv_kwargs)
+                    self.chunks += 1
+                except BaseException as exc:
+                    self._error = exc
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def write(self, chunk):
+        if self._error is not None:
+            raise self._error
+        self.rows += len(chunk)
+        self._queue.put(chunk)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except Exception:
+            pass   # the exception already propagating is the one to report
+
+
+def chunk_workers(workers=None):
+    """Worker processes map_chunks() will use: `workers`, else AFI_CHUNK_WORKERS, else 1; 1 without fork."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return 1
+    return max(1, workers or int(os.environ.get(WORKERS_ENV) or 0) or 1)
+
+
+def _init_worker(setup, shared):
+    global _shared
+    _shared = setup(shared) if setup is not None else shared
+
+
+def _run_chunk(transform, chunk):
+    return transform(chunk, _shared)
+
+
+def map_chunks(transform, chunks, shared=None, workers=None, setup=None):
+    """
+    An iterator of transform(chunk, shared) over `chunks`, in input order, run in a
+    forked process pool that is started by this call.
+    """
+    workers = chunk_workers(workers)
+    if workers == 1:
+        return (transform(chunk, shared) for chunk in chunks)
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                               initializer=_init_worker, initargs=(setup, shared))
+    # fork every worker now, before the caller's writer and reader threads start
+    pool.submit(int).result()
+    return _ordered_results(pool, transform, chunks, workers)
+
+
+def _ordered_results(pool, transform, chunks, workers):
+    with pool:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(_run_chunk, transform, chunk))
+                if len(pending) >= workers * AHEAD:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class PrefixedStream:
+    """A text stream that writes each complete line to `stream` as prefix + line, in one write."""
+
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self.pending = ""
+
+    def write(self, text):
+        lines = (self.pending + text).split("\n")
+        self.pending = lines.pop()
+        if lines:
+            self.stream.write("".join(f"{self.prefix}{line}\n" for line in lines))
+            self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.pending:
+            self.stream.write(f"{self.prefix}{self.pending}\n")
+            self.pending = ""
+        self.stream.flush()
+
+
+def dataset_workers(n, workers=None):
+    """Processes fan_out() will use for `n` datasets: `workers`, else AFI_DATASET_WORKERS, else min(n, CPU count)."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return 1
+    workers = workers or int(os.environ.get(DATASET_WORKERS_ENV) or 0) or os.cpu_count() or 1
+    return max(1, min(n, workers))
+
+
+def _run_dataset(func, ds, args):
+    out = PrefixedStream(sys.stdout, f"[{ds}] ")
+    try:
+        with redirect_stdout(out):
+            return func(ds, *args)
+    finally:
+        out.close()
+
+
+def fan_out(func, datasets, *args, workers=None, setup=None):
+    """func(ds, *args) for each of `datasets`, each in its own forked process; the results in dataset order."""
+    datasets = list(datasets)
+    workers = dataset_workers(len(datasets), workers)
+    if workers == 1:
+        return [_run_dataset(func, ds, args) for ds in datasets]
+
+    sys.stdout.flush()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=setup) as pool:
+        futures = [pool.submit(_run_dataset, func, ds, args) for ds in datasets]
+        return [f.result() for f in futures]
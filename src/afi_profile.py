@@ -0,0 +1,220 @@
+"""
+afi_profile.py
+
+Lightweight per-stage instrumentation for the src/ scripts.
+
+Records, for each named stage of a script:
+  - wall time (perf_counter) and CPU time
+  - rows processed (explicit counter) and rows/s
+  - process peak RSS at the end of the stage (resource.getrusage)
+  - optional tracemalloc peak of Python allocations (AFI_TRACEMALLOC=1)
+
+and writes a machine-readable outputs/profile_<run>.json plus a summary table
+on stdout. Several scripts can share one run file by exporting the same
+AFI_RUN_ID; their stages are appended under their script name.
+
+Opt-in deep profiling of a single stage:
+  AFI_PROFILE_STAGE=<stage>   dump cProfile stats to outputs/profile_<run>_<script>_<stage>.prof
+                              (flamegraph-ready: flameprof / snakeviz / gprof2dot)
+  AFI_PROFILER=pyinstrument   use pyinstrument instead (writes a speedscope .json), if installed
+
+Usage:
+    from afi_profile import Profiler
+    prof = Profiler("compute_afi_advanced_fixed")
+
+    with prof.stage("load") as st:
+        sheet = pd.read_csv(...)
+        st.rows(len(sheet))
+
+    @prof.timed("merge")
+    def merge_all(...): ...
+
+    prof.begin("features")          # flat, top-level scripts
+    ...
+    prof.end(rows=len(merged))
+
+    prof.report()
+"""
+
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+
+
+OUT = Path("outputs")
+
+RUN_ID_ENV = "AFI_RUN_ID"
+STAGE_ENV = "AFI_PROFILE_STAGE"
+PROFILER_ENV = "AFI_PROFILER"
+TRACEMALLOC_ENV = "AFI_TRACEMALLOC"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def default_run_id():
+    return os.environ.get(RUN_ID_ENV) or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+class StageRecord:
+    def __init__(self, name):
+        self.name = name
+        self.n_rows = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_rss_mb = 0.0
+        self.py_peak_mb = None
+
+    def rows(self, n):
+        """Add `n` to this stage's rows-processed counter."""
+        self.n_rows += int(n)
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "rows": self.n_rows,
+            "rows_per_s": round(self.n_rows / self.wall_s, 2) if self.wall_s > 0 and self.n_rows else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 2),
+            "py_peak_mb": None if self.py_peak_mb is None else round(self.py_peak_mb, 2),
+        }
+
+
+class Profiler:
+    """Collects StageRecords for one script and writes them to outputs/profile_<run>.json."""
+
+    def __init__(self, script, run_id=None, out_dir=OUT):
+        self.script = script
+        self.run_id = run_id or default_run_id()
+        self.out_dir = Path(out_dir)
+        self.stages = []
+        self.started = time.perf_counter()
+        self.deep_stage = os.environ.get(STAGE_ENV)
+        self.trace = os.environ.get(TRACEMALLOC_ENV) == "1"
+        self._open = None
+
+    def begin(self, name):
+        """Open stage `name` (for flat scripts; prefer `with prof.stage(...)` in functions)."""
+        rec = StageRecord(name)
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        rec._deep = self._start_deep(name)
+        rec._wall0 = time.perf_counter()
+        rec._cpu0 = time.process_time()
+        self._open = rec
+        return rec
+
+    def end(self, rows=0):
+        """Close the stage opened by begin(), adding `rows` to its counter."""
+        rec = self._open
+        self._open = None
+        rec.rows(rows)
+        rec.wall_s = time.perf_counter() - rec._wall0
+        rec.cpu_s = time.process_time() - rec._cpu0
+        rec.peak_rss_mb = peak_rss_mb()
+        if self.trace:
+            rec.py_peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        self._stop_deep(rec.name, rec._deep)
+        self.stages.append(rec)
+        return rec
+
+    @contextmanager
+    def stage(self, name):
+        rec = self.begin(name)
+        try:
+            yield rec
+        finally:
+            self._open = rec
+            self.end()
+
+    def timed(self, name=None):
+        """Decorator form of stage(); counts len() of the return value as rows when it has one."""
+        def wrap(func):
+            @wraps(func)
+            def inner(*args, **kwargs):
+                with self.stage(name or func.__name__) as rec:
+                    result = func(*args, **kwargs)
+                    if hasattr(result, "__len__"):
+                        rec.rows(len(result))
+                    return result
+            return inner
+        return wrap
+
+    def _start_deep(self, name):
+        if self.deep_stage != name:
+            return None
+        if os.environ.get(PROFILER_ENV) == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as PyInstrument
+            except ImportError:
+                print("[WARN] pyinstrument not installed; falling back to cProfile")
+            else:
+                prof = PyInstrument()
+                prof.start()
+                return prof
+        prof = cProfile.Profile()
+        prof.enable()
+        return prof
+
+    def _stop_deep(self, name, prof):
+        if prof is None:
+            return
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.out_dir / f"profile_{self.run_id}_{self.script}_{name}"
+        if isinstance(prof, cProfile.Profile):
+            prof.disable()
+            prof.dump_stats(f"{stem}.prof")
+            print(f"[INFO] cProfile stats for stage '{name}' -> {stem}.prof")
+        else:
+            prof.stop()
+            from pyinstrument.renderers import SpeedscopeRenderer
+            Path(f"{stem}.speedscope.json").write_text(prof.output(renderer=SpeedscopeRenderer()))
+            print(f"[INFO] pyinstrument profile for stage '{name}' -> {stem}.speedscope.json")
+
+    def as_dict(self):
+        return {
+            "script": self.script,
+            "total_wall_s": round(time.perf_counter() - self.started, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 2),
+            "stages": [rec.as_dict() for rec in self.stages],
+        }
+
+    def write(self):
+        """Merge this script's record into outputs/profile_<run>.json."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"profile_{self.run_id}.json"
+        doc = json.loads(path.read_text()) if path.exists() else {"run_id": self.run_id, "scripts": {}}
+        doc["scripts"][self.script] = self.as_dict()
+        path.write_text(json.dumps(doc, indent=2))
+        return path
+
+    def summary(self):
+        lines = [f"{'stage':<28}{'wall_s':>10}{'cpu_s':>10}{'rows':>12}{'rows/s':>14}{'peak_rss_mb':>13}"]
+        for rec in self.stages:
+            d = rec.as_dict()
+            rps = f"{d['rows_per_s']:,.0f}" if d["rows_per_s"] else "-"
+            lines.append(f"{rec.name:<28}{d['wall_s']:>10.3f}{d['cpu_s']:>10.3f}{rec.n_rows:>12,}{rps:>14}"
+                         f"{d['peak_rss_mb']:>13.1f}")
+        return "\n".join(lines)
+
+    def report(self):
+        """Write the JSON and print the summary table."""
+        path = self.write()
+        print(f"[INFO] Profile ({self.script}, run {self.run_id}) -> {path}")
+        print(self.summary())
+        return path
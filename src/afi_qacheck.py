@@ -13,6 +13,8 @@ import sys, json
 from pathlib import Path
 import pandas as pd
 
+from afi_io import read_table
+
 def main(argv):
     if len(argv) < 2:
         print("Usage: python afi_qacheck.py /path/to/merged_for_afi.csv")
@@ -22,7 +24,7 @@ def main(argv):
         print("File not found:", p)
         return 2
     outdir = p.parent
-    sheet = pd.read_csv(p, dtype=str, low_memory=False)
+    sheet = read_table(p, dtype=str, low_memory=False)
     sheet.columns = [c.strip() for c in sheet.columns]
 
 
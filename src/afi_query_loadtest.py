@@ -0,0 +1,129 @@
+"""
+afi_query_loadtest.py
+
+Concurrent load test for afi_query_service.py.
+
+Fires a mixed workload (rankings, time series, percentiles, typology) at a
+running service from N client threads and reports throughput and latency
+percentiles per endpoint. Query parameters are drawn from /periods and /states,
+so the test works against any dataset.
+
+Usage:
+    python src/afi_query_service.py &
+    python src/afi_query_loadtest.py [--url http://127.0.0.1:8765] [--clients 16] [--requests 2000]
+
+Pass --start-server to launch an in-process service on a free port instead.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+
+def fetch(base_url, path, params=None):
+    url = f"{base_url}{path}"
+    if params:
+        url += "?" + urlencode(params)
+    req = Request(url, headers={"Accept-Encoding": "gzip"})
+    start = time.perf_counter()
+    with urlopen(req, timeout=30) as resp:
+        resp.read()
+        status = resp.status
+    return status, (time.perf_counter() - start) * 1000.0
+
+
+def get_json(base_url, path):
+    with urlopen(f"{base_url}{path}", timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def build_workload(base_url, n_requests, seed=0):
+    rng = random.Random(seed)
+    periods = get_json(base_url, "/periods")["periods"]
+    states = get_json(base_url, "/states")["states"]
+    workload = []
+    for _ in range(n_requests):
+        kind = rng.choice(["rankings_state", "rankings_district", "timeseries", "percentiles", "typology"])
+        period = rng.choice(periods)
+        state = rng.choice(states)
+        if kind == "rankings_state":
+            workload.append(("/rankings", {"level": "state", "period": period}))
+        elif kind == "rankings_district":
+            workload.append(("/rankings", {"level": "district", "period": period, "state": state}))
+        elif kind == "timeseries":
+            workload.append(("/timeseries", {"level": "state", "state": state}))
+        elif kind == "percentiles":
+            workload.append(("/percentiles", {"period": period, "state": state}))
+        else:
+            workload.append(("/typology", {"state": state}))
+    return workload
+
+
+def run(base_url, clients, n_requests):
+    workload = build_workload(base_url, n_requests)
+    latencies = defaultdict(list)
+    errors = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [(path, pool.submit(fetch, base_url, path, params)) for path, params in workload]
+        for path, fut in futures:
+            try:
+                status, ms = fut.result()
+            except Exception:
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+            latencies[path].append(ms)
+            latencies["ALL"].append(ms)
+    elapsed = time.perf_counter() - start
+
+    print(f"requests={n_requests} clients={clients} errors={errors} "
+          f"elapsed={elapsed:.2f}s throughput={n_requests / elapsed:,.0f} req/s")
+    print(f"{'endpoint':<14}{'n':>7}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'max_ms':>10}")
+    report = {}
+    for path in sorted(latencies):
+        arr = np.asarray(latencies[path])
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        report[path] = {"n": int(len(arr)), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": float(arr.max())}
+        print(f"{path:<14}{len(arr):>7}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{arr.max():>10.2f}")
+    return report, errors
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load-test a local AFI query service")
+    ap.add_argument("--url", default="http://127.0.0.1:8765")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--start-server", action="store_true", help="load outputs/ and serve in-process on a free port")
+    args = ap.parse_args(argv)
+
+    base_url = args.url.rstrip("/")
+    server = None
+    if args.start_server:
+        from afi_query_service import AfiStore, serve
+        server = serve(AfiStore.load(), port=0)
+        Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        _, errors = run(base_url, args.clients, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+afi_query_service.py
+
+Small local HTTP query service over the AFI outputs, for the dashboard.
+
+Loads (once, at startup)
+  outputs/afi_district_month.csv   (from compute_afi_advanced_fixed.py)
+  outputs/afi_with_typologies.csv  (from compute_afi_typologies.py, optional)
+into an in-memory columnar store: one numpy array per column, with
+period / state / district encoded as integer codes, and row-position indexes
+keyed by (period), (state), (period, state) and (state, district).
+District-month and state-month rollups are materialised at load time so that
+rankings and time series never touch the row-level table.
+
+Endpoints (GET, JSON):
+  /health
+  /periods
+  /states
+  /rankings?level=state|district&period=YYYY-MM-DD[&state=..][&metric=afi_score][&order=desc][&limit=20]
+  /timeseries?level=national|state|district[&state=..][&district=..][&metric=afi_score]
+               (level=state needs state, level=district needs state and district)
+  /percentiles?[period=..][&state=..][&metric=afi_score][&q=0.5,0.9,0.99]
+  /typology?[state=..]
+
+Responses are cached (LRU on the normalised query) and gzip-encoded when the
+client sends Accept-Encoding: gzip.
+
+Usage:
+    python src/afi_query_service.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from afi_io import read_table
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+OUT = PROJECT / "outputs"
+AFI_FILE = OUT / "afi_district_month.csv"
+TYPOLOGY_FILE = OUT / "afi_with_typologies.csv"
+
+KEY_COLS = ["period", "state_canonical", "district_clean"]
+METRICS = ["afi_score", "afi_with_repeat", "enrol_total", "demo_total", "bio_total"]
+DEFAULT_METRIC = "afi_score"
+DEFAULT_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+CACHE_SIZE = 4096
+GZIP_MIN_BYTES = 512
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+class ColumnarTable:
+    """Numpy column arrays plus row-position indexes over integer-coded keys."""
+
+    def __init__(self, frame, key_cols, index_keys):
+        self.columns = {}
+        self.labels = {}
+        for c in key_cols:
+            codes, uniques = pd.factorize(frame[c].astype(str), sort=True)
+            self.columns[c] = codes.astype(np.int32)
+            self.labels[c] = list(uniques)
+        for c in frame.columns:
+            if c not in key_cols:
+                self.columns[c] = frame[c].to_numpy()
+        self.lookup = {c: {v: i for i, v in enumerate(self.labels[c])} for c in key_cols}
+        self.n_rows = len(frame)
+
+        self.indexes = {}
+        coded = pd.DataFrame({c: self.columns[c] for c in key_cols})
+        for keys in index_keys:
+            self.indexes[tuple(keys)] = coded.groupby(list(keys), sort=False).indices
+
+    def code(self, col, value):
+        return self.lookup[col].get(value)
+
+    def rows(self, **filters):
+        """Row positions matching equality filters on key columns (empty when a value is unknown)."""
+        filters = {k: v for k, v in filters.items() if v is not None}
+        if not filters:
+            return np.arange(self.n_rows)
+        codes = {}
+        for col, value in filters.items():
+            c = self.code(col, value)
+            if c is None:
+                return np.array([], dtype=np.int64)
+            codes[col] = c
+        keys = tuple(k for k in self.lookup if k in codes)
+        index = self.indexes.get(keys)
+        if index is not None:
+            key = codes[keys[0]] if len(keys) == 1 else tuple(codes[k] for k in keys)
+            return index.get(key, np.array([], dtype=np.int64))
+        mask = np.ones(self.n_rows, dtype=bool)
+        for col, c in codes.items():
+            mask &= self.columns[col] == c
+        return np.flatnonzero(mask)
+
+    def label(self, col, positions):
+        uniques = np.asarray(self.labels[col], dtype=object)
+        return uniques[self.columns[col][positions]]
+
+
+class AfiStore:
+    """Row-level AFI table (`detail`) plus district-month and state-month rollups."""
+
+    def __init__(self, afi, typologies=None):
+        for c in KEY_COLS:
+            afi[c] = afi[c].fillna("").astype(str)
+        self.metrics = [m for m in METRICS if m in afi.columns]
+        for m in self.metrics:
+            afi[m] = pd.to_numeric(afi[m], errors="coerce").replace([np.inf, -np.inf], np.nan)
+
+        agg = {m: "mean" if m.startswith("afi") else "sum" for m in self.metrics}
+        grouped = afi.groupby(KEY_COLS)
+        district = grouped.agg(agg)
+        district["rows"] = grouped.size()
+        district = district.reset_index()
+        state = afi.groupby(KEY_COLS[:2], as_index=False).agg(agg)
+        national = afi.groupby(KEY_COLS[:1], as_index=False).agg(agg).sort_values("period")
+
+        self.detail = ColumnarTable(afi[KEY_COLS + self.metrics], KEY_COLS,
+                                    [["period"], ["state_canonical"], ["period", "state_canonical"]])
+        self.district = ColumnarTable(district, KEY_COLS,
+                                      [["period"], ["period", "state_canonical"], ["state_canonical", "district_clean"]])
+        self.state = ColumnarTable(state, KEY_COLS[:2], [["period"], ["state_canonical"]])
+        self.national = national.reset_index(drop=True)
+        self.periods = sorted(afi["period"].unique().tolist())
+        self.states = sorted(afi["state_canonical"].unique().tolist())
+
+        self.typology = None
+        if typologies is not None and {"state_canonical", "cluster_name"} <= set(typologies.columns):
+            self.typology = (
+                typologies.groupby(["state_canonical", "cluster_name"]).size().rename("count").reset_index()
+            )
+
+    @classmethod
+    def load(cls, afi_file=AFI_FILE, typology_file=TYPOLOGY_FILE):
+        start = time.perf_counter()
+        afi = read_table(afi_file, columns=KEY_COLS + METRICS, dtype={c: str for c in KEY_COLS}, low_memory=False)
+        typologies = None
+        if Path(typology_file).exists():
+            typologies = read_table(typology_file, columns=["state_canonical", "cluster_name"],
+                                    dtype=str, low_memory=False)
+        store = cls(afi, typologies)
+        log(f"Loaded {store.detail.n_rows:,} AFI rows, {store.district.n_rows:,} district-months "
+            f"in {time.perf_counter() - start:.1f}s")
+        return store
+
+    def metric(self, name):
+        name = name or DEFAULT_METRIC
+        if name not in self.metrics:
+            raise ValueError(f"unknown metric {name!r}; expected one of {self.metrics}")
+        return name
+
+    def rankings(self, level="state", period=None, state=None, metric=None, order="desc", limit=20):
+        metric = self.metric(metric)
+        if level not in ("state", "district"):
+            raise ValueError("level must be 'state' or 'district'")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be 'asc' or 'desc'")
+        if int(limit) < 1:
+            raise ValueError("limit must be at least 1")
+        if not period and not self.periods:
+            # no rows, so no latest period to default to
+            return {"level": level, "period": None, "metric": metric, "order": order, "items": []}
+        period = period or self.periods[-1]
+        if level == "state":
+            table = self.state
+            pos = table.rows(period=period)
+            cols = ["state_canonical"]
+        else:
+            table = self.district
+            pos = table.rows(period=period, state_canonical=state)
+            cols = ["state_canonical", "district_clean"]
+        values = table.columns[metric][pos].astype(float)
+        keep = ~np.isnan(values)
+        pos, values = pos[keep], values[keep]
+        ranked = np.argsort(-values if order == "desc" else values, kind="stable")[:int(limit)]
+        out = {c: table.label(c, pos[ranked]).tolist() for c in cols}
+        return {
+            "level": level, "period": period, "metric": metric, "order": order,
+            "items": [
+                {**{c: out[c][i] for c in cols}, "rank": i + 1, "value": float(values[r])}
+                for i, r in enumerate(ranked)
+            ],
+        }
+
+    def timeseries(self, level="national", state=None, district=None, metric=None):
+        metric = self.metric(metric)
+        if level == "national":
+            periods = self.national["period"].tolist()
+            values = self.national[metric].astype(float).tolist()
+        else:
+            if level == "state":
+                if not state:
+                    raise ValueError("level=state needs a state")
+                table = self.state
+                pos = table.rows(state_canonical=state)
+            elif level == "district":
+                if not (state and district):
+                    raise ValueError("level=district needs a state and a district")
+                table = self.district
+                pos = table.rows(state_canonical=state, district_clean=district)
+            else:
+                raise ValueError("level must be 'national', 'state' or 'district'")
+            pos = pos[np.argsort(table.columns["period"][pos], kind="stable")]
+            periods = table.label("period", pos).tolist()
+            values = table.columns[metric][pos].astype(float).tolist()
+        return {
+            "level": level, "state": state, "district": district, "metric": metric,
+            "points": [{"period": p, "value": None if np.isnan(v) else v} for p, v in zip(periods, values)],
+        }
+
+    def percentiles(self, period=None, state=None, metric=None, q=None):
+        metric = self.metric(metric)
+        qs = q or DEFAULT_QUANTILES
+        pos = self.detail.rows(period=period, state_canonical=state)
+        values = self.detail.columns[metric][pos].astype(float)
+        values = values[~np.isnan(values)]
+        result = np.quantile(values, qs).tolist() if len(values) else [None] * len(qs)
+        return {
+            "period": period, "state": state, "metric": metric, "n": int(len(values)),
+            "percentiles": {str(k): v for k, v in zip(qs, result)},
+        }
+
+    def typology_mix(self, state=None):
+        if self.typology is None:
+            raise ValueError(f"typology data not loaded ({TYPOLOGY_FILE.name} missing)")
+        sub = self.typology if state is None else self.typology[self.typology["state_canonical"] == state]
+        mix = sub.groupby("cluster_name")["count"].sum().sort_values(ascending=False)
+        total = int(mix.sum())
+        return {
+            "state": state, "total": total,
+            "items": [
+                {"cluster_name": k, "count": int(v), "share": (v / total) if total else 0.0}
+                for k, v in mix.items()
+            ],
+        }
+
+
+class ResponseCache:
+    """Thread-safe LRU of encoded responses keyed by (path, sorted query)."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def first(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def dispatch(store, path, params):
+    if path == "/health":
+        return {"status": "ok", "rows": store.detail.n_rows}
+    if path == "/periods":
+        return {"periods": store.periods}
+    if path == "/states":
+        return {"states": store.states}
+    if path == "/rankings":
+        return store.rankings(
+            level=first(params, "level", "state"), period=first(params, "period"),
+            state=first(params, "state"), metric=first(params, "metric"),
+            order=first(params, "order", "desc"), limit=int(first(params, "limit", 20)),
+        )
+    if path == "/timeseries":
+        return store.timeseries(
+            level=first(params, "level", "national"), state=first(params, "state"),
+            district=first(params, "district"), metric=first(params, "metric"),
+        )
+    if path == "/percentiles":
+        q = first(params, "q")
+        return store.percentiles(
+            period=first(params, "period"), state=first(params, "state"), metric=first(params, "metric"),
+            q=[float(val) for val in q.split(",")] if q else None,
+        )
+    if path == "/typology":
+        return store.typology_mix(state=first(params, "state"))
+    return None
+
+
+def make_handler(store, cache):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            key = (url.path, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+            cached = cache.get(key)
+            if cached is None:
+                try:
+                    payload = dispatch(store, url.path, params)
+                except ValueError as e:
+                    return self.send_json(400, json.dumps({"error": str(e)}).encode())
+                if payload is None:
+                    return self.send_json(404, json.dumps({"error": f"unknown endpoint {url.path}"}).encode())
+                body = json.dumps(payload, separators=(",", ":")).encode()
+                cached = (body, gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_BYTES else None)
+                cache.put(key, cached)
+            body, gz = cached
+            if gz is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+                return self.send_json(200, gz, encoding="gzip")
+            return self.send_json(200, body)
+
+        def send_json(self, status, body, encoding=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(store, host="127.0.0.1", port=8765):
+    server = QueryServer((host, port), make_handler(store, ResponseCache()))
+    log(f"Serving AFI queries on http://{host}:{port}")
+    return server
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve AFI rankings / trends / percentiles / typology mixes as JSON")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--afi-file", default=str(AFI_FILE))
+    ap.add_argument("--typology-file", default=str(TYPOLOGY_FILE))
+    args = ap.parse_args(argv)
+
+    if not Path(args.afi_file).exists():
+        print(f"[ERROR] Missing input file: {args.afi_file}")
+        return 1
+    store = AfiStore.load(args.afi_file, args.typology_file)
+    server = serve(store, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
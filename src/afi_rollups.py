@@ -0,0 +1,184 @@
+"""
+afi_rollups.py
+
+Precomputed rollup cubes for dashboards and visuals.
+
+Written by the AFI stages next to their row-level outputs, so that consumers
+read a few kilobytes instead of re-aggregating the district-month table:
+
+  outputs/rollups/period_state.parquet           (period x state)
+  outputs/rollups/period_state_district.parquet  (period x state x district)
+  outputs/rollups/national_percentiles.parquet   (period, plus an 'ALL' row)
+  outputs/rollups/*_composite.parquet            (the three cubes above for afi_composite_score,
+                                                 from the stage that writes merged_for_afi.csv;
+                                                 *_age_mismatch for age_mismatch_score, see cube_name())
+  outputs/rollups/state_typology.parquet         (state x typology; from compute_afi_typologies.py)
+  outputs/rollups/manifest.json                  (metric, sketch bin edges, row counts)
+
+Every cube row carries sum / count / mean of the metric, a few exact
+percentiles, and a percentile sketch: counts over fixed log-spaced bins shared
+by all rows of a cube (the edges are stored in the manifest). Sketches are
+additive, so any coarser rollup (e.g. state over all periods) can be built by
+summing sketches and reading quantiles off the cumulative counts with
+sketch_quantiles().
+
+Usage (from an AFI stage, then from a consumer):
+    from afi_rollups import write_afi_rollups
+    write_afi_rollups(merged, metric="afi_score")
+
+    from afi_rollups import cube_name, load_cube
+    cube, info = load_cube(cube_name("period_state", "afi_composite_score"))
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from afi_io import read_table
+
+
+ROLLUP_DIR = Path("outputs") / "rollups"
+MANIFEST = "manifest.json"
+
+PERIOD_COL = "period"
+STATE_COL = "state_canonical"
+DISTRICT_COL = "district_clean"
+TYPOLOGY_COL = "cluster_name"
+
+QUANTILES = [0.5, 0.9, 0.99]
+SKETCH_BINS = 64
+EPS = 1e-9
+
+# cube-name suffix per metric; afi_score keeps the bare names
+METRIC_TAGS = {
+    "afi_score": None,
+    "afi_composite_score": "composite",
+    "age_mismatch_score": "age_mismatch",
+}
+
+
+def sketch_edges(values, bins=SKETCH_BINS):
+    """Log-spaced edges over the values > EPS; bin 0 holds everything below the smallest of them."""
+    pos = values[values > EPS]
+    if len(pos) == 0:
+        return np.array([EPS, 1.0])
+    lo, hi = float(pos.min()), float(pos.max())
+    if hi <= lo:
+        hi = lo * 10.0
+    return np.logspace(np.log10(lo), np.log10(hi), bins)
+
+
+def cube_name(name, metric="afi_score"):
+    """File/manifest name of cube `name` for `metric`, e.g. period_state_composite."""
+    tag = METRIC_TAGS.get(metric, metric)
+    return f"{name}_{tag}" if tag else name
+
+
+def sketch_codes(values, edges):
+    return np.searchsorted(edges, values, side="right")
+
+
+def sketch_quantiles(counts, edges, quantiles=QUANTILES):
+    """Approximate quantiles from a sketch (upper edge of the bin holding each quantile)."""
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return [np.nan] * len(quantiles)
+    upper = np.append(edges, edges[-1])
+    cum = np.cumsum(counts) / total
+    return [float(upper[min(np.searchsorted(cum, q), len(upper) - 1)]) for q in quantiles]
+
+
+def build_cube(frame, keys, metric, edges):
+    """sum / count / mean / exact quantiles / sketch of `metric` per `keys`."""
+    values = frame[metric].to_numpy(dtype=float)
+    finite = np.isfinite(values)
+    sub = frame.loc[finite, keys].copy()
+    sub["_v"] = values[finite]
+    sub["_bin"] = sketch_codes(sub["_v"].to_numpy(), edges)
+
+    grouped = sub.groupby(keys, sort=True)
+    cube = grouped["_v"].agg(["sum", "count", "mean"])
+    qs = grouped["_v"].quantile(QUANTILES).unstack()
+    qs.columns = [f"p{int(round(q * 100))}" for q in QUANTILES]
+    cube = cube.join(qs)
+
+    n_bins = len(edges) + 1
+    hist = sub.groupby(keys + ["_bin"], sort=True).size()
+    sketch = hist.unstack("_bin", fill_value=0).reindex(columns=range(n_bins), fill_value=0)
+    cube["sketch"] = [row.astype(np.int64).tolist() for row in sketch.loc[cube.index].to_numpy()]
+    return cube.reset_index()
+
+
+def write_cube(cube, name, out_dir=ROLLUP_DIR):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{name}.parquet"
+    cube.to_parquet(path, index=False)
+    return path
+
+
+def update_manifest(entries, out_dir=ROLLUP_DIR):
+    path = Path(out_dir) / MANIFEST
+    manifest = json.loads(path.read_text()) if path.exists() else {"cubes": {}}
+    for name, info in entries.items():
+        manifest["cubes"][name] = info
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return path
+
+
+def period_labels(periods):
+    """Periods as the CSV outputs spell them (datetime periods as YYYY-MM-DD), so 'ALL' can sit beside them."""
+    if pd.api.types.is_datetime64_any_dtype(periods):
+        return periods.dt.strftime("%Y-%m-%d")
+    return periods.astype(str)
+
+
+def write_afi_rollups(frame, metric, out_dir=ROLLUP_DIR):
+    """Emit the period/state/district/national cubes for `metric` (named by cube_name()) from the row-level frame."""
+    frame = frame[[PERIOD_COL, STATE_COL, DISTRICT_COL, metric]]
+    frame = frame.assign(**{PERIOD_COL: period_labels(frame[PERIOD_COL])})
+    values = frame[metric].to_numpy(dtype=float)
+    edges = sketch_edges(values[np.isfinite(values)])
+
+    national = frame[[PERIOD_COL, metric]].copy()
+    everything = national.assign(**{PERIOD_COL: "ALL"})
+    cubes = {
+        cube_name("period_state", metric): build_cube(frame, [PERIOD_COL, STATE_COL], metric, edges),
+        cube_name("period_state_district", metric): build_cube(frame, [PERIOD_COL, STATE_COL, DISTRICT_COL],
+                                                               metric, edges),
+        cube_name("national_percentiles", metric): build_cube(pd.concat([national, everything], ignore_index=True),
+                                           [PERIOD_COL], metric, edges),
+    }
+
+    entries = {}
+    for name, cube in cubes.items():
+        path = write_cube(cube, name, out_dir)
+        entries[name] = {"file": path.name, "metric": metric, "rows": int(len(cube)),
+                         "sketch_edges": edges.tolist(), "quantiles": QUANTILES}
+        print(f"[INFO] Wrote rollup {path} (rows={len(cube)})")
+    update_manifest(entries, out_dir)
+    return cubes
+
+
+def write_typology_rollup(frame, metric, out_dir=ROLLUP_DIR):
+    """Emit the state x typology cube for `metric` from the typology-labelled frame."""
+    values = frame[metric].to_numpy(dtype=float)
+    edges = sketch_edges(values[np.isfinite(values)])
+    cube = build_cube(frame, [STATE_COL, TYPOLOGY_COL], metric, edges)
+    cube["share_of_state"] = cube["count"] / cube.groupby(STATE_COL)["count"].transform("sum")
+    path = write_cube(cube, "state_typology", out_dir)
+    update_manifest({"state_typology": {"file": path.name, "metric": metric, "rows": int(len(cube)),
+                                        "sketch_edges": edges.tolist(), "quantiles": QUANTILES}}, out_dir)
+    print(f"[INFO] Wrote rollup {path} (rows={len(cube)})")
+    return cube
+
+
+def load_cube(name, out_dir=ROLLUP_DIR, columns=None, filters=None):
+    """Read one cube (optionally projected / filtered, see afi_io.read_table) plus its manifest entry."""
+    out_dir = Path(out_dir)
+    manifest = json.loads((out_dir / MANIFEST).read_text())
+    info = manifest["cubes"][name]
+    return read_table(out_dir / info["file"], columns=columns, filters=filters), info
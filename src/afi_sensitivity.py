@@ -0,0 +1,236 @@
+"""
+afi_sensitivity.py
+
+Weight-sensitivity analysis for the AFI composite.
+
+The composite is a weighted sum of four normalized components (bio, demo,
+volatility, age mismatch). Instead of re-running the pipeline per weight
+choice, this reads the normalized components the AFI stage already wrote,
+averages them per district once (the composite is linear, so the district
+mean of the score is the score of the district-mean components), and scores
+all M weight vectors with a single (N x 4) . (4 x M) product, chunked over M.
+
+For every weight set it reports rank agreement with the published weights:
+Spearman and Kendall correlation of the district rankings, and the overlap of
+the top-N districts. Per district it reports how its rank moves across the
+weight sets.
+
+Sources:
+  advanced_fixed  outputs/afi_district_month.csv  (*_norm columns, W_BIO/W_DEMO/W_VOL/W_MIS)
+  advanced        outputs/merged_for_afi.csv      (n_bio/n_demo/n_vol/n_age, ADV_WEIGHTS)
+
+Both weight vectors are imported from afi_engine, where the AFI stages take them.
+
+Weight sets (the published weights are always set 0):
+  --samples M     M random weight vectors on the simplex around the published ones (Dirichlet)
+  --grid STEP     every positive weight vector on a simplex lattice with spacing STEP (0.05 -> 969 sets)
+  --weights FILE  CSV with columns w_bio, w_demo, w_vol, w_mis
+
+Outputs:
+  outputs/afi_sensitivity_weights.csv    one row per weight set
+  outputs/afi_sensitivity_districts.csv  one row per district
+
+Usage:
+    python src/afi_sensitivity.py [--source advanced_fixed] [--samples 1000] [--top-n 50] [--level district]
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kendalltau, rankdata
+
+from afi_engine import ADV_WEIGHTS, W_BIO, W_DEMO, W_MIS, W_VOL
+from afi_profile import Profiler
+
+
+SOURCES = {
+    "advanced_fixed": {
+        "file": "outputs/afi_district_month.csv",
+        "components": ["bio_update_rate_norm", "demo_to_enrol_ratio_norm",
+                       "bio_volatility_rolling_norm", "age_transition_mismatch_norm"],
+        "weights": [W_BIO, W_DEMO, W_VOL, W_MIS],
+    },
+    "advanced": {
+        "file": "outputs/merged_for_afi.csv",
+        "components": ["n_bio", "n_demo", "n_vol", "n_age"],
+        "weights": list(ADV_WEIGHTS),
+    },
+}
+WEIGHT_NAMES = ["w_bio", "w_demo", "w_vol", "w_mis"]
+
+LEVEL_KEYS = {
+    "state": ["state_canonical"],
+    "district": ["state_canonical", "district_clean"],
+    "pincode": ["state_canonical", "district_clean", "pincode"],
+}
+
+OUT_WEIGHTS = "outputs/afi_sensitivity_weights.csv"
+OUT_DISTRICTS = "outputs/afi_sensitivity_districts.csv"
+
+TOP_N = 50
+SAMPLES = 1000
+CONCENTRATION = 40.0   # Dirichlet concentration around the published weights
+CHUNK = 256            # weight sets scored per matrix product
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def load_components(source, level="district", period=None):
+    """Per-series mean of the normalized components: (keys frame, N x 4 matrix)."""
+    spec = SOURCES[source]
+    keys = LEVEL_KEYS[level]
+    cols = keys + ["period"] + spec["components"]
+    sheet = pd.read_csv(spec["file"], usecols=cols, dtype={k: str for k in keys + ["period"]})
+    if period is not None:
+        sheet = sheet[sheet["period"].str.startswith(period)]
+    for c in spec["components"]:
+        sheet[c] = pd.to_numeric(sheet[c], errors="coerce").fillna(0.0)
+    means = sheet.groupby(keys, sort=True)[spec["components"]].mean()
+    return means.index.to_frame(index=False), means.to_numpy(dtype=np.float64)
+
+
+def normalize(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def dirichlet_weights(base, samples, concentration=CONCENTRATION, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.asarray(base) / np.sum(base) * concentration, size=samples)
+
+
+def lattice_weights(step):
+    """All 4-component weight vectors on the simplex with spacing `step` (all weights > 0)."""
+    n = int(round(1 / step))
+    combos = [c for c in itertools.product(range(1, n), repeat=3) if sum(c) < n]
+    return np.array([[a, b, c, n - a - b - c] for a, b, c in combos], dtype=np.float64) / n
+
+
+def weight_sets(args, base):
+    if args.weights:
+        extra = pd.read_csv(args.weights)[WEIGHT_NAMES].to_numpy(dtype=np.float64)
+    elif args.grid:
+        extra = lattice_weights(args.grid)
+    else:
+        extra = dirichlet_weights(base, args.samples, args.concentration, args.seed)
+    return normalize(np.vstack([base, extra]))
+
+
+def top_mask(scores, n):
+    """Boolean N x M mask of the top-n rows of each column."""
+    n = min(n, scores.shape[0])
+    idx = np.argpartition(-scores, n - 1, axis=0)[:n]
+    mask = np.zeros(scores.shape, dtype=bool)
+    np.put_along_axis(mask, idx, True, axis=0)
+    return mask
+
+
+def sensitivity(comp, weights, top_n=TOP_N, chunk=CHUNK):
+    """
+    Score every weight set and compare its ranking with set 0.
+    Returns (per-weight-set stats frame, N x M rank matrix, top-n membership counts).
+    """
+    n, m = comp.shape[0], weights.shape[0]
+    ranks = np.empty((n, m), dtype=np.float32)       # 1 = highest friction
+    in_top = np.zeros(n, dtype=np.int64)
+    spearman = np.empty(m)
+    kendall = np.empty(m)
+    overlap = np.empty(m)
+
+    base_scores = comp @ weights[0]
+    base_rank = rankdata(-base_scores)
+    base_top = top_mask(base_scores[:, None], top_n)[:, 0]
+    base_centered = (base_rank - base_rank.mean()) / (base_rank.std() or 1.0)
+
+    for lo in range(0, m, chunk):
+        hi = min(m, lo + chunk)
+        scores = comp @ weights[lo:hi].T                           # (N x 4) . (4 x chunk)
+        r = rankdata(-scores, axis=0)
+        ranks[:, lo:hi] = r
+        centered = (r - r.mean(axis=0)) / np.where(r.std(axis=0) > 0, r.std(axis=0), 1.0)
+        spearman[lo:hi] = (centered * base_centered[:, None]).mean(axis=0)
+        mask = top_mask(scores, top_n)
+        in_top += mask.sum(axis=1)
+        overlap[lo:hi] = (mask & base_top[:, None]).sum(axis=0) / min(top_n, n)
+        for j in range(hi - lo):
+            kendall[lo + j] = kendalltau(base_rank, r[:, j]).statistic
+
+    stats = pd.DataFrame(weights, columns=WEIGHT_NAMES)
+    stats.insert(0, "weight_set", np.arange(m))
+    stats["spearman"] = spearman
+    stats["kendall"] = kendall
+    stats[f"top{top_n}_overlap"] = overlap
+    stats["max_rank_shift"] = np.abs(ranks - ranks[:, [0]]).max(axis=0)
+    return stats, ranks, in_top
+
+
+def district_table(keys, ranks, in_top, top_n):
+    out = keys.copy()
+    out["rank_published"] = ranks[:, 0].astype(int)
+    q = np.percentile(ranks, [5, 50, 95], axis=1)
+    out["rank_p05"] = q[0]
+    out["rank_median"] = q[1]
+    out["rank_p95"] = q[2]
+    out["rank_range"] = ranks.max(axis=1) - ranks.min(axis=1)
+    out[f"share_in_top{top_n}"] = in_top / ranks.shape[1]
+    return out.sort_values("rank_published")
+
+
+def print_summary(stats, top_n):
+    cols = ["spearman", "kendall", f"top{top_n}_overlap", "max_rank_shift"]
+    table = stats.loc[1:, cols].quantile([0.0, 0.05, 0.5, 0.95, 1.0]).T
+    table.columns = ["min", "p05", "median", "p95", "max"]
+    print(f"Rank stability across {len(stats) - 1:,} alternative weight sets (vs published weights):")
+    print(table.to_string(float_format=lambda v: f"{v:.3f}"))
+    worst = stats.loc[1:].nsmallest(5, "spearman")
+    print("\nLeast stable weight sets:")
+    print(worst[["weight_set", *WEIGHT_NAMES, *cols]].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AFI weight-sensitivity analysis")
+    ap.add_argument("--source", choices=list(SOURCES), default="advanced_fixed")
+    ap.add_argument("--level", choices=list(LEVEL_KEYS), default="district")
+    ap.add_argument("--period", help="restrict to one period (prefix match, e.g. 2025-06)")
+    ap.add_argument("--samples", type=int, default=SAMPLES)
+    ap.add_argument("--concentration", type=float, default=CONCENTRATION)
+    ap.add_argument("--grid", type=float, help="simplex lattice spacing instead of random samples")
+    ap.add_argument("--weights", help="CSV of weight sets (w_bio, w_demo, w_vol, w_mis)")
+    ap.add_argument("--top-n", type=int, default=TOP_N)
+    ap.add_argument("--chunk", type=int, default=CHUNK)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    prof = Profiler("afi_sensitivity")
+    spec = SOURCES[args.source]
+
+    with prof.stage("load") as st:
+        keys, comp = load_components(args.source, args.level, args.period)
+        st.rows(len(keys))
+    weights = weight_sets(args, spec["weights"])
+    log(f"{len(keys):,} {args.level} series x {weights.shape[0]:,} weight sets ({args.source})")
+
+    t0 = time.perf_counter()
+    with prof.stage("score") as st:
+        stats, ranks, in_top = sensitivity(comp, weights, args.top_n, args.chunk)
+        st.rows(len(keys) * weights.shape[0])
+    log(f"scored and ranked in {time.perf_counter() - t0:.2f}s")
+
+    with prof.stage("write") as st:
+        stats.to_csv(OUT_WEIGHTS, index=False)
+        districts = district_table(keys, ranks, in_top, args.top_n)
+        districts.to_csv(OUT_DISTRICTS, index=False)
+        st.rows(len(stats) + len(districts))
+    log(f"Wrote {OUT_WEIGHTS} and {OUT_DISTRICTS}")
+
+    print_summary(stats, args.top_n)
+    prof.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+afi_suggestion_audit.py
+
+Batch scoring of the district mapping suggestions, shared by
+08_flag_suspicious_suggestions.py and 09_resolve_suspicious.py.
+
+Each suggestions file is scored as a whole rather than row by row:
+  - the original and canonical districts are normalized once per distinct
+    value (afi_normalize.clean_name) and tokenized once into lower-cased
+    token sets
+  - fuzz.ratio for every (original, canonical) pair comes from one paired
+    rapidfuzz.process.cpdist call (multi-threaded); pairs with an empty side
+    score 0
+  - the Jaccard token overlap and the direction-word check reuse those sets
+  - the flag / accept rules are boolean masks over the whole frame
+
+The report columns, reason strings and row order are the same as the
+per-row versions of 08 and 09 produced.
+
+Usage:
+    from afi_suggestion_audit import flag_suggestions, resolve_suspicious
+    report = flag_suggestions(pd.read_csv(path, dtype=str).fillna(''))
+    candidates = resolve_suspicious(pd.read_csv(path, dtype=str).fillna(''), "enrolment")
+"""
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+
+from afi_normalize import clean_name_series
+
+
+# 08: flag for manual review
+THRESHOLD_RATIO = 75
+OVERLAP_FLAG_IF_LT = 0.4
+AUTO_CONFIDENCE = ('auto_high', 'auto_medium')
+
+# 09: accept / review
+SIMILARITY_ACCEPT_IF_GE = 90
+OVERLAP_ACCEPT_IF_GE = 0.7
+OVERLAP_ACCEPT_RATIO_GE = 80
+SIMILARITY_REVIEW_IF_LT = 70
+OVERLAP_REVIEW_IF_LT = 0.3
+
+DIR_TOKENS = frozenset({'east', 'west', 'north', 'south', 'central', 'upper', 'lower'})
+
+
+def column(sheet, name):
+    if name in sheet.columns:
+        return sheet[name].fillna('').astype(str)
+    return pd.Series('', index=sheet.index)
+
+
+def token_sets(values):
+    return [frozenset(v.lower().split()) for v in values]
+
+
+def jaccard(sets_a, sets_b):
+    """Token overlap |a & b| / |a | b| per pair; 0.0 when either side has no tokens."""
+    return np.array([len(a & b) / len(a | b) if a and b else 0.0 for a, b in zip(sets_a, sets_b)],
+                    dtype=np.float64)
+
+
+def paired_ratio(orig, canon):
+    """fuzz.ratio of each (orig, canon) pair, 0 where either is empty; also the mask of scored pairs."""
+    scored = ((orig != '') & (canon != '')).to_numpy()
+    ratio = np.zeros(len(orig), dtype=np.float64)
+    if scored.any():
+        ratio[scored] = cpdist(orig[scored].tolist(), canon[scored].tolist(), scorer=fuzz.ratio,
+                               workers=-1, dtype=np.float64)
+    return ratio, scored
+
+
+def ratio_text(ratio, scored):
+    # unscored pairs were the integer 0 in the per-row scripts
+    return pd.Series([str(r) if s else '0' for r, s in zip(ratio.tolist(), scored)], dtype=object)
+
+
+def overlap_text(overlap):
+    return pd.Series(['{:.2f}'.format(o) for o in overlap.tolist()], dtype=object)
+
+
+def ratio_column(ratio, scored):
+    # a report where nothing was scored kept an integer column
+    return ratio if scored.any() else ratio.astype(np.int64)
+
+
+def join_reasons(parts):
+    """';'-join the non-empty strings of each row of `parts` (a list of equal-length Series)."""
+    joined = parts[0].str.cat(parts[1:], sep=';')
+    return joined.str.replace(r';{2,}', ';', regex=True).str.strip(';')
+
+
+def flag_suggestions(sheet):
+    """The mapping suspicion report (08) for one suggestions file."""
+    sheet = sheet.reset_index(drop=True)
+    orig = clean_name_series(column(sheet, 'original_district'))
+    sug = clean_name_series(column(sheet, 'suggested_district'))
+    canon = clean_name_series(column(sheet, 'canonical_district_suggestion'))
+    conf = column(sheet, 'suggestion_confidence')
+
+    ratio, scored = paired_ratio(orig, canon)
+    overlap = jaccard(token_sets(orig), token_sets(canon))
+
+    not_auto = ~conf.isin(AUTO_CONFIDENCE).to_numpy()
+    empty = ~scored
+    low_ratio = ratio < THRESHOLD_RATIO
+    low_overlap = overlap < OVERLAP_FLAG_IF_LT
+    # a near-identical pair is never low_ratio while THRESHOLD_RATIO < 95, so this
+    # exemption only matters if the threshold is raised
+    exempt = low_ratio & (ratio >= 95) & (overlap >= 0.9)
+    low_ratio &= ~exempt
+    flag = np.where(exempt, not_auto | empty | low_overlap, not_auto | empty | low_ratio | low_overlap)
+
+    blank = pd.Series('', index=sheet.index, dtype=object)
+    reasons = join_reasons([
+        blank.mask(not_auto, 'not_auto_conf'),
+        blank.mask(empty, 'empty_token'),
+        ('low_ratio(' + ratio_text(ratio, scored) + ')').where(low_ratio, ''),
+        ('low_overlap(' + overlap_text(overlap) + ')').where(low_overlap, ''),
+    ])
+
+    return pd.DataFrame({
+        'original_state': column(sheet, 'original_state'),
+        'original_district': column(sheet, 'original_district'),
+        'suggested_district': sug,
+        'canonical_suggestion': canon,
+        'suggestion_confidence': conf,
+        'fuzzy_ratio_orig_vs_canon': ratio_column(ratio, scored),
+        'token_overlap': overlap,
+        'flag_for_manual_review': flag,
+        'reasons': reasons,
+    })
+
+
+def resolve_suspicious(sheet, dataset):
+    """Accept / review candidates (09) for one suspicious-suggestions file."""
+    sheet = sheet.reset_index(drop=True)
+    orig = clean_name_series(column(sheet, 'original_district'))
+    sug = clean_name_series(column(sheet, 'suggested_district'))
+    canon = clean_name_series(column(sheet, 'canonical_suggestion'))
+
+    ratio, scored = paired_ratio(orig, canon)
+    sets_orig, sets_canon = token_sets(orig), token_sets(canon)
+    overlap = jaccard(sets_orig, sets_canon)
+    dirs_orig = [s & DIR_TOKENS for s in sets_orig]
+    dirs_canon = [s & DIR_TOKENS for s in sets_canon]
+    direction_mismatch = np.array([bool(a and b and a != b) for a, b in zip(dirs_orig, dirs_canon)], dtype=bool)
+
+    r_txt = ratio_text(ratio, scored)
+    o_txt = overlap_text(overlap)
+    empty = (canon == '').to_numpy()
+    high_similarity = ratio >= SIMILARITY_ACCEPT_IF_GE
+    high_overlap = (overlap >= OVERLAP_ACCEPT_IF_GE) & (ratio >= OVERLAP_ACCEPT_RATIO_GE)
+    low = (ratio < SIMILARITY_REVIEW_IF_LT) | (overlap < OVERLAP_REVIEW_IF_LT)
+
+    # first matching rule wins, in the order the per-row version tested them
+    rules = [empty, high_similarity, high_overlap, direction_mismatch, low]
+    action = np.select(rules, ['review', 'accept', 'accept', 'review', 'review'], default='accept')
+    reason = np.select(rules, [
+        'empty_canonical',
+        'high_similarity(' + r_txt + ')',
+        'high_overlap(' + o_txt + ')_ratio(' + r_txt + ')',
+        'direction_mismatch',
+        'low_similarity_or_overlap(ratio=' + r_txt + ',overlap=' + o_txt + ')',
+    ], default='heuristic_accept(ratio=' + r_txt + ',overlap=' + o_txt + ')')
+
+    return pd.DataFrame({
+        'dataset': dataset,
+        'original_state': column(sheet, 'original_state'),
+        'original_district': orig,
+        'suggested_district': sug,
+        'canonical_suggestion': canon,
+        'suggestion_confidence': column(sheet, 'suggestion_confidence'),
+        'fuzzy_ratio': ratio_column(ratio, scored),
+        'token_overlap': [round(o, 3) for o in overlap.tolist()],
+        'action': action,
+        'reason': reason,
+    })
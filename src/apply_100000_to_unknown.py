@@ -1,15 +1,17 @@
 
 """
 Apply mapping: state_canonical '100000' -> 'UNKNOWN' across canonical outputs (chunked).
-Creates backups and writes new outputs with suffix _100000_to_UNKNOWN.csv
+Snapshots the inputs (outputs/.store, see afi_artifacts.py) and writes new outputs with suffix _100000_to_UNKNOWN.csv
 Appends a row to docs/revert_state_canonical_map.csv for traceability.
 """
 
 import os
-import shutil
 import pandas as pd
 from datetime import datetime, timezone
 
+from afi_artifacts import Store
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
+
 SRC_DIR = "outputs"
 DOCS_DIR = "docs"
 CHUNKSIZE = 100_000
@@ -23,54 +25,67 @@ FILES = {
 os.makedirs(DOCS_DIR, exist_ok=True)
 
 timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+store = Store(os.path.join(SRC_DIR, ".store"))
 
 def backup_file(path):
-    if os.path.exists(path):
-        bak = f"{path}.bak.{timestamp}"
-        print(f"[INFO] backing up {path} -> {bak}")
-        shutil.copy2(path, bak)
-        return bak
-    return None
-
-def apply_map(name, fname):
-    inpath = os.path.join(SRC_DIR, fname)
-    if not os.path.exists(inpath):
-        print(f"[WARN] {inpath} not found, skipping")
+    snap = store.snapshot([path], script="apply_100000_to_unknown", label=os.path.basename(path))
+    if snap is None:
         return None
+    print(f"[INFO] snapshot {snap['id']} of {path}")
+    return snap["id"]
 
-    backup_file(inpath)
-    outname = fname.replace(".csv", "_100000_to_UNKNOWN.csv")
-    outpath = os.path.join(SRC_DIR, outname)
+def unknown_chunk(chunk, _):
+    """The chunk with state_canonical '100000' set to UNKNOWN, and how many rows that changed."""
+    if "state_canonical" not in chunk.columns:
 
-    written = 0
-    changed_rows = 0
+        if "state_clean" in chunk.columns:
+            chunk["state_canonical"] = chunk["state_clean"]
+        else:
 
-    with pd.read_csv(inpath, dtype=str, chunksize=CHUNKSIZE, low_memory=False) as reader:
-        for idx, chunk in enumerate(reader):
+            chunk["state_canonical"] = ""
 
-            if "state_canonical" not in chunk.columns:
 
-                if "state_clean" in chunk.columns:
-                    chunk["state_canonical"] = chunk["state_clean"]
-                else:
+    mask = chunk["state_canonical"].fillna("") == "100000"
+    if mask.any():
+        chunk.loc[mask, "state_canonical"] = "UNKNOWN"
+    return chunk, int(mask.sum())
 
-                    chunk["state_canonical"] = ""
+def paths(name):
+    fname = FILES[name]
+    return os.path.join(SRC_DIR, fname), os.path.join(SRC_DIR, fname.replace(".csv", "_100000_to_UNKNOWN.csv"))
 
+def prepare(name):
+    """Snapshot the input and release the output of `name` (done up front: the store index is not shared-write safe)."""
+    inpath, outpath = paths(name)
+    if not os.path.exists(inpath):
+        return
+    backup_file(inpath)
+    store.release(outpath)
 
-            mask = chunk["state_canonical"].fillna("") == "100000"
-            changed_rows += int(mask.sum())
-            if mask.any():
-                chunk.loc[mask, "state_canonical"] = "UNKNOWN"
+def apply_map(name):
+    inpath, outpath = paths(name)
+    if not os.path.exists(inpath):
+        print(f"[WARN] {inpath} not found, skipping")
+        return None
 
+    written = 0
+    changed_rows = 0
 
-            if idx == 0:
-                chunk.to_csv(outpath, index=False, mode="w")
-            else:
-                chunk.to_csv(outpath, index=False, header=False, mode="a")
+    reader = pd.read_csv(inpath, dtype=str, chunksize=CHUNKSIZE, low_memory=False)
+    results = map_chunks(unknown_chunk, prefetch(reader))
+    with ChunkWriter(outpath) as out:
+        for chunk, n_changed in results:
+            changed_rows += n_changed
+
+            out.write(chunk)
 
             written += len(chunk)
+    reader.close()
 
+    print(f"[DONE] {name}: written={written}, changed_rows={changed_rows}, out={outpath}")
+    return outpath
 
+def log_revert(name):
     revert_path = os.path.join(DOCS_DIR, "revert_state_canonical_map.csv")
     header_needed = not os.path.exists(revert_path)
     with open(revert_path, "a", encoding="utf8", newline="") as file_handle:
@@ -80,11 +95,11 @@ def apply_map(name, fname):
             w.writerow(["original_state_canonical","mapped_to","dataset","timestamp_utc"])
         w.writerow(["100000","UNKNOWN", name, timestamp])
 
-    print(f"[DONE] {name}: written={written}, changed_rows={changed_rows}, out={outpath}")
-    return outpath
-
 if __name__ == "__main__":
-    for name, fname in FILES.entries():
-        apply_map(name, fname)
+    for name in FILES:
+        prepare(name)
+    for name, outpath in zip(FILES, fan_out(apply_map, FILES)):
+        if outpath:
+            log_revert(name)
 
     print("All done. Please re-run sanity_checks.py to validate.")
\ No newline at end of file
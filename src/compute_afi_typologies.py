@@ -15,6 +15,10 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 from sklearn.metrics import adjusted_rand_score
 
+from afi_io import read_table, write_ipc
+from afi_profile import Profiler
+from afi_rollups import write_typology_rollup
+
 
 
 INPUT_FILE = "outputs/afi_summary.csv"
@@ -48,15 +52,16 @@ def safe_numeric(sheet, cols):
 
 
 def main():
-    log("Loading AFI summary")
-    sheet = pd.read_csv(INPUT_FILE)
-    log(f"Rows loaded: {len(df):,}")
+    prof = Profiler("compute_afi_typologies")
 
-
-    sheet = sheet[sheet["afi_composite_score"] > 0].copy()
-    log(f"Rows with AFI > 0: {len(df):,}")
+    log("Loading AFI summary")
+    prof.begin("load")
+    sheet = read_table(INPUT_FILE, filters=[("afi_composite_score", ">", 0)])
+    log(f"Rows with AFI > 0: {len(sheet):,}")
+    prof.end(rows=len(sheet))
 
 
+    prof.begin("cluster")
     sheet = safe_numeric(sheet, FEATURES)
 
     X = sheet[FEATURES].copy()
@@ -84,6 +89,7 @@ def main():
     }
 
     sheet["cluster_name"] = sheet["cluster_id"].map(CLUSTER_NAMES)
+    prof.end(rows=len(sheet))
 
 
 
@@ -107,6 +113,7 @@ def main():
 
 
     log("Running cluster stability sanity-check")
+    prof.begin("stability")
     stability_rows = []
 
     for seed in [7, 21, 84]:
@@ -122,14 +129,24 @@ def main():
             "adjusted_rand_index": round(ari, 4)
         })
 
+    prof.end(rows=3 * len(sheet))
+
     stability = pd.DataFrame(stability_rows)
     stability.to_csv(OUT_CLUSTER_STABILITY, index=False)
     log(f"Wrote cluster stability → {OUT_CLUSTER_STABILITY}")
 
 
 
+    prof.begin("write")
     sheet.to_csv(OUT_WITH_TYPOS, index=False)
+    write_ipc(sheet, OUT_WITH_TYPOS)
     log(f"Wrote AFI with typologies → {OUT_WITH_TYPOS}")
+
+    write_typology_rollup(sheet, metric="afi_composite_score")
+    log("Wrote state × typology rollup → outputs/rollups/state_typology.parquet")
+    prof.end(rows=len(sheet))
+
+    prof.report()
     log("Done.")
 
 
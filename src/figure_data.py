@@ -0,0 +1,119 @@
+"""
+figure_data.py
+
+Figure-data layer for the AFI report visuals.
+
+Reduces the row-level AFI table to the small aggregates the figures actually
+draw, so that rendering cost depends on the number of bins/bars and not on the
+number of district-month rows:
+
+- histogram bin edges + counts (and the exact median / p95 / p99 markers)
+- per-state means of the AFI and age-mismatch scores, read off the period x
+  state rollup cubes the AFI stage wrote (afi_rollups.py) instead of the rows
+- the top-N district-month hotspots (nlargest, no full sort)
+- 2D log-binned counts of aadhaar_base vs AFI (drawn as an image, not a scatter)
+
+Each figure job in make_visuals_final.py calls the helper for its own figure;
+build_figure_data() computes all of them at once.
+"""
+
+import numpy as np
+
+from afi_rollups import cube_name, load_cube
+
+
+SCORE_COL = "afi_composite_score"
+STATE_COL = "state_canonical"
+DISTRICT_COL = "district_clean"
+AGE_COL = "age_mismatch_score"
+BASE_COL = "aadhaar_base"
+
+# period x state cube per score (see state_means)
+STATE_CUBES = {col: cube_name("period_state", col) for col in (SCORE_COL, AGE_COL)}
+
+HIST_BINS = 80
+SCATTER_BINS = 120
+TOP_HOTSPOTS = 15
+
+
+def clean_scores(sheet):
+    """Drop rows whose AFI score is missing or infinite."""
+    sheet = sheet.replace([np.inf, -np.inf], np.nan)
+    return sheet.dropna(subset=[SCORE_COL])
+
+
+def histogram_counts(values, bins=HIST_BINS):
+    """Bin counts for a 1D histogram, identical to what ax.hist(values, bins) draws."""
+    values = np.asarray(values, dtype=float)
+    counts, edges = np.histogram(values, bins=bins)
+    return {"counts": counts, "edges": edges}
+
+
+def log_edges(values, bins):
+    """Log-spaced bin edges covering the positive range of `values`."""
+    lo = float(values.min())
+    hi = float(values.max())
+    if hi <= lo:
+        hi = lo * 10.0
+    return np.logspace(np.log10(lo), np.log10(hi), bins + 1)
+
+
+def log_binned_2d(x, y, bins=SCATTER_BINS):
+    """2D counts on log-spaced edges; non-positive values cannot sit on a log axis and are dropped."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y) & (x > 0) & (y > 0)
+    x, y = x[keep], y[keep]
+    if len(x) == 0:
+        return None
+    x_edges = log_edges(x, bins)
+    y_edges = log_edges(y, bins)
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    return {"counts": counts, "x_edges": x_edges, "y_edges": y_edges, "points": int(len(x))}
+
+
+def afi_distribution(sheet):
+    """Histogram of positive AFI scores plus the exact median / p95 / p99 markers."""
+    afi = clean_scores(sheet)[SCORE_COL].to_numpy(dtype=float)
+    afi = afi[afi > 0]
+    out = histogram_counts(afi)
+    if len(afi):
+        out["median"] = float(np.median(afi))
+        out["p95"], out["p99"] = np.quantile(afi, [0.95, 0.99]).tolist()
+    else:
+        out["median"] = out["p95"] = out["p99"] = np.nan
+    return out
+
+
+def state_means(col=SCORE_COL):
+    """Mean of `col` per state over all periods, highest first (summed from its period_state cube)."""
+    cube, _ = load_cube(STATE_CUBES[col], columns=[STATE_COL, "sum", "count"])
+    totals = cube.groupby(STATE_COL)[["sum", "count"]].sum()
+    return (totals["sum"] / totals["count"]).rename(col).sort_values(ascending=False)
+
+
+def hotspots(sheet, n=TOP_HOTSPOTS):
+    """Top-n district-month rows by AFI."""
+    return clean_scores(sheet).nlargest(n, SCORE_COL)[[DISTRICT_COL, STATE_COL, SCORE_COL]]
+
+
+def base_vs_afi(sheet):
+    """Log-binned aadhaar_base x AFI counts (None when nothing is positive)."""
+    sheet = clean_scores(sheet)
+    return log_binned_2d(sheet[BASE_COL], sheet[SCORE_COL])
+
+
+def build_figure_data(sheet):
+    """Compute every aggregate needed by make_visuals_final.py."""
+    sheet = clean_scores(sheet)
+    data = {
+        "afi_hist": afi_distribution(sheet),
+        "state_mean": state_means(),
+        "hotspots": hotspots(sheet),
+    }
+    if AGE_COL in sheet.columns:
+        data["age_state"] = state_means(AGE_COL)
+    if BASE_COL in sheet.columns:
+        data["base_vs_afi"] = base_vs_afi(sheet)
+    return data
+
@@ -2,14 +2,16 @@
 
 import pandas as pd
 from pathlib import Path
-from datetime import datetime
 
+from afi_artifacts import Store
+from afi_pipeline import ChunkWriter, fan_out, map_chunks, prefetch
 
-FILES = [
-    "outputs/cleaned_enrolment_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
-    "outputs/cleaned_demographic_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
-    "outputs/cleaned_biometric_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
-]
+
+FILES = {
+    "enrolment": "outputs/cleaned_enrolment_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
+    "demographic": "outputs/cleaned_demographic_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
+    "biometric": "outputs/cleaned_biometric_final_canonical_state_applied_extra_applied_100000_to_UNKNOWN.csv",
+}
 
 
 DAMAN_CORRECT_CANONICAL = "Dadra and Nagar Haveli and Daman and Diu"
@@ -26,74 +28,68 @@ def is_daman_like(s: pd.Series) -> pd.Series:
     s2 = s.fillna("").astype(str).str.lower()
     return s2.str.contains("daman") & s2.str.contains("diu")
 
-timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+def fix_chunk(chunk, _):
+    """The chunk with Daman rows re-pointed and UNKNOWN rows dropped; rows in, rows fixed, rows dropped."""
+    n_in_chunk = len(chunk)
 
-for file_handle in FILES:
-    p = Path(file_handle)
-    if not p.exists():
-        print(f"[SKIP] {fp} not found.")
-        continue
+    for col in ("state", "state_clean", "state_clean_prev", "state_canonical", "state_canonical_source"):
+        if col not in chunk.columns:
+            chunk[col] = ""
 
 
-    bak = p.with_name(p.name + f".bak.{timestamp}")
-    p.replace(bak)
-    bak_path = bak
-    print(f"[BACKUP] moved {p.name} -> {bak_path.name}")
+    daman_mask = (
+        is_daman_like(chunk["state_clean_prev"]) |
+        is_daman_like(chunk["state_clean"]) |
+        is_daman_like(chunk["state"])
+    )
 
 
-    out_path = Path(str(file_handle).replace(".csv", "_fixed.csv"))
-
-
-    chunksize = 200_000
-    total_rows_in = 0
-    total_written = 0
-    daman_fixed = 0
-    unknown_removed = 0
+    fixed_count = 0
+    cond_fix = daman_mask & (chunk["state_canonical"] == "Andaman and Nicobar Islands")
+    if cond_fix.any():
+        chunk.loc[cond_fix, "state_canonical"] = DAMAN_CORRECT_CANONICAL
 
-    reader = pd.read_csv(bak_path, dtype=str, chunksize=chunksize, low_memory=False)
-    first_chunk = True
-    for chunk in reader:
+        chunk.loc[cond_fix, "state_canonical_source"] = "manual_fix_daman"
+        fixed_count = int(cond_fix.sum())
 
-        n_in_chunk = len(chunk)
-        total_rows_in += n_in_chunk
 
+    removed_count = 0
+    unknown_mask = (chunk["state_canonical"] == UNKNOWN)
+    if unknown_mask.any():
+        removed_count = int(unknown_mask.sum())
 
+        chunk = chunk.loc[~unknown_mask].copy()
+    return chunk, n_in_chunk, fixed_count, removed_count
 
-        for col in ("state", "state_clean", "state_clean_prev", "state_canonical", "state_canonical_source"):
-            if col not in chunk.columns:
-                chunk[col] = ""
+def out_path_for(p):
+    return Path(str(p).replace(".csv", "_fixed.csv"))
 
+def fix_file(name, snaps):
+    p = Path(FILES[name])
+    if not p.exists():
+        print(f"[SKIP] {p} not found.")
+        return None
 
-        daman_mask = (
-            is_daman_like(chunk["state_clean_prev"]) |
-            is_daman_like(chunk["state_clean"]) |
-            is_daman_like(chunk["state"])
-        )
+    out_path = out_path_for(p)
 
 
-        cond_fix = daman_mask & (chunk["state_canonical"] == "Andaman and Nicobar Islands")
-        if cond_fix.any():
-            chunk.loc[cond_fix, "state_canonical"] = DAMAN_CORRECT_CANONICAL
+    chunksize = 200_000
+    total_rows_in = 0
+    total_written = 0
+    daman_fixed = 0
+    unknown_removed = 0
 
-            chunk.loc[cond_fix, "state_canonical_source"] = "manual_fix_daman"
-            fixed_count = int(cond_fix.sum())
+    reader = pd.read_csv(p, dtype=str, chunksize=chunksize, low_memory=False)
+    results = map_chunks(fix_chunk, prefetch(reader))
+    with ChunkWriter(out_path) as out:
+        for chunk, n_in_chunk, fixed_count, removed_count in results:
+            total_rows_in += n_in_chunk
             daman_fixed += fixed_count
+            unknown_removed += removed_count
 
+            out.write(chunk)
 
-        unknown_mask = (chunk["state_canonical"] == UNKNOWN)
-        if unknown_mask.any():
-            unknown_removed += int(unknown_mask.sum())
-
-            chunk = chunk.loc[~unknown_mask].copy()
-
-
-        if first_chunk:
-            chunk.to_csv(out_path, index=False, mode="w")
-            first_chunk = False
-        else:
-            chunk.to_csv(out_path, index=False, mode="a", header=False)
-
-        total_written += len(chunk)
+            total_written += len(chunk)
 
 
     print(f"[DONE] {p.name} -> {out_path.name}")
@@ -101,7 +97,23 @@ for file_handle in FILES:
     print(f"  rows_written: {total_written:,}")
     print(f"  daman_fixed: {daman_fixed:,}")
     print(f"  unknown_rows_removed: {unknown_removed:,}")
-    print(f"  backup kept at: {bak_path}")
+    print(f"  snapshot: {snaps[name]} (restore: python src/afi_artifacts.py restore {snaps[name]})")
     print("")
+    return out_path
+
+store = Store(Path("outputs") / ".store")
+
+# snapshots and releases touch the store index, so they happen here rather than in the dataset processes
+snaps = {}
+for name, file_handle in FILES.items():
+    p = Path(file_handle)
+    if not p.exists():
+        continue
+    snap = store.snapshot([p], script="fix_daman_and_drop_unknowns", label=p.name)
+    print(f"[BACKUP] snapshot {snap['id']} of {p.name}")
+    snaps[name] = snap['id']
+    store.release(out_path_for(p))
+
+fan_out(fix_file, FILES, snaps)
 
 print("All files processed. Re-run sanity_checks.py next to validate final state.")
\ No newline at end of file
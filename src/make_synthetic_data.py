@@ -0,0 +1,388 @@
+"""
+make_synthetic_data.py
+
+Generate synthetic, UIDAI-shaped raw dumps for benchmarking the pipeline.
+
+Writes bench/data/api_data_aadhar_{biometric,demographic,enrolment}/ folders with
+part files named like the public dumps (api_data_aadhar_enrolment_0_500000.csv)
+and the raw columns the ingest stage expects:
+
+  enrolment:    date, state, district, pincode, age_0_5, age_5_17, age_18_greater
+  demographic:  date, state, district, pincode, demo_age_5_17, demo_age_17_
+  biometric:    date, state, district, pincode, bio_age_5_17, bio_age_17_
+
+The data reproduces the dirt the cleaning stages exist for:
+  - state spelling variants (case, whitespace, the EXTRA_MAP misspellings)
+  - district names in the state column (the MANUAL_MAP keys)
+  - the '100000' state artifact
+  - legacy 'Daman and Diu' / 'Dadra and Nagar Haveli' names
+  - district spelling variants and bad pincodes (short, long, non-digit, float)
+  - skewed volumes: lognormal district weights and heavy-tailed counts
+
+Rows are generated and written in chunks, so memory stays flat from 1M to
+500M rows per dataset. Output is deterministic for a given --seed.
+
+Usage:
+    python src/make_synthetic_data.py --rows 1000000 [--out bench/data] [--seed 7] [--months 12]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+
+PROJECT = Path(__file__).resolve().parents[1]
+DATA_ROOT = PROJECT / "bench" / "data"
+
+DATASETS = ["enrolment", "demographic", "biometric"]
+FOLDER_TPL = "api_data_aadhar_{name}"
+FILE_ROWS = 500_000
+CHUNK_ROWS = 250_000
+MANIFEST = "synthetic_manifest.json"
+
+COUNT_COLS = {
+    "enrolment": ["age_0_5", "age_5_17", "age_18_greater"],
+    "demographic": ["demo_age_5_17", "demo_age_17_"],
+    "biometric": ["bio_age_5_17", "bio_age_17_"],
+}
+
+# mean count per row for each column; the shape of the tail comes from sample_counts()
+COUNT_MEANS = {
+    "enrolment": [6.0, 3.0, 0.8],
+    "demographic": [2.5, 14.0],
+    "biometric": [18.0, 11.0],
+}
+
+WHITELIST = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan",
+    "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Puducherry", "Lakshadweep",
+]
+
+# relative volume of each state (roughly population-shaped)
+STATE_WEIGHTS = {
+    "Uttar Pradesh": 20, "Maharashtra": 11, "Bihar": 10, "West Bengal": 8, "Madhya Pradesh": 7,
+    "Tamil Nadu": 6, "Rajasthan": 6, "Karnataka": 5, "Gujarat": 5, "Andhra Pradesh": 4,
+    "Odisha": 3.5, "Telangana": 3, "Kerala": 3, "Jharkhand": 3, "Assam": 2.8, "Punjab": 2.5,
+    "Chhattisgarh": 2.3, "Haryana": 2.3, "Delhi": 1.6, "Jammu and Kashmir": 1.0, "Uttarakhand": 0.9,
+    "Himachal Pradesh": 0.6, "Tripura": 0.3, "Meghalaya": 0.3, "Manipur": 0.25, "Nagaland": 0.2,
+    "Goa": 0.15, "Arunachal Pradesh": 0.12, "Puducherry": 0.1, "Mizoram": 0.1, "Chandigarh": 0.09,
+    "Sikkim": 0.05, "Dadra and Nagar Haveli and Daman and Diu": 0.05, "Andaman and Nicobar Islands": 0.03,
+    "Ladakh": 0.02, "Lakshadweep": 0.005,
+}
+
+# misspellings handled by 24_apply_extra_state_mappings.py (EXTRA_MAP)
+STATE_MISSPELLINGS = {
+    "Jammu and Kashmir": ["Jammu & Kashmir", "Jammu And Kashmir"],
+    "Puducherry": ["Pondicherry"],
+    "West Bengal": ["West Bangal", "West Bengli", "Westbengal"],
+    "Uttarakhand": ["Uttaranchal"],
+    "Odisha": ["Orissa"],
+    "Chhattisgarh": ["Chhatisgarh"],
+}
+
+# district/locality names that leak into the state column (MANUAL_MAP in 23_apply_state_manual_map.py)
+STATE_COLUMN_LOCALITIES = {
+    "Tamil Nadu": ["Raja Annamalai Puram"],
+    "Maharashtra": ["Nagpur"],
+    "Karnataka": ["Puttenahalli"],
+    "Andhra Pradesh": ["Madanapalle"],
+    "Rajasthan": ["Jaipur"],
+    "Telangana": ["Balanagar"],
+    "Bihar": ["Darbhanga"],
+}
+
+DAMAN = "Dadra and Nagar Haveli and Daman and Diu"
+DAMAN_LEGACY = ["Daman and Diu", "Daman & Diu", "Dadra and Nagar Haveli", "Dadra & Nagar Haveli"]
+
+STATE_ARTIFACT = "100000"
+
+# noise rates (share of rows)
+STATE_VARIANT_RATE = 0.06
+MISSPELLING_RATE = 0.02
+LOCALITY_RATE = 0.002
+ARTIFACT_RATE = 0.0005
+DAMAN_LEGACY_RATE = 0.7
+DISTRICT_VARIANT_RATE = 0.05
+BAD_PINCODE_RATE = 0.01
+
+SYLLABLES_A = ["Ram", "Shiv", "Hari", "Krishna", "Bhav", "Chand", "Sultan", "Rajan", "Mahes", "Gopal",
+               "Kishan", "Devi", "Lal", "Anand", "Bela", "Moti", "Sona", "Nara", "Vijay", "Kamal"]
+SYLLABLES_B = ["pur", "nagar", "abad", "garh", "ganj", "wadi", "halli", "palle", "kot", "pet",
+               "gudi", "uru", "gaon", "bari", "wara"]
+DISTRICTS_PER_WEIGHT = 3
+MIN_DISTRICTS = 2
+PINCODES_PER_DISTRICT = (4, 40)
+
+
+def log(msg):
+    print(f"[INFO] {msg}", flush=True)
+
+
+def build_geography(rng):
+    """Canonical districts with skewed weights, pincode pools and spelling variants."""
+    districts = []
+    used = set()
+    for s_idx, state in enumerate(WHITELIST):
+        n = max(MIN_DISTRICTS, int(round(STATE_WEIGHTS[state] * DISTRICTS_PER_WEIGHT)))
+        pin_prefix = 11 + (s_idx * 7) % 85
+        for d_idx in range(n):
+            name = None
+            while name is None or name in used:
+                name = rng.choice(SYLLABLES_A) + rng.choice(SYLLABLES_B)
+                if name in used:
+                    name = f"{name} {rng.choice(['North', 'South', 'East', 'West', 'Rural', 'Urban'])}"
+            used.add(name)
+            n_pins = int(rng.integers(*PINCODES_PER_DISTRICT))
+            base = pin_prefix * 10_000 + int(rng.integers(0, 9_000))
+            districts.append({
+                "state": s_idx,
+                "name": name,
+                "weight": STATE_WEIGHTS[state] / n * float(rng.lognormal(0.0, 1.0)),
+                "pincodes": base + np.sort(rng.choice(10_000 - base % 10_000, size=n_pins, replace=False)),
+                "variants": district_variants(name, rng),
+            })
+    return districts
+
+
+def district_variants(name, rng):
+    variants = [name.upper(), name.lower(), f" {name}  ", f"{name} *", f"{name} District"]
+    if len(name) > 5:
+        i = int(rng.integers(1, len(name) - 2))
+        variants.append(name[:i] + name[i + 1:])
+        variants.append(name[:i] + name[i + 1] + name[i] + name[i + 2:])
+    return variants
+
+
+def state_variants(state):
+    return [state.upper(), state.lower(), f"{state} ", state.replace(" ", "  ")]
+
+
+class LabelTable:
+    """Interns strings so a column can be written as dictionary indices."""
+
+    def __init__(self):
+        self.labels = []
+        self.index = {}
+
+    def add(self, label):
+        if label not in self.index:
+            self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return self.index[label]
+
+    def dictionary(self):
+        return pa.array(self.labels, type=pa.string())
+
+
+def build_label_tables(districts):
+    """Index arrays that let a chunk pick canonical or noisy labels without Python loops."""
+    states = LabelTable()
+    canon_state = np.array([states.add(s) for s in WHITELIST], dtype=np.int32)
+
+    def grouped(table, per_state):
+        offsets, sizes, flat = [], [], []
+        for state in WHITELIST:
+            labels = per_state.get(state, [])
+            offsets.append(len(flat))
+            sizes.append(len(labels))
+            flat.extend(table.add(l) for l in labels)
+        return np.array(offsets), np.array(sizes), np.array(flat + [0], dtype=np.int32)
+
+    variants = grouped(states, {s: state_variants(s) for s in WHITELIST})
+    misspellings = grouped(states, STATE_MISSPELLINGS)
+    localities = grouped(states, STATE_COLUMN_LOCALITIES)
+    daman_legacy = np.array([states.add(s) for s in DAMAN_LEGACY], dtype=np.int32)
+    artifact = states.add(STATE_ARTIFACT)
+
+    dists = LabelTable()
+    canon_district = np.array([dists.add(d["name"]) for d in districts], dtype=np.int32)
+    d_offsets, d_sizes, d_flat = [], [], []
+    for d in districts:
+        d_offsets.append(len(d_flat))
+        d_sizes.append(len(d["variants"]))
+        d_flat.extend(dists.add(v) for v in d["variants"])
+
+    return {
+        "states": states, "canon_state": canon_state,
+        "state_variants": variants, "misspellings": misspellings, "localities": localities,
+        "daman_legacy": daman_legacy, "artifact": artifact, "daman_idx": WHITELIST.index(DAMAN),
+        "districts": dists, "canon_district": canon_district,
+        "district_variants": (np.array(d_offsets), np.array(d_sizes), np.array(d_flat, dtype=np.int32)),
+    }
+
+
+def pick_grouped(rng, group, keys, mask):
+    """For rows in `mask` whose group has labels, pick one of the group's labels."""
+    offsets, sizes, flat = group
+    rows = np.flatnonzero(mask & (sizes[keys] > 0))
+    k = keys[rows]
+    return rows, flat[offsets[k] + rng.integers(0, 1 << 30, size=len(rows)) % sizes[k]]
+
+
+def noisy_states(rng, tables, state_idx):
+    out = tables["canon_state"][state_idx].copy()
+    u = rng.random(len(state_idx))
+
+    rows, labels = pick_grouped(rng, tables["state_variants"], state_idx, u < STATE_VARIANT_RATE)
+    out[rows] = labels
+    lo = STATE_VARIANT_RATE
+    rows, labels = pick_grouped(rng, tables["misspellings"], state_idx, (u >= lo) & (u < lo + MISSPELLING_RATE))
+    out[rows] = labels
+    lo += MISSPELLING_RATE
+    rows, labels = pick_grouped(rng, tables["localities"], state_idx, (u >= lo) & (u < lo + LOCALITY_RATE))
+    out[rows] = labels
+    lo += LOCALITY_RATE
+    out[(u >= lo) & (u < lo + ARTIFACT_RATE)] = tables["artifact"]
+
+    daman = np.flatnonzero((state_idx == tables["daman_idx"]) & (rng.random(len(state_idx)) < DAMAN_LEGACY_RATE))
+    out[daman] = tables["daman_legacy"][rng.integers(0, len(DAMAN_LEGACY), size=len(daman))]
+    return out
+
+
+def noisy_districts(rng, tables, district_idx):
+    out = tables["canon_district"][district_idx].copy()
+    rows, labels = pick_grouped(rng, tables["district_variants"], district_idx,
+                                rng.random(len(district_idx)) < DISTRICT_VARIANT_RATE)
+    out[rows] = labels
+    return out
+
+
+def pincode_column(rng, districts, district_idx):
+    pools = [d["pincodes"] for d in districts]
+    sizes = np.array([len(p) for p in pools])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    flat = np.concatenate(pools)
+    pins = flat[offsets[district_idx] + rng.integers(0, 1 << 30, size=len(district_idx)) % sizes[district_idx]]
+    text = pins.astype(str).astype(object)
+
+    bad = np.flatnonzero(rng.random(len(pins)) < BAD_PINCODE_RATE)
+    kind = rng.integers(0, 6, size=len(bad))
+    for k, fmt in enumerate([
+        lambda p: "",
+        lambda p: str(p)[:5],
+        lambda p: f"{p}{p % 10}",
+        lambda p: str(p).replace("0", "O", 1) if "0" in str(p) else f"{p}X",
+        lambda p: f"{p}.0",
+        lambda p: "000000",
+    ]):
+        sel = bad[kind == k]
+        text[sel] = [fmt(p) for p in pins[sel]]
+    return pa.array(text, type=pa.string())
+
+
+def date_labels(start, months):
+    """DD-MM-YYYY strings for every day in `months` months from `start` (YYYY-MM)."""
+    first = np.datetime64(start, "M")
+    days = np.arange(first.astype("datetime64[D]"), (first + months).astype("datetime64[D]"))
+    return pa.array([d.item().strftime("%d-%m-%Y") for d in days], type=pa.string()), len(days)
+
+
+def sample_counts(rng, n, mean):
+    """Zero-inflated, heavy-tailed counts: gamma-Poisson (negative binomial) with a small dispersion."""
+    shape = 0.35
+    lam = rng.gamma(shape, mean / shape, size=n)
+    return rng.poisson(lam).astype(np.int64)
+
+
+def generate_chunk(rng, name, n, geo, tables, dates):
+    date_dict, n_days = dates
+    district_idx = np.searchsorted(geo["cum_weight"], rng.random(n) * geo["cum_weight"][-1], side="right")
+    district_idx = np.minimum(district_idx, len(geo["districts"]) - 1)
+    state_idx = geo["state_of"][district_idx]
+
+    # later days and heavier districts get more traffic, like the real monthly dumps
+    day = np.minimum((rng.beta(1.3, 1.0, size=n) * n_days).astype(np.int32), n_days - 1)
+
+    cols = {
+        "date": pa.DictionaryArray.from_arrays(pa.array(day), date_dict),
+        "state": pa.DictionaryArray.from_arrays(pa.array(noisy_states(rng, tables, state_idx)),
+                                                tables["states"].dictionary()),
+        "district": pa.DictionaryArray.from_arrays(pa.array(noisy_districts(rng, tables, district_idx)),
+                                                   tables["districts"].dictionary()),
+        "pincode": pincode_column(rng, geo["districts"], district_idx),
+    }
+    scale = geo["volume"][district_idx]
+    for col, mean in zip(COUNT_COLS[name], COUNT_MEANS[name]):
+        cols[col] = pa.array(sample_counts(rng, n, mean) * scale // 1)
+    return pa.table(cols)
+
+
+def write_dataset(name, rows, out_root, seed, geo, tables, dates, file_rows=FILE_ROWS, chunk_rows=CHUNK_ROWS):
+    folder = Path(out_root) / FOLDER_TPL.format(name=name)
+    folder.mkdir(parents=True, exist_ok=True)
+    for old in folder.glob("*.csv"):
+        old.unlink()
+
+    rng = np.random.default_rng([seed, DATASETS.index(name)])
+    files = []
+    for start in range(0, rows, file_rows):
+        stop = min(rows, start + file_rows)
+        path = folder / f"{FOLDER_TPL.format(name=name)}_{start}_{stop}.csv"
+        writer = None
+        for lo in range(start, stop, chunk_rows):
+            table = generate_chunk(rng, name, min(chunk_rows, stop - lo), geo, tables, dates)
+            if writer is None:
+                writer = pacsv.CSVWriter(path, table.schema,
+                                         write_options=pacsv.WriteOptions(quoting_style="needed"))
+            writer.write_table(table)
+        writer.close()
+        files.append(path.name)
+    return files
+
+
+def generate(rows, out_root=DATA_ROOT, seed=7, months=12, start="2025-03", datasets=DATASETS):
+    """Write `rows` rows per dataset under `out_root`; returns the manifest dict."""
+    out_root = Path(out_root)
+    if out_root.exists() and not out_root.is_dir():
+        raise NotADirectoryError(f"{out_root} exists and is not a directory; pass another --out")
+    rng = np.random.default_rng(seed)
+    districts = build_geography(rng)
+    weights = np.array([d["weight"] for d in districts])
+    geo = {
+        "districts": districts,
+        "state_of": np.array([d["state"] for d in districts]),
+        "cum_weight": np.cumsum(weights),
+        # per-district volume multiplier, so large districts also report larger counts
+        "volume": np.clip(weights / np.median(weights), 1, 50).round().astype(np.int64),
+    }
+    tables = build_label_tables(districts)
+    dates = date_labels(start, months)
+
+    manifest = {"rows_per_dataset": rows, "seed": seed, "months": months, "start": start,
+                "districts": len(districts), "datasets": {}}
+    for name in datasets:
+        t0 = time.perf_counter()
+        files = write_dataset(name, rows, out_root, seed, geo, tables, dates)
+        elapsed = time.perf_counter() - t0
+        manifest["datasets"][name] = {"rows": rows, "files": files}
+        log(f"{name}: {rows:,} rows in {len(files)} file(s), {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+    (out_root / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate synthetic UIDAI-shaped raw CSV dumps")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="rows per dataset")
+    ap.add_argument("--out", default=str(DATA_ROOT), help="data root (gets api_data_aadhar_* folders)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--months", type=int, default=12)
+    ap.add_argument("--start", default="2025-03", help="first month, YYYY-MM")
+    ap.add_argument("--datasets", nargs="+", default=DATASETS, choices=DATASETS)
+    args = ap.parse_args(argv)
+
+    generate(args.rows, args.out, args.seed, args.months, args.start, args.datasets)
+    log(f"Synthetic data written under {args.out}")
+
+
+if __name__ == "__main__":
+    main()
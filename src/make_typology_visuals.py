@@ -1,4 +1,3 @@
-
 """
 make_typology_visuals.py
 
@@ -9,18 +8,21 @@ Figures are:
 1. Typology size (count of district-months)
 2. AFI distribution by typology (log-scale boxplot)
 3. State × Typology composition for high-volume states
+   (from the state_typology rollup cube, see afi_rollups.py)
 
 All figures:
 - High DPI (PDF-ready)
 - Clear labels
 - Embedded captions
+
+Each figure is a job in a FigureRegistry (see render_figures.py) and is drawn
+in its own worker process.
 """
 
-import os
 import textwrap
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+from afi_rollups import load_cube
+from render_figures import FigureRegistry
 
 
 
@@ -28,16 +30,27 @@ INPUT_FILE = "outputs/afi_with_typologies.csv"
 OUT_DIR = "typology_visuals"
 DPI = 300
 
-os.makedirs(OUT_DIR, exist_ok=True)
+required_cols = {
+    "cluster_id",
+    "cluster_name",
+    "afi_composite_score",
+    "state_canonical"
+}
+
+registry = FigureRegistry(INPUT_FILE, OUT_DIR, dpi=DPI, required_columns=required_cols)
+
 
-sns.set_theme(style="whitegrid", font_scale=1.2)
 
+def new_figure(figsize):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
+    sns.set_theme(style="whitegrid", font_scale=1.2)
+    return plt.subplots(figsize=figsize)
 
-def save_fig(fig, filename):
+def finish(fig):
     fig.tight_layout(rect=[0, 0.08, 1, 1])
-    fig.savefig(os.path.join(OUT_DIR, filename), dpi=DPI)
-    plt.close(fig)
+    return fig
 
 def wrap_xticks(ax, width=18, rotation=20):
     labels = [t.get_text() for t in ax.get_xticklabels()]
@@ -56,127 +69,119 @@ def add_caption(fig, text):
 
 
 
-print("[INFO] Loading AFI typology data")
-sheet = pd.read_csv(INPUT_FILE)
-
-required_cols = {
-    "cluster_id",
-    "cluster_name",
-    "afi_composite_score",
-    "state_canonical"
-}
-
-missing = required_cols - set(sheet.columns)
-if missing:
-    raise ValueError(f"Missing required columns: {missing}")
+@registry.figure("01_typology_size.png", columns=["cluster_name"])
+def typology_size(sheet):
+    import seaborn as sns
 
+    counts = (
+        sheet["cluster_name"]
+        .value_counts()
+        .rename_axis("cluster_name")
+        .reset_index(name="district_months")
+    )
 
+    fig, ax = new_figure((10, 6))
+    sns.barplot(
+        data=counts,
+        x="cluster_name",
+        y="district_months",
+        ax=ax,
+        color="#4C72B0"
+    )
 
-print("[INFO] Plotting typology size")
+    ax.set_title("District Typologies by Observed Aadhaar Behaviour", fontsize=16)
+    ax.set_xlabel("District Typology")
+    ax.set_ylabel("Number of District-Month Observations")
 
-counts = (
-    sheet["cluster_name"]
-    .value_counts()
-    .rename_axis("cluster_name")
-    .reset_index(name="district_months")
-)
+    wrap_xticks(ax)
 
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.barplot(
-    payload=counts,
-    val="cluster_name",
-    val2="district_months",
-    ax=ax,
-    color="#4C72B0"
-)
+    add_caption(
+        fig,
+        "Each typology groups districts with similar Aadhaar enrolment and update behaviour. "
+        "Larger bars indicate patterns that are widespread across India."
+    )
 
-ax.set_title("District Typologies by Observed Aadhaar Behaviour", fontsize=16)
-ax.set_xlabel("District Typology")
-ax.set_ylabel("Number of District-Month Observations")
+    return finish(fig)
 
-wrap_xticks(ax)
 
-add_caption(
-    fig,
-    "Each typology groups districts with similar Aadhaar enrolment and update behaviour. "
-    "Larger bars indicate patterns that are widespread across India."
-)
 
-save_fig(fig, "01_typology_size.png")
+@registry.figure("02_typology_afi_distribution.png", columns=["cluster_name", "afi_composite_score"])
+def typology_afi_distribution(sheet):
+    import seaborn as sns
 
+    fig, ax = new_figure((11, 6))
+    sns.boxplot(
+        data=sheet,
+        x="cluster_name",
+        y="afi_composite_score",
+        showfliers=False,
+        ax=ax
+    )
 
+    ax.set_yscale("log")
+    ax.set_title("Aadhaar Friction Index Distribution by District Typology", fontsize=16)
+    ax.set_xlabel("District Typology")
+    ax.set_ylabel("AFI (log scale)")
 
-print("[INFO] Plotting AFI distribution by typology")
+    wrap_xticks(ax)
 
-fig, ax = plt.subplots(figsize=(11, 6))
-sns.boxplot(
-    payload=sheet,
-    val="cluster_name",
-    val2="afi_composite_score",
-    showfliers=False,
-    ax=ax
-)
+    add_caption(
+        fig,
+        "Higher AFI values indicate greater citizen difficulty in maintaining Aadhaar. "
+        "Distinct distributions confirm that typologies capture real operational differences."
+    )
 
-ax.set_yscale("log")
-ax.set_title("Aadhaar Friction Index Distribution by District Typology", fontsize=16)
-ax.set_xlabel("District Typology")
-ax.set_ylabel("AFI (log scale)")
+    return finish(fig)
 
-wrap_xticks(ax)
 
-add_caption(
-    fig,
-    "Higher AFI values indicate greater citizen difficulty in maintaining Aadhaar. "
-    "Distinct distributions confirm that typologies capture real operational differences."
-)
 
-save_fig(fig, "02_typology_afi_distribution.png")
+@registry.figure("03_state_typology_mix.png", columns=[], cubes=["state_typology"])
+def state_typology_mix(sheet):
+    import seaborn as sns
 
+    cube, _ = load_cube("state_typology", columns=["state_canonical", "cluster_name", "count"])
+    top_states = (
+        cube.groupby("state_canonical")["count"]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+        .head(10)
+        .index
+    )
 
+    mix = cube[cube["state_canonical"].isin(top_states)].reset_index(drop=True)
 
-print("[INFO] Plotting state-typology composition")
+    fig, ax = new_figure((12, 7))
+    sns.barplot(
+        data=mix,
+        x="state_canonical",
+        y="count",
+        hue="cluster_name",
+        ax=ax
+    )
 
-top_states = (
-    sheet["state_canonical"]
-    .value_counts()
-    .head(10)
-    .index
-)
+    ax.set_title("Typology Composition of High-Volume States", fontsize=16)
+    ax.set_xlabel("State")
+    ax.set_ylabel("District-Month Observations")
 
-mix = (
-    sheet[sheet["state_canonical"].isin(top_states)]
-    .groupby(["state_canonical", "cluster_name"])
-    .size()
-    .reset_index(name="count")
-)
+    wrap_xticks(ax, width=14, rotation=25)
 
-fig, ax = plt.subplots(figsize=(12, 7))
-sns.barplot(
-    payload=mix,
-    val="state_canonical",
-    val2="count",
-    hue="cluster_name",
-    ax=ax
-)
+    ax.legend(
+        title="District Typology",
+        bbox_to_anchor=(1.02, 1),
+        loc="upper left"
+    )
 
-ax.set_title("Typology Composition of High-Volume States", fontsize=16)
-ax.set_xlabel("State")
-ax.set_ylabel("District-Month Observations")
+    add_caption(
+        fig,
+        "States show distinct mixes of district typologies. "
+        "This enables state-specific, targeted Aadhaar policy interventions."
+    )
 
-wrap_xticks(ax, width=14, rotation=25)
+    return finish(fig)
 
-ax.legend(
-    title="District Typology",
-    bbox_to_anchor=(1.02, 1),
-    loc="upper left"
-)
 
-add_caption(
-    fig,
-    "States show distinct mixes of district typologies. "
-    "This enables state-specific, targeted Aadhaar policy interventions."
-)
-
-save_fig(fig, "03_state_typology_mix.png")
 
-print("[DONE] Typology visuals written to:", OUT_DIR)
\ No newline at end of file
+if __name__ == "__main__":
+    print("[INFO] Rendering typology figures")
+    registry.run()
+    print("[DONE] Typology visuals written to:", OUT_DIR)
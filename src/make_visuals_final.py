@@ -1,39 +1,22 @@
-import os
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-
-
-
-
-
-
-
-
-
-
-
-
 
+import figure_data as fd
+from render_figures import FigureRegistry
 
 
 INPUT_FILE = "outputs/merged_for_afi.csv"
 OUT_DIR = "images_final"
-os.makedirs(OUT_DIR, exist_ok=True)
-
-sns.set(style="whitegrid", context="talk")
-
-
-
+DPI = 200
 
-sheet = pd.read_csv(INPUT_FILE)
+registry = FigureRegistry(INPUT_FILE, OUT_DIR, dpi=DPI, save_kwargs={"bbox_inches": "tight"})
 
 
-sheet = sheet.replace([np.inf, -np.inf], np.nan).dropna(subset=["afi_composite_score"])
-
+def new_figure(figsize):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
+    sns.set(style="whitegrid", context="talk")
+    return plt.subplots(figsize=figsize)
 
 
 def add_caption(fig, text):
@@ -44,157 +27,148 @@ def add_caption(fig, text):
     )
 
 
+def state_bar_figure(values, color, xlabel, title, caption):
+    fig, ax = new_figure((14, 8))
+    values[::-1].plot(kind="barh", ax=ax, color=color)
 
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("State")
+    ax.set_title(title)
 
-fig, ax = plt.subplots(figsize=(14, 8))
-
-afi = sheet["afi_composite_score"]
-afi = afi[afi > 0]
-
-ax.hist(afi, bins=80, log=True, color="#377eb8", alpha=0.85)
-
-median = afi.median()
-p95 = afi.quantile(0.95)
-p99 = afi.quantile(0.99)
-
-ax.axvline(median, color="black", linestyle="--", label=f"Median: {median:.1f}")
-ax.axvline(p95, color="red", linestyle="--", label=f"95th percentile: {p95:.1f}")
-ax.axvline(p99, color="darkred", linestyle="--", label=f"99th percentile: {p99:.1f}")
-
-ax.set_xscale("log")
-ax.set_xlabel("Aadhaar Friction Index (log scale)")
-ax.set_ylabel("District–Month Count")
-ax.set_title("Distribution of Aadhaar Friction Index Across India")
-ax.legend()
-
-add_caption(
-    fig,
-    "Most districts experience low Aadhaar friction, while a small number face extremely high friction. "
-    "This long tail indicates that Aadhaar-related difficulties are highly localized rather than nationwide, "
-    "supporting targeted district-level policy interventions instead of blanket reforms."
-)
-
-plt.tight_layout()
-plt.savefig(f"{OUT_DIR}/01_afi_distribution.png", dpi=200, bbox_inches="tight")
-plt.close()
-
-
+    add_caption(fig, caption)
+    fig.tight_layout()
+    return fig
 
 
-state_mean = (
-    sheet.groupby("state_canonical")["afi_composite_score"]
-    .mean()
-    .sort_values(ascending=False)
-)
 
-top10 = state_mean.head(10)
 
-fig, ax = plt.subplots(figsize=(14, 8))
-top10[::-1].plot(kind="barh", ax=ax, color="#c0392b")
+@registry.figure("01_afi_distribution.png", columns=[fd.SCORE_COL])
+def afi_distribution(sheet):
+    hist = fd.afi_distribution(sheet)
 
-ax.set_xlabel("Mean Aadhaar Friction Index")
-ax.set_ylabel("State")
-ax.set_title("Top 10 States by Average Aadhaar Friction")
+    fig, ax = new_figure((14, 8))
+    ax.hist(hist["edges"][:-1], bins=hist["edges"], weights=hist["counts"], log=True, color="#377eb8", alpha=0.85)
 
-add_caption(
-    fig,
-    "States with higher average Aadhaar Friction Index values indicate greater difficulty faced by citizens "
-    "in maintaining Aadhaar records. These states may require additional enrolment capacity, "
-    "mobile biometric units, or administrative process improvements."
-)
+    median = hist["median"]
+    p95 = hist["p95"]
+    p99 = hist["p99"]
 
-plt.tight_layout()
-plt.savefig(f"{OUT_DIR}/02_top10_states_high_friction.png", dpi=200, bbox_inches="tight")
-plt.close()
+    ax.axvline(median, color="black", linestyle="--", label=f"Median: {median:.1f}")
+    ax.axvline(p95, color="red", linestyle="--", label=f"95th percentile: {p95:.1f}")
+    ax.axvline(p99, color="darkred", linestyle="--", label=f"99th percentile: {p99:.1f}")
 
+    ax.set_xscale("log")
+    ax.set_xlabel("Aadhaar Friction Index (log scale)")
+    ax.set_ylabel("District–Month Count")
+    ax.set_title("Distribution of Aadhaar Friction Index Across India")
+    ax.legend()
 
+    add_caption(
+        fig,
+        "Most districts experience low Aadhaar friction, while a small number face extremely high friction. "
+        "This long tail indicates that Aadhaar-related difficulties are highly localized rather than nationwide, "
+        "supporting targeted district-level policy interventions instead of blanket reforms."
+    )
 
+    fig.tight_layout()
+    return fig
 
-bottom10 = state_mean.tail(10)
 
-fig, ax = plt.subplots(figsize=(14, 8))
-bottom10[::-1].plot(kind="barh", ax=ax, color="#27ae60")
 
-ax.set_xlabel("Mean Aadhaar Friction Index")
-ax.set_ylabel("State")
-ax.set_title("Bottom 10 States by Average Aadhaar Friction")
 
-add_caption(
-    fig,
-    "These states show consistently lower Aadhaar friction, suggesting smoother enrolment and update processes. "
-    "They can serve as reference models or best-practice benchmarks for improving Aadhaar service delivery "
-    "in higher-friction regions."
-)
+@registry.figure("02_top10_states_high_friction.png", columns=[], cubes=[fd.STATE_CUBES[fd.SCORE_COL]])
+def top10_states(sheet):
+    return state_bar_figure(
+        fd.state_means().head(10),
+        "#c0392b",
+        "Mean Aadhaar Friction Index",
+        "Top 10 States by Average Aadhaar Friction",
+        "States with higher average Aadhaar Friction Index values indicate greater difficulty faced by citizens "
+        "in maintaining Aadhaar records. These states may require additional enrolment capacity, "
+        "mobile biometric units, or administrative process improvements."
+    )
 
-plt.tight_layout()
-plt.savefig(f"{OUT_DIR}/03_bottom10_states_low_friction.png", dpi=200, bbox_inches="tight")
-plt.close()
 
 
 
+@registry.figure("03_bottom10_states_low_friction.png", columns=[], cubes=[fd.STATE_CUBES[fd.SCORE_COL]])
+def bottom10_states(sheet):
+    return state_bar_figure(
+        fd.state_means().tail(10),
+        "#27ae60",
+        "Mean Aadhaar Friction Index",
+        "Bottom 10 States by Average Aadhaar Friction",
+        "These states show consistently lower Aadhaar friction, suggesting smoother enrolment and update processes. "
+        "They can serve as reference models or best-practice benchmarks for improving Aadhaar service delivery "
+        "in higher-friction regions."
+    )
 
-top15 = sheet.sort_values("afi_composite_score", ascending=False).head(15)
-labels = top15["district_clean"] + " — " + top15["state_canonical"]
 
-fig, ax = plt.subplots(figsize=(14, 9))
-ax.barh(labels[::-1], top15["afi_composite_score"][::-1], color="#34495e")
 
-ax.set_xlabel("Aadhaar Friction Index")
-ax.set_title("Top 15 Aadhaar Friction Hotspots (District–Month Level)")
 
-add_caption(
-    fig,
-    "These district-month combinations represent extreme Aadhaar friction hotspots, often caused by "
-    "temporary operational stress such as enrolment backlogs, biometric failures, or sudden update surges. "
-    "AFI enables precise, time-bound interventions instead of reactive nationwide measures."
-)
+@registry.figure("04_top15_district_hotspots.png", columns=[fd.DISTRICT_COL, fd.STATE_COL, fd.SCORE_COL])
+def top15_hotspots(sheet):
+    top15 = fd.hotspots(sheet)
+    labels = top15["district_clean"] + " — " + top15["state_canonical"]
 
-plt.tight_layout()
-plt.savefig(f"{OUT_DIR}/04_top15_district_hotspots.png", dpi=200, bbox_inches="tight")
-plt.close()
+    fig, ax = new_figure((14, 9))
+    ax.barh(labels[::-1], top15["afi_composite_score"][::-1], color="#34495e")
 
+    ax.set_xlabel("Aadhaar Friction Index")
+    ax.set_title("Top 15 Aadhaar Friction Hotspots (District–Month Level)")
 
+    add_caption(
+        fig,
+        "These district-month combinations represent extreme Aadhaar friction hotspots, often caused by "
+        "temporary operational stress such as enrolment backlogs, biometric failures, or sudden update surges. "
+        "AFI enables precise, time-bound interventions instead of reactive nationwide measures."
+    )
 
+    fig.tight_layout()
+    return fig
 
-if "age_mismatch_score" in sheet.columns:
-    age_state = (
-        sheet.groupby("state_canonical")["age_mismatch_score"]
-        .mean()
-        .sort_values(ascending=False)
-        .head(10)
-    )
 
-    fig, ax = plt.subplots(figsize=(14, 8))
-    age_state[::-1].plot(kind="barh", ax=ax, color="#8e44ad")
 
-    ax.set_xlabel("Age-Transition Mismatch Score")
-    ax.set_ylabel("State")
-    ax.set_title("States with Highest Aadhaar Age-Transition Mismatch")
 
-    add_caption(
-        fig,
+@registry.figure("05_age_transition_mismatch_states.png", columns=[fd.AGE_COL], cubes=[fd.STATE_CUBES[fd.AGE_COL]])
+def age_transition_mismatch(sheet):
+    if fd.AGE_COL not in sheet.columns:
+        return None
+    return state_bar_figure(
+        fd.state_means(fd.AGE_COL).head(10),
+        "#8e44ad",
+        "Age-Transition Mismatch Score",
+        "States with Highest Aadhaar Age-Transition Mismatch",
         "Certain Aadhaar updates are mandatory at key age milestones. A high mismatch score indicates "
         "that expected updates are not occurring smoothly, suggesting access barriers for children "
         "and young adults. These states may benefit from school-based or mobile enrolment drives."
     )
 
-    plt.tight_layout()
-    plt.savefig(f"{OUT_DIR}/05_age_transition_mismatch_states.png", dpi=200, bbox_inches="tight")
-    plt.close()
 
 
 
+@registry.figure("06_afi_vs_aadhaar_base.png", columns=[fd.BASE_COL, fd.SCORE_COL])
+def afi_vs_aadhaar_base(sheet):
+    if fd.BASE_COL not in sheet.columns:
+        return None
+    grid = fd.base_vs_afi(sheet)
+    if grid is None:
+        return None
 
-if "aadhaar_base" in sheet.columns:
-    fig, ax = plt.subplots(figsize=(14, 8))
+    from matplotlib.colors import LogNorm
 
-    ax.scatter(
-        sheet["aadhaar_base"],
-        sheet["afi_composite_score"],
-        alpha=0.15,
-        s=15,
-        color="#2980b9"
+    fig, ax = new_figure((14, 8))
+
+    counts = np.ma.masked_equal(grid["counts"].T, 0)
+    mesh = ax.pcolormesh(
+        grid["x_edges"],
+        grid["y_edges"],
+        counts,
+        cmap="Blues",
+        norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)),
+        shading="flat"
     )
+    fig.colorbar(mesh, ax=ax, label="District–Month Count")
 
     ax.set_xscale("log")
     ax.set_yscale("log")
@@ -209,8 +183,10 @@ if "aadhaar_base" in sheet.columns:
         "not merely population scale."
     )
 
-    plt.tight_layout()
-    plt.savefig(f"{OUT_DIR}/06_afi_vs_aadhaar_base.png", dpi=200, bbox_inches="tight")
-    plt.close()
+    fig.tight_layout()
+    return fig
+
 
-print(f"[DONE] Final submission-ready visuals written to {OUT_DIR}/")
\ No newline at end of file
+if __name__ == "__main__":
+    registry.run()
+    print(f"[DONE] Final submission-ready visuals written to {OUT_DIR}/")
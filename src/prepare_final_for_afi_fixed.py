@@ -1,12 +1,31 @@
+"""
+prepare_final_for_afi_fixed.py
 
+Aggregate the cleaned, state-mapped datasets to one row per
+(period, state_canonical, district_clean, pincode): age-bucket counts are
+summed, state_clean is the first non-empty value seen for the group.
 
+By default the input is streamed in chunks of --chunk-rows rows; each chunk
+is reduced to per-group partial sums / row counts / first values and folded
+into a running accumulator (one slot per group), so memory grows with the
+number of groups rather than rows. --chunk-rows 0 reads the whole file and
+aggregates it in memory. Both produce the same final_*_for_afi.csv.
+
+Each input is snapshotted into outputs/.store (afi_artifacts.py) before it is
+read; a missing input falls back to its latest snapshot.
+
+Usage:
+    python src/prepare_final_for_afi_fixed.py [--chunk-rows 500000]
+"""
+
+import argparse
 import pandas as pd
+import numpy as np
 from pathlib import Path
-from datetime import datetime
 import glob
 import sys
 
-TIMESTAMP = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+from afi_artifacts import Store
 
 
 FILEMAP = {
@@ -25,9 +44,17 @@ SUM_COLS = {
 
 
 GROUP_KEY = ["period", "state_canonical", "district_clean", "pincode"]
+REP_COLS = ["state_clean", "state_canonical", "district_clean"]
 
-def find_latest_backup(path: Path):
+CHUNK_ROWS = 500_000
+KEY_SEP = "\x1f"      # joins the group key columns into one accumulator key
+KEY_NA = "\x1e"       # stands in for a missing key value (groups keep NaN keys, dropna=False)
 
+def find_latest_backup(path: Path):
+    """Latest stored snapshot of `path`, else the newest legacy <path>.bak.* file."""
+    blob = store.latest(path)
+    if blob is not None:
+        return blob
     pattern = str(path.parent / (path.name + ".bak.*"))
     matches = glob.glob(pattern)
     if not matches:
@@ -46,60 +73,150 @@ def to_numeric(sheet, cols):
             sheet[c] = 0
     return sheet
 
-for name, fp_str in FILEMAP.entries():
-    file_handle = Path(fp_str)
-    if not file_handle.exists():
-
-        bak = find_latest_backup(file_handle)
-        if bak is None:
-            print(f"[SKIP] {fp} not found and no backup found for {name}")
-            continue
-        print(f"[INFO] original {fp.name} missing — using latest backup {bak.name}")
-        in_path = bak
-
-    else:
-
-        bak = file_handle.with_name(file_handle.name + ".bak." + TIMESTAMP)
-        file_handle.replace(bak)
-        in_path = bak
-        print(f"[INFO] processing {in_path.name} (moved original to backup)")
-
-    sheet = safe_read_csv(in_path)
-    rows_in = len(sheet)
-    print(f"{name}: rows_in: {rows_in:,}")
-
-
+def prepare(sheet, sumcols):
     if "state_canonical" not in sheet.columns:
         sheet["state_canonical"] = sheet.get("state_clean","").fillna("")
     if "district_clean" not in sheet.columns:
         sheet["district_clean"] = sheet.get("district","").fillna("")
+    return to_numeric(sheet, sumcols)
 
-    sumcols = SUM_COLS.get(name, [])
-    sheet = to_numeric(sheet, sumcols)
+def rep_columns(columns):
+    return [c for c in REP_COLS if c in columns and c not in GROUP_KEY]
+
+def print_group_counts(counts):
+    print("  top 10 group counts (before aggregation):")
+    print(counts.sort_values(ascending=False).head(10).to_string())
 
 
+def aggregate_in_memory(in_path, sumcols):
+    sheet = prepare(safe_read_csv(in_path), sumcols)
+    print(f"  rows_in: {len(sheet):,}")
+
     try:
-        dup_counts = sheet.groupby(GROUP_KEY).size().sort_values(ascending=False).head(10)
-        print("  top 10 group counts (before aggregation):")
-        print(dup_counts.to_string())
+        print_group_counts(sheet.groupby(GROUP_KEY).size())
     except Exception as e:
         print("  [WARN] could not compute group multiplicities:", e)
 
-
     agg = sheet.groupby(GROUP_KEY, dropna=False, as_index=False)[sumcols].sum()
 
+    keep_cols = rep_columns(sheet.columns)
+    reps = sheet.groupby(GROUP_KEY, dropna=False, as_index=False).first()[GROUP_KEY + keep_cols]
+
+    return agg.merge(reps, on=GROUP_KEY, how="left")
+
+
+class GroupAccumulator:
+    """
+    Running group-by over chunks: per-group sums of `sumcols`, row counts and the
+    first non-null value of each representative column, stored as arrays indexed
+    by a slot per group (dict: joined key -> slot, in first-seen order).
+    """
+
+    def __init__(self, sumcols, rep_cols, capacity=1 << 16):
+        self.sumcols = sumcols
+        self.rep_cols = rep_cols
+        self.slots = {}
+        self.sums = np.zeros((capacity, len(sumcols)), dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.reps = {c: np.full(capacity, None, dtype=object) for c in rep_cols}
+
+    def _reserve(self, n):
+        cap = len(self.counts)
+        if n <= cap:
+            return
+        while cap < n:
+            cap *= 2
+        self.sums = np.resize(self.sums, (cap, len(self.sumcols)))
+        self.sums[len(self.counts):] = 0
+        self.counts = np.concatenate([self.counts, np.zeros(cap - len(self.counts), dtype=np.int64)])
+        for c in self.rep_cols:
+            self.reps[c] = np.concatenate([self.reps[c], np.full(cap - len(self.reps[c]), None, dtype=object)])
+
+    def add(self, chunk):
+        key = chunk[GROUP_KEY[0]].fillna(KEY_NA)
+        for c in GROUP_KEY[1:]:
+            key = key + KEY_SEP + chunk[c].fillna(KEY_NA)
+        groups = chunk.groupby(key.to_numpy(), sort=False)
+        part = groups[self.sumcols].sum()
+        sizes = groups.size()
+        firsts = groups[self.rep_cols].first() if self.rep_cols else None
+
+        slots = self.slots
+        idx = np.fromiter((slots.setdefault(k, len(slots)) for k in part.index), dtype=np.int64, count=len(part))
+        self._reserve(len(slots))
+        self.sums[idx] += part.to_numpy(dtype=np.int64)
+        self.counts[idx] += sizes.reindex(part.index).to_numpy()
+        for c in self.rep_cols:
+            have = pd.isna(self.reps[c][idx])
+            self.reps[c][idx[have]] = firsts[c].to_numpy(dtype=object)[have]
+
+    def keys(self):
+        keys = pd.Series(list(self.slots), dtype=object).str.split(KEY_SEP, expand=True)
+        keys.columns = GROUP_KEY
+        return keys.mask(keys == KEY_NA)
+
+    def result(self):
+        """Frame equal to groupby(GROUP_KEY, dropna=False).sum() joined with .first() of the rep columns."""
+        n = len(self.slots)
+        final = self.keys()
+        for j, c in enumerate(self.sumcols):
+            final[c] = self.sums[:n, j]
+        for c in self.rep_cols:
+            final[c] = self.reps[c][:n]
+        return final.sort_values(GROUP_KEY, na_position="last", kind="stable").reset_index(drop=True)
+
+    def group_counts(self):
+        """Rows per group, groups with a missing key left out (as groupby(GROUP_KEY).size())."""
+        keys = self.keys()
+        counts = pd.Series(self.counts[:len(self.slots)], index=pd.MultiIndex.from_frame(keys))
+        return counts[keys.notna().all(axis=1).to_numpy()]
+
+
+def aggregate_streaming(in_path, sumcols, chunk_rows=CHUNK_ROWS):
+    acc = None
+    rows_in = 0
+    for chunk in pd.read_csv(in_path, dtype=str, low_memory=False, chunksize=chunk_rows):
+        chunk = prepare(chunk, sumcols)
+        if acc is None:
+            acc = GroupAccumulator(sumcols, rep_columns(chunk.columns))
+        acc.add(chunk)
+        rows_in += len(chunk)
+    if acc is None:
+        return aggregate_in_memory(in_path, sumcols)
+    print(f"  rows_in: {rows_in:,} (streamed in chunks of {chunk_rows:,}, groups: {len(acc.slots):,})")
+    print_group_counts(acc.group_counts())
+    return acc.result()
+
+
+ap = argparse.ArgumentParser(description="Aggregate cleaned datasets to final_*_for_afi.csv")
+ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk (0 = aggregate in memory)")
+args = ap.parse_args()
+
+store = Store(Path("outputs") / ".store")
+
+for name, fp_str in FILEMAP.items():
+    file_handle = Path(fp_str)
+    if not file_handle.exists():
 
-    keep_cols = []
-    for c in ["state_clean","state_canonical","district_clean"]:
-        if c in sheet.columns and c not in GROUP_KEY:
-            keep_cols.append(c)
-
+        bak = find_latest_backup(file_handle)
+        if bak is None:
+            print(f"[SKIP] {file_handle} not found and no backup found for {name}")
+            continue
+        print(f"[INFO] original {file_handle.name} missing — using latest backup {bak}")
+        in_path = bak
 
-    rep_cols = GROUP_KEY + keep_cols if keep_cols else GROUP_KEY
-    reps = sheet.groupby(GROUP_KEY, dropna=False, as_index=False).first()[rep_cols]
+    else:
 
+        snap = store.snapshot([file_handle], script="prepare_final_for_afi_fixed", label=name)
+        in_path = file_handle
+        print(f"[INFO] processing {in_path.name} (snapshot {snap['id']})")
 
-    final = agg.merge(reps, on=GROUP_KEY, how="left")
+    print(f"{name}:")
+    sumcols = SUM_COLS.get(name, [])
+    if args.chunk_rows > 0:
+        final = aggregate_streaming(in_path, sumcols, args.chunk_rows)
+    else:
+        final = aggregate_in_memory(in_path, sumcols)
 
     out_path = Path(OUT_TPL.format(name=name))
     final.to_csv(out_path, index=False)
@@ -0,0 +1,216 @@
+"""
+render_figures.py
+
+Parallel runner for the report figures.
+
+Each figure is a registered job: a module-level function that takes the input
+frame (only the columns it declared) and returns a matplotlib Figure. A job that
+draws from rollup cubes (afi_rollups.py) instead declares them as `cubes`. The runner
+
+ - opens the Arrow IPC copy the AFI stage wrote next to the input CSV
+   (afi_io.py), or else parses the CSV once and caches it as an Arrow IPC file;
+   workers open that file memory-mapped instead of re-parsing text
+ - hashes the declared input columns and cube files, the DPI and the code a
+   figure runs (the whole module that defines the job, so its shared helpers
+   count, plus figure_data.py) and skips figures whose hash matches the last render and
+   whose PNG still exists
+ - draws the remaining figures in a process pool with the Agg backend, so the
+   wall time is bounded by the slowest single figure
+
+pyplot / seaborn are never imported in the parent process; plotting modules
+should import them inside their job functions.
+
+Usage (from a plotting script):
+    registry = FigureRegistry(INPUT_FILE, OUT_DIR, dpi=200)
+
+    @registry.figure("01_afi_distribution.png", columns=["afi_composite_score"])
+    def afi_distribution(sheet):
+        import matplotlib.pyplot as plt
+        ...
+        return fig
+
+    if __name__ == "__main__":
+        registry.run()
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from afi_io import fresh_ipc
+from afi_rollups import ROLLUP_DIR
+
+
+CACHE_DIRNAME = ".figure_cache"
+MANIFEST_NAME = ".render_manifest.json"
+SHARED_SOURCES = [Path(__file__).with_name("figure_data.py")]
+
+
+def log(msg):
+    print(f"[INFO] {msg}")
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _read_arrow(arrow_path, columns):
+    with pa.memory_map(str(arrow_path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    present = [c for c in columns if c in table.column_names]
+    return table.select(present).to_pandas()
+
+
+def _render_job(draw, arrow_path, columns, out_path, dpi, save_kwargs):
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    sheet = _read_arrow(arrow_path, columns)
+    fig = draw(sheet)
+    if fig is None:
+        return out_path, None
+    fig.savefig(out_path, dpi=dpi, **save_kwargs)
+    plt.close(fig)
+    return out_path, time.perf_counter() - start
+
+
+class FigureRegistry:
+    """Figures drawn from one input CSV into one output directory."""
+
+    def __init__(self, input_file, out_dir, dpi=200, save_kwargs=None, required_columns=()):
+        self.input_file = Path(input_file)
+        self.out_dir = Path(out_dir)
+        self.dpi = dpi
+        self.save_kwargs = save_kwargs or {}
+        self.required_columns = set(required_columns)
+        self.jobs = []
+        self._code_digests = {}
+
+    def figure(self, filename, columns, cubes=()):
+        """Register `draw(sheet) -> Figure` as the job that writes `filename`."""
+        def register(draw):
+            self.jobs.append({"filename": filename, "draw": draw, "columns": list(columns), "cubes": list(cubes)})
+            return draw
+        return register
+
+    def all_columns(self):
+        cols = []
+        for job in self.jobs:
+            cols.extend(c for c in job["columns"] if c not in cols)
+        cols.extend(sorted(self.required_columns - set(cols)))
+        return cols
+
+    def arrow_cache(self):
+        """Arrow IPC copy of the input CSV: the stage's own when fresh, else a cache rebuilt when the CSV changes."""
+        shared = fresh_ipc(self.input_file)
+        if shared is not None:
+            return shared
+
+        cache_dir = self.input_file.parent / CACHE_DIRNAME
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        arrow_path = cache_dir / (self.input_file.stem + ".arrow")
+        meta_path = cache_dir / (self.input_file.stem + ".json")
+
+        stat = self.input_file.stat()
+        stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "columns": self.all_columns()}
+        if arrow_path.exists() and meta_path.exists():
+            if json.loads(meta_path.read_text()) == stamp:
+                return arrow_path
+
+        log(f"Parsing {self.input_file} once for all figures")
+        header = pd.read_csv(self.input_file, nrows=0).columns
+        present = [c for c in stamp["columns"] if c in header]
+        table = pacsv.read_csv(
+            self.input_file,
+            convert_options=pacsv.ConvertOptions(include_columns=present),
+        )
+        with pa.OSFile(str(arrow_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        meta_path.write_text(json.dumps(stamp))
+        return arrow_path
+
+    def code_digest(self, draw):
+        """sha256 of the source of the module defining `draw` and of SHARED_SOURCES."""
+        module = inspect.getmodule(draw)
+        if module not in self._code_digests:
+            h = hashlib.sha256()
+            h.update(inspect.getsource(module).encode())
+            for path in SHARED_SOURCES:
+                if path.exists():
+                    h.update(path.read_bytes())
+            self._code_digests[module] = h.digest()
+        return self._code_digests[module]
+
+    def job_hash(self, job, sheet):
+        h = hashlib.sha256()
+        h.update(job["filename"].encode())
+        h.update(str(self.dpi).encode())
+        h.update(self.code_digest(job["draw"]))
+        present = [c for c in job["columns"] if c in sheet.columns]
+        h.update(",".join(present).encode())
+        if present:
+            h.update(pd.util.hash_pandas_object(sheet[present], index=False).to_numpy().tobytes())
+        for name in job["cubes"]:
+            path = ROLLUP_DIR / f"{name}.parquet"
+            h.update(name.encode())
+            if path.exists():
+                h.update(path.read_bytes())
+        return h.hexdigest()
+
+    def run(self, workers=None, force=False):
+        if not self.input_file.exists():
+            raise FileNotFoundError(f"Missing input file: {self.input_file}")
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        arrow_path = self.arrow_cache()
+        sheet = _read_arrow(arrow_path, self.all_columns())
+        missing = self.required_columns - set(sheet.columns)
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+        manifest_path = self.out_dir / MANIFEST_NAME
+        manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+        pending = []
+        for job in self.jobs:
+            digest = self.job_hash(job, sheet)
+            out_path = self.out_dir / job["filename"]
+            if not force and manifest.get(job["filename"]) == digest and out_path.exists():
+                log(f"{job['filename']}: input unchanged, skipped")
+                continue
+            pending.append((job, digest))
+        del sheet
+
+        if pending:
+            workers = workers or min(len(pending), os.cpu_count() or 1)
+            log(f"Rendering {len(pending)} figure(s) with {workers} worker(s)")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                     initializer=_init_worker) as pool:
+                futures = {
+                    pool.submit(_render_job, job["draw"], arrow_path, job["columns"],
+                                self.out_dir / job["filename"], self.dpi, self.save_kwargs): (job, digest)
+                    for job, digest in pending
+                }
+                for fut in as_completed(futures):
+                    job, digest = futures[fut]
+                    out_path, seconds = fut.result()
+                    if seconds is None:
+                        log(f"{job['filename']}: nothing to draw")
+                        manifest.pop(job["filename"], None)
+                        continue
+                    manifest[job["filename"]] = digest
+                    log(f"{job['filename']}: {seconds:.2f}s")
+
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+        return manifest
@@ -13,6 +13,8 @@ from collections import Counter, defaultdict
 from datetime import datetime
 import pandas as pd
 
+from afi_pipeline import fan_out, prefetch
+
 SRC_DIR = "outputs"
 DOCS_DIR = "docs"
 CHUNKSIZE = 100_000
@@ -26,8 +28,9 @@ os.makedirs(DOCS_DIR, exist_ok=True)
 
 summary_rows = []
 
-def analyze_dataset(name, filename):
-    path = os.path.join(SRC_DIR, filename)
+def analyze_dataset(name):
+    print(f"Analyzing {name} ...")
+    path = os.path.join(SRC_DIR, DATASETS[name])
     if not os.path.exists(path):
         print(f"[WARN] missing file: {path}")
         return None
@@ -42,7 +45,7 @@ def analyze_dataset(name, filename):
 
 
 
-    for chunk in pd.read_csv(path, dtype=str, chunksize=CHUNKSIZE, low_memory=False):
+    for chunk in prefetch(pd.read_csv(path, dtype=str, chunksize=CHUNKSIZE, low_memory=False)):
 
         cols = list(chunk.columns)
         total += len(chunk)
@@ -113,9 +116,7 @@ def analyze_dataset(name, filename):
     }
 
 
-for name, fname in DATASETS.entries():
-    print(f"Analyzing {name} ...")
-    outcome = analyze_dataset(name, fname)
+for outcome in fan_out(analyze_dataset, DATASETS):
     if outcome:
         summary_rows.append(outcome)
 
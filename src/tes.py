@@ -1,5 +1,6 @@
-import pandas as pd
-m = pd.read_csv('outputs/merged_for_afi.csv', dtype=str, low_memory=False)
+from afi_io import read_table
+
+m = read_table('outputs/merged_for_afi.csv', columns=['period','state_canonical','district_clean','enrol_total','demo_total','bio_total','afi'], dtype=str, low_memory=False)
 print('merged rows:', len(m))
 print('states in merged:', m['state_canonical'].nunique())
 print(m[['period','state_canonical','district_clean','enrol_total','demo_total','bio_total']].head(10))
@@ -9,15 +9,19 @@ Never crashes on inf / NaN.
 import pandas as pd
 import numpy as np
 
+from afi_io import read_table
+
 MERGED_FP = "outputs/merged_for_afi.csv"
 AFI_FP = "outputs/afi_summary.csv"
 
+STAT_COLS = ["enrol_total", "demo_total", "bio_total", "afi_composite_score"]
+
 
 def quick_stats(sheet, name):
     print(f"\n--- {name} ---")
-    print(f"rows: {len(df)}")
+    print(f"rows: {len(sheet)}")
 
-    for c in ["enrol_total", "demo_total", "bio_total", "afi_composite_score"]:
+    for c in STAT_COLS:
         if c not in sheet.columns:
             continue
 
@@ -41,14 +45,15 @@ def quick_stats(sheet, name):
 
 def main():
     print("Loading merged_for_afi ...")
-    merged = pd.read_csv(MERGED_FP, low_memory=False)
+    merged = read_table(MERGED_FP, columns=STAT_COLS + ["state_canonical", "pincode"], dtype={"pincode": str},
+                        low_memory=False)
     quick_stats(merged, "merged_for_afi")
 
     print("\nUnique states:", sorted(merged["state_canonical"].dropna().unique().tolist()))
     print("UNKNOWN/100000 count:", (merged["pincode"] == "100000").sum())
 
     print("\nLoading afi_summary ...")
-    afi = pd.read_csv(AFI_FP, low_memory=False)
+    afi = read_table(AFI_FP, columns=STAT_COLS, low_memory=False)
     quick_stats(afi, "afi_summary")
 
     if "afi_composite_score" in afi.columns:
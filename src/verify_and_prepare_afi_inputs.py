@@ -4,7 +4,7 @@ verify_and_prepare_afi_inputs.py
 
 - Verifies AFI input CSVs in outputs/
 - If enrol_total/demo_total/bio_total are missing, computes them from age bucket columns (only if age buckets exist)
-- Writes safe backups and new files named: outputs/<original>_with_totals.csv
+- Snapshots a previous output before replacing it (outputs/.store, see afi_artifacts.py) and writes new files named: outputs/<original>_with_totals.csv
 - Prints a clear summary / suggested next commands.
 
 Usage:
@@ -12,9 +12,9 @@ Usage:
 """
 
 import os
-import shutil
 import pandas as pd
-from datetime import datetime
+
+from afi_artifacts import Store
 
 ROOT = os.getcwd()
 OUT = os.path.join(ROOT, "outputs")
@@ -44,10 +44,10 @@ def choose_existing(paths):
     return None, None
 
 def backup_file(file_handle):
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    bak = f"{fp}.bak.{ts}"
-    shutil.copy2(file_handle, bak)
-    return bak
+    """Move the current file into the artifact store (no copy); returns the snapshot id."""
+    snap = Store(os.path.join(OUT, ".store")).snapshot([file_handle], script="verify_and_prepare_afi_inputs",
+                                                       label=os.path.basename(file_handle), detach=True)
+    return snap["id"] if snap else None
 
 def safe_write(sheet, outpath):
     bak = None
@@ -87,7 +87,7 @@ def process(kind):
     info = {"file": fullpath, "rows": len(sheet), "had_total": total_col in sheet.columns}
 
     if total_col in sheet.columns:
-        print(f"[OK] {total_col} exists. Sample sum: {int(df[total_col].sum())}")
+        print(f"[OK] {total_col} exists. Sample sum: {int(sheet[total_col].sum())}")
         info["total_sum"] = int(sheet[total_col].sum())
 
         bucket_sum = numeric_sum_cols(sheet, age_buckets)
@@ -117,7 +117,7 @@ def process(kind):
     if os.path.exists(outpath):
         backup = backup_file(outpath)
     sheet.to_csv(outpath, index=False)
-    print(f"[WROTE] {outpath}  (rows={len(df)})  (backup={backup})")
+    print(f"[WROTE] {outpath}  (rows={len(sheet)})  (backup={backup})")
     info["status"] = "computed_and_written"
     info["written"] = outpath
     info["total_sum"] = int(sheet[total_col].sum())
@@ -132,8 +132,8 @@ def main():
         summary[kdx] = process(kdx)
 
     print("\nSUMMARY:")
-    for kdx, v in summary.entries():
-        print(f" - {k}: rows={v.get('rows')} status={v.get('status')} written={v.get('written')} had_total={v.get('had_total')} total_sum={v.get('total_sum',None)} bucket_sum={v.get('bucket_sum',None)}")
+    for kdx, v in summary.items():
+        print(f" - {kdx}: rows={v.get('rows')} status={v.get('status')} written={v.get('written')} had_total={v.get('had_total')} total_sum={v.get('total_sum',None)} bucket_sum={v.get('bucket_sum',None)}")
 
     print("\nNEXT SUGGESTED STEPS (pick one):")
     print("1) If you are OK with files written above, run your AFI script against the new files:")